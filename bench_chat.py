@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Teste de carga do /chat com o LLM falso (sem custo na OpenAI)
+
+Repete conversas roteirizadas como a de `test_agent.test_conversation`, muitas
+ao mesmo tempo, contra o app FastAPI em processo. Ao final mostra:
+- latência p50/p95/p99 dos turnos comuns e dos turnos que geram o pattern
+- vazão (requisições e conversas concluídas por segundo)
+- memória por conversa (medida à parte com tracemalloc)
+- chamadas ao LLM por pattern concluído
+
+Com --max-p99-ms / --max-llm-calls-per-pattern o script termina com erro se
+os limites forem ultrapassados, para pegar regressões antes de subir.
+
+Uso: python bench_chat.py [--conversations 1000] [--concurrency 100] [--distinct 100]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+# Configura o backend falso antes de importar o app
+os.environ["LLM_BACKEND"] = "fake"
+# Todos os clientes simulados chegam pelo mesmo transporte local: o X-Client-Id os separa nas filas
+os.environ.setdefault("TRUSTED_PROXIES", "127.0.0.1")
+# Cada execução começa com a biblioteca de patterns vazia, sem reaproveitar as anteriores
+os.environ.setdefault("PATTERN_LIBRARY_PATH", ":memory:")
+
+PIECES = ["colete", "blusa", "chapeu", "cachecol", "luvas", "meias", "cobertor", "bolsa"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+COLORS = ["Azul marinho", "Vermelho", "Verde", "Amarelo", "Preto", "Branco", "Rosa", "Cinza"]
+YARNS = ["Algodão médio", "Lã grossa", "Acrílico fino", "Algodão fino"]
+DETAILS = [
+    "Sem manga, decote em V, comprimento até a cintura",
+    "Manga curta e gola redonda",
+    "Com listras e acabamento em pontos altos",
+    "Tanto faz",
+]
+
+# Respostas extras se o roteiro acabar antes da geração
+MAX_EXTRA_TURNS = 4
+
+
+def build_scripts(distinct: int, seed: int) -> List[List[str]]:
+    """Roteiros de conversa no formato do test_agent, com peças/cores variadas"""
+    rng = random.Random(seed)
+    scripts = [[
+        "Olá! Quero fazer um colete",
+        "Tamanho M",
+        "Azul marinho",
+        "Algodão médio",
+        "Sem manga, decote em V, comprimento até a cintura",
+    ]]
+    while len(scripts) < distinct:
+        scripts.append([
+            f"Olá! Quero fazer um {rng.choice(PIECES)}",
+            f"Tamanho {rng.choice(SIZES)}",
+            rng.choice(COLORS),
+            rng.choice(YARNS),
+            rng.choice(DETAILS),
+        ])
+    return scripts
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Results:
+    def __init__(self):
+        self.turn_latencies: List[float] = []
+        self.generation_latencies: List[float] = []
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.patterns = 0
+        self.conversations = 0
+
+
+async def post_chat(client, results: Results, client_id: str, message: str,
+                    conversation_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Envia uma mensagem; com 429 espera o Retry-After e reenvia, como um cliente real"""
+    while True:
+        started = time.perf_counter()
+        response = await client.post(
+            "/chat", json={"message": message, "conversation_id": conversation_id},
+            headers={"X-Client-Id": client_id}
+        )
+        elapsed = time.perf_counter() - started
+        results.requests += 1
+        if response.status_code == 429:
+            results.rejected += 1
+            await asyncio.sleep(min(5.0, float(response.headers.get("Retry-After", "1"))))
+            continue
+        if response.status_code != 200:
+            results.errors += 1
+            return None
+
+        body = response.json()
+        if body.get("pattern") is not None:
+            results.generation_latencies.append(elapsed)
+        else:
+            results.turn_latencies.append(elapsed)
+        return body
+
+
+async def run_conversation(client, results: Results, index: int, script: List[str]):
+    client_id = f"bench-{index}"
+    conversation_id = None
+    messages = script + ["tanto faz"] * MAX_EXTRA_TURNS
+    for message in messages:
+        body = await post_chat(client, results, client_id, message, conversation_id)
+        if body is None:
+            return
+        conversation_id = body["conversation_id"]
+        if body.get("pattern") is not None:
+            results.patterns += 1
+            results.conversations += 1
+            return
+    results.conversations += 1
+
+
+async def run_load(app, conversations: int, concurrency: int, scripts: List[List[str]]) -> Results:
+    import httpx
+
+    results = Results()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker(index: int):
+            async with semaphore:
+                await run_conversation(client, results, index, scripts[index % len(scripts)])
+
+        await asyncio.gather(*(worker(i) for i in range(conversations)))
+    return results
+
+
+def llm_calls(agent) -> int:
+    """Chamadas feitas ao LLM falso (modelo principal e reserva)"""
+    models = [agent.llm.primary, agent.llm.fallback]
+    return sum(model.calls for model in models if model is not None)
+
+
+def format_ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:8.1f} ms" if seconds is not None else "       -"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do /chat com o LLM falso")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=100,
+                        help="roteiros diferentes (repetidos aproveitam o cache de patterns)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="mediana até o primeiro token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--memory-sample", type=int, default=200,
+                        help="conversas na medição de memória (0 desliga)")
+    parser.add_argument("--max-p99-ms", type=float, help="falha se o p99 das requisições passar disso")
+    parser.add_argument("--max-llm-calls-per-pattern", type=float,
+                        help="falha se as chamadas ao LLM por pattern passarem disso")
+    args = parser.parse_args()
+
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    import main as app_module
+
+    scripts = build_scripts(args.distinct, args.seed)
+    print(f"{args.conversations} conversas, {args.concurrency} simultâneas, {len(scripts)} roteiros diferentes")
+
+    started = time.perf_counter()
+    results = asyncio.run(run_load(app_module.app, args.conversations, args.concurrency, scripts))
+    wall = time.perf_counter() - started
+    calls = llm_calls(app_module.agent)
+    calls_per_pattern = calls / results.patterns if results.patterns else None
+
+    print(f"\nDuração: {wall:.1f} s")
+    print(f"Requisições: {results.requests} ({results.requests / wall:.1f}/s), "
+          f"recusadas (429): {results.rejected}, erros: {results.errors}")
+    print(f"Conversas concluídas: {results.conversations} ({results.conversations / wall:.1f}/s), "
+          f"patterns: {results.patterns}")
+    for label, latencies in (("turnos", results.turn_latencies), ("geração", results.generation_latencies)):
+        print(f"Latência {label:8} (n={len(latencies):5}): "
+              + "  ".join(f"p{p} {format_ms(percentile(latencies, p))}" for p in (50, 95, 99)))
+    per_pattern = f"{calls_per_pattern:.3f}" if calls_per_pattern is not None else "-"
+    print(f"Chamadas ao LLM: {calls}, por pattern: {per_pattern}")
+
+    if args.memory_sample:
+        # Medição separada: o tracemalloc deixaria a fase de carga bem mais lenta
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        memory_scripts = build_scripts(args.memory_sample, args.seed + 1)
+        asyncio.run(run_load(app_module.app, args.memory_sample, min(args.concurrency, 20), memory_scripts))
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"Memória por conversa (com o pattern): {(after - before) / args.memory_sample / 1024:.1f} KiB")
+
+    failures = []
+    p99 = percentile(results.turn_latencies + results.generation_latencies, 99)
+    if args.max_p99_ms is not None and p99 is not None and p99 * 1000 > args.max_p99_ms:
+        failures.append(f"p99 {p99 * 1000:.1f} ms > {args.max_p99_ms} ms")
+    if (args.max_llm_calls_per_pattern is not None and calls_per_pattern is not None
+            and calls_per_pattern > args.max_llm_calls_per_pattern):
+        failures.append(f"{calls_per_pattern:.3f} chamadas por pattern > {args.max_llm_calls_per_pattern}")
+    if results.errors:
+        failures.append(f"{results.errors} requisições com erro")
+    if failures:
+        print("\n❌ " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark do extrator de entidades
+
+Compara o custo por mensagem do extrator compilado com a versão antiga
+(vários loops de `in` sobre a mensagem inteira), para mensagens curtas e longas.
+
+Uso: python bench_extraction.py
+"""
+
+import timeit
+
+from extraction import EntityExtractor
+
+
+def legacy_extract(message: str) -> dict:
+    """Versão anterior de _extract_information, mantida só para comparação"""
+    data = {}
+    message_lower = message.lower()
+
+    piece_types = {
+        "colete": "colete", "blusa": "blusa", "chapeu": "chapeu",
+        "cachecol": "cachecol", "luvas": "luvas", "meias": "meias",
+        "cobertor": "cobertor", "bolsa": "bolsa"
+    }
+    for keyword, piece_type in piece_types.items():
+        if keyword in message_lower:
+            data["piece_type"] = piece_type
+            break
+
+    sizes = ["xs", "s", "m", "l", "xl", "xxl", "pequeno", "médio", "grande"]
+    for size in sizes:
+        if size in message_lower:
+            data["size"] = size.upper() if size in ["xs", "s", "m", "l", "xl", "xxl"] else size
+            break
+
+    colors = ["azul", "vermelho", "verde", "amarelo", "preto", "branco", "rosa", "roxo", "cinza", "marrom"]
+    for color in colors:
+        if color in message_lower:
+            data["color"] = color
+            break
+
+    if "manga" in message_lower:
+        if "bufante" in message_lower or "bufê" in message_lower:
+            data["sleeve_type"] = "bufante"
+        elif "justa" in message_lower:
+            data["sleeve_type"] = "justa"
+        elif "sem manga" in message_lower:
+            data["sleeve_type"] = "sem manga"
+    return data
+
+
+MESSAGES = {
+    "curta (3 palavras)": "Algodão médio azul",
+    "média (~40 palavras)": (
+        "Oi! Eu queria fazer uma blusa de crochê para o inverno, tamanho GG, "
+        "em lã merino grossa na cor vinho. Gostaria de manga bufante e gola alta, "
+        "com comprimento até o quadril, se possível com alguns detalhes vazados."
+    ),
+}
+# Mensagem longa típica: muito texto livre e poucos termos do léxico
+MESSAGES["longa (~2.000 palavras)"] = (
+    " ".join(["Estou aprendendo crochê há pouco tempo e queria algo para dar de presente."] * 150)
+    + " " + MESSAGES["média (~40 palavras)"]
+)
+# Pior caso: todos os termos repetidos ao longo da mensagem
+MESSAGES["densa (~2.000 palavras)"] = " ".join([MESSAGES["média (~40 palavras)"]] * 50)
+
+
+def main():
+    extractor = EntityExtractor()
+    print(f"{'mensagem':<26}{'antigo (µs)':>14}{'compilado (µs)':>17}")
+
+    for label, message in MESSAGES.items():
+        runs = 20 if len(message) > 1000 else 2000
+        legacy = min(timeit.repeat(lambda: legacy_extract(message), number=runs, repeat=5)) / runs
+        compiled = min(timeit.repeat(lambda: extractor.extract(message), number=runs, repeat=5)) / runs
+        print(f"{label:<26}{legacy * 1e6:>14.1f}{compiled * 1e6:>17.1f}")
+
+    print("\nResultado da extração (mensagem média):")
+    print(f"  antigo:    {legacy_extract(MESSAGES['média (~40 palavras)'])}")
+    print(f"  compilado: {extractor.extract(MESSAGES['média (~40 palavras)'])}")
+
+
+if __name__ == "__main__":
+    main()
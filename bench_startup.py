@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark do tempo de inicialização (cold start) do servidor
+
+Cada rodada sobe um interpretador novo e mede, desde o início do processo:
+- import do main.py (cria o app, sem LangChain/OpenAI/NumPy)
+- startup do app e primeira resposta de /health
+- primeiro turno da conversa (sem chave da OpenAI)
+- primeira geração de pattern (LLM_BACKEND=fake), que paga a criação do cliente do LLM
+
+Uso: python bench_startup.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Executado em cada processo novo; imprime os tempos (segundos desde o início) em JSON
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+marks = {}
+import main
+marks["import"] = time.perf_counter() - started
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    marks["startup"] = time.perf_counter() - started
+    client.get("/health")
+    marks["first_health"] = time.perf_counter() - started
+    conversation_id = None
+    for message in ["Olá! Quero fazer um colete", "Tamanho M", "Azul marinho", "Algodão médio"]:
+        body = client.post("/chat", json={"message": message, "conversation_id": conversation_id}).json()
+        conversation_id = body["conversation_id"]
+        marks.setdefault("first_turn", time.perf_counter() - started)
+    body = client.post("/chat", json={"message": "Sem manga", "conversation_id": conversation_id}).json()
+    assert body["pattern"] is not None
+    marks["first_pattern"] = time.perf_counter() - started
+    marks["heavy_modules"] = [name for name in ("langchain", "openai", "numpy") if name in sys.modules]
+print(json.dumps(marks))
+"""
+
+STAGES = [
+    ("import", "import do main.py"),
+    ("startup", "startup do app"),
+    ("first_health", "primeira resposta de /health"),
+    ("first_turn", "primeiro turno do /chat"),
+    ("first_pattern", "primeira geração (cria o LLM)"),
+]
+
+
+def run_once() -> dict:
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    env.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": "1000000",
+        "PYTHONWARNINGS": "ignore",
+    })
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout
+    marks = json.loads(output.strip().splitlines()[-1])
+    marks["process"] = time.perf_counter() - started
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do tempo de inicialização")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"Mediana de {args.runs} processos novos (segundos desde o início do processo):")
+    for key, label in STAGES:
+        print(f"  {label:32} {statistics.median(run[key] for run in runs):6.3f} s")
+    print(f"  {'processo completo (com o Python)':32} {statistics.median(run['process'] for run in runs):6.3f} s")
+    print(f"Módulos pesados carregados ao fim: {', '.join(runs[-1]['heavy_modules']) or 'nenhum'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import copy
+import json
+import sys
+import zlib
+from typing import Any
+
+from models import ConversationState, CrochetPattern, PieceType, Size
+
+# Papéis do histórico, guardados como índice nesta tupla
+HISTORY_ROLES = ("user", "assistant")
+_ROLE_CODES = {role: code for code, role in enumerate(HISTORY_ROLES)}
+
+# Valores de enum usados em collected_data: todas as conversas apontam para o mesmo objeto
+_CANONICAL_VALUES = {member.value: member.value for enum in (PieceType, Size) for member in enum}
+
+PATTERN_FIELDS = tuple(CrochetPattern.model_fields)
+
+# Cabeçalho do snapshot binário (formato + versão), seguido de "j" (JSON) ou "z" (JSON comprimido)
+SNAPSHOT_MAGIC = b"CS1"
+
+# Abaixo disso a compressão custa mais do que economiza
+COMPRESS_MIN_BYTES = 1024
+
+
+def _intern(value: Any) -> Any:
+    """Compartilha strings repetidas entre conversas (enums, chaves, perguntas do agente)"""
+    if isinstance(value, str):
+        return _CANONICAL_VALUES.get(value) or sys.intern(value)
+    return value
+
+
+def _value(value: Any) -> Any:
+    """Valor de collected_data: strings compartilhadas; outros tipos (raros) copiados"""
+    return _intern(value) if isinstance(value, str) else copy.deepcopy(value)
+
+
+def _tupled(value: Any) -> Any:
+    """Listas do pattern viram tuplas (imutáveis e menores), com as mesmas strings"""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _pairs(mapping) -> tuple:
+    """Dict de valores simples como tupla de pares, com as chaves compartilhadas"""
+    items = mapping.items() if isinstance(mapping, dict) else mapping
+    return tuple((sys.intern(key), value) for key, value in items)
+
+
+class CompactState:
+    """Representação compacta de ConversationState para os armazenamentos
+
+    Sem `__dict__` por instância, com tuplas no lugar de listas e dicts, papéis
+    do histórico como 0/1 e strings repetidas (passos, chaves, valores de enum,
+    perguntas do agente) compartilhadas entre conversas. O pattern guarda as
+    mesmas strings do objeto original, sem copiá-las. O agente continua
+    trabalhando com ConversationState: a conversão acontece ao ler e gravar.
+    """
+
+    __slots__ = ("current_step", "collected_data", "missing_information", "history",
+                 "slot_confidence", "slot_attempts", "turn_count", "turns_to_pattern",
+                 "pattern", "pattern_version", "pattern_inputs", "history_summary",
+                 "summarized_messages")
+
+    @classmethod
+    def from_state(cls, state: ConversationState) -> "CompactState":
+        compact = cls()
+        compact.current_step = sys.intern(state.current_step)
+        compact.collected_data = tuple((sys.intern(key), _value(value))
+                                       for key, value in state.collected_data.items())
+        compact.missing_information = tuple(sys.intern(item) for item in state.missing_information)
+        compact.history = tuple(
+            # Só as perguntas do agente se repetem entre conversas; o texto do usuário não é internado
+            (_ROLE_CODES[turn["role"]], sys.intern(turn["content"]) if turn["role"] == "assistant" else turn["content"])
+            for turn in state.conversation_history
+        )
+        compact.slot_confidence = _pairs(state.slot_confidence)
+        compact.slot_attempts = _pairs(state.slot_attempts)
+        compact.turn_count = state.turn_count
+        compact.turns_to_pattern = state.turns_to_pattern
+        compact.pattern = (
+            tuple(_tupled(getattr(state.pattern, field)) for field in PATTERN_FIELDS)
+            if state.pattern is not None else None
+        )
+        compact.pattern_version = state.pattern_version
+        compact.pattern_inputs = _pairs(state.pattern_inputs)
+        compact.history_summary = state.history_summary
+        compact.summarized_messages = state.summarized_messages
+        return compact
+
+    def to_state(self) -> ConversationState:
+        """Novo ConversationState (com listas e dicts próprios), sem revalidar os dados"""
+        pattern = None
+        if self.pattern is not None:
+            pattern = CrochetPattern.model_construct(**{
+                field: list(value) if isinstance(value, tuple) else value
+                for field, value in zip(PATTERN_FIELDS, self.pattern)
+            })
+        return ConversationState.model_construct(
+            current_step=self.current_step,
+            collected_data={key: value if isinstance(value, str) else copy.deepcopy(value)
+                            for key, value in self.collected_data},
+            missing_information=list(self.missing_information),
+            conversation_history=[{"role": HISTORY_ROLES[role], "content": content}
+                                  for role, content in self.history],
+            slot_confidence=dict(self.slot_confidence),
+            slot_attempts=dict(self.slot_attempts),
+            turn_count=self.turn_count,
+            turns_to_pattern=self.turns_to_pattern,
+            pattern=pattern,
+            pattern_version=self.pattern_version,
+            pattern_inputs=dict(self.pattern_inputs),
+            history_summary=self.history_summary,
+            summarized_messages=self.summarized_messages,
+        )
+
+    def to_bytes(self) -> bytes:
+        """Snapshot binário (JSON compacto, comprimido se grande), portável entre versões do Python"""
+        payload = json.dumps([getattr(self, name) for name in self.__slots__],
+                             ensure_ascii=False, separators=(",", ":")).encode()
+        if len(payload) < COMPRESS_MIN_BYTES:
+            return SNAPSHOT_MAGIC + b"j" + payload
+        return SNAPSHOT_MAGIC + b"z" + zlib.compress(payload, 1)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "CompactState":
+        header = len(SNAPSHOT_MAGIC)
+        if not blob.startswith(SNAPSHOT_MAGIC) or blob[header:header + 1] not in (b"j", b"z"):
+            raise ValueError("snapshot de conversa em formato desconhecido")
+        payload = blob[header + 1:]
+        payload = json.loads(zlib.decompress(payload) if blob[header:header + 1] == b"z" else payload)
+        compact = cls()
+        for name, value in zip(cls.__slots__, payload):
+            setattr(compact, name, value)
+        # Snapshots anteriores a um campo novo (sempre acrescentado no fim) usam o padrão
+        for name in cls.__slots__[len(payload):]:
+            setattr(compact, name, ConversationState.model_fields[name].default)
+        # O JSON devolve listas: volta para tuplas e strings compartilhadas
+        compact.current_step = sys.intern(compact.current_step)
+        compact.collected_data = tuple((sys.intern(key), _value(value)) for key, value in compact.collected_data)
+        compact.missing_information = tuple(sys.intern(item) for item in compact.missing_information)
+        compact.history = tuple((role, sys.intern(content) if role == _ROLE_CODES["assistant"] else content)
+                                for role, content in compact.history)
+        compact.slot_confidence = _pairs(compact.slot_confidence)
+        compact.slot_attempts = _pairs(compact.slot_attempts)
+        if compact.pattern is not None:
+            compact.pattern = tuple(_tupled(value) for value in compact.pattern)
+        compact.pattern_inputs = _pairs(compact.pattern_inputs)
+        return compact
+
+
+def snapshot(state: ConversationState) -> bytes:
+    """Serializa o estado da conversa no formato binário compacto"""
+    return CompactState.from_state(state).to_bytes()
+
+
+def restore(blob: bytes) -> ConversationState:
+    """Reconstrói o estado a partir de `snapshot`"""
+    return CompactState.from_bytes(blob).to_state()
@@ -0,0 +1,9 @@
+"""
+Configuração comum dos testes
+"""
+
+import os
+
+# Cada agente criado nos testes usa uma biblioteca de patterns própria, em memória,
+# em vez do patterns.db compartilhado
+os.environ.setdefault("PATTERN_LIBRARY_PATH", ":memory:")
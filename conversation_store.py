@@ -0,0 +1,278 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from compact_state import CompactState, restore, snapshot
+from models import ConversationState
+
+
+class ConversationConflictError(Exception):
+    """A conversa foi alterada por outra requisição desde que foi lida"""
+
+
+@dataclass
+class ConversationRecord:
+    """Conversa armazenada: estado do agente mais metadados
+
+    `version` é usada para controle de concorrência otimista: save() só grava
+    se a versão armazenada ainda for a mesma que foi lida.
+    """
+    conversation_id: str
+    state: ConversationState
+    created_at: datetime = field(default_factory=datetime.now)
+    version: int = 0
+
+
+class ConversationStore(ABC):
+    """Interface de armazenamento das conversas ativas"""
+
+    def create(self, state: ConversationState) -> ConversationRecord:
+        """Cria uma nova conversa com o estado inicial informado"""
+        record = ConversationRecord(conversation_id=str(uuid.uuid4()), state=state)
+        self._insert(record)
+        record.version = 1
+        return record
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[ConversationRecord]:
+        """Retorna uma cópia da conversa, ou None se ela não existir ou tiver expirado"""
+
+    @abstractmethod
+    def save(self, record: ConversationRecord):
+        """Persiste o estado da conversa e incrementa sua versão
+
+        Levanta ConversationConflictError se a conversa foi alterada (ou removida)
+        desde que o registro foi lido.
+        """
+
+    @abstractmethod
+    def _insert(self, record: ConversationRecord):
+        """Grava uma conversa nova, na versão 1"""
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> bool:
+        """Remove a conversa; retorna True se ela existia"""
+
+    @abstractmethod
+    def evict_expired(self) -> int:
+        """Remove conversas ociosas há mais tempo que o TTL; retorna quantas saíram"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Número de conversas armazenadas"""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Armazena as conversas no processo, com TTL de inatividade e limite LRU de entradas"""
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # conversation_id -> (último acesso, versão, created_at, CompactState)
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, state: ConversationState) -> ConversationRecord:
+        # A limpeza só percorre as entradas já expiradas, então é barata
+        self.evict_expired()
+        return super().create(state)
+
+    def get(self, conversation_id: str) -> Optional[ConversationRecord]:
+        with self._lock:
+            entry = self._records.get(conversation_id)
+            if entry is None:
+                return None
+
+            last_access, version, created_at, state = entry
+            now = time.monotonic()
+            if now - last_access > self.ttl_seconds:
+                del self._records[conversation_id]
+                return None
+
+            self._records[conversation_id] = (now, version, created_at, state)
+            self._records.move_to_end(conversation_id)
+
+        # Cada requisição trabalha na sua própria cópia, como nos outros backends
+        return ConversationRecord(
+            conversation_id=conversation_id,
+            state=state.to_state(),
+            created_at=created_at,
+            version=version
+        )
+
+    def save(self, record: ConversationRecord):
+        with self._lock:
+            entry = self._records.get(record.conversation_id)
+            if entry is None or entry[1] != record.version:
+                raise ConversationConflictError(record.conversation_id)
+
+            self._store(record, record.version + 1)
+        record.version += 1
+
+    def _insert(self, record: ConversationRecord):
+        with self._lock:
+            self._store(record, 1)
+
+    def _store(self, record: ConversationRecord, version: int):
+        self._records[record.conversation_id] = (
+            time.monotonic(), version, record.created_at, CompactState.from_state(record.state)
+        )
+        self._records.move_to_end(record.conversation_id)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            return self._records.pop(conversation_id, None) is not None
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            deadline = time.monotonic() - self.ttl_seconds
+            evicted = 0
+            # As entradas estão em ordem de acesso: as mais antigas vêm primeiro
+            while self._records:
+                conversation_id, (last_access, *_) = next(iter(self._records.items()))
+                if last_access > deadline:
+                    break
+                del self._records[conversation_id]
+                evicted += 1
+            return evicted
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Armazena as conversas em SQLite (modo WAL), substituto local do PostgreSQL/Supabase
+
+    O estado é gravado como snapshot binário (compact_state); linhas antigas,
+    em JSON, continuam legíveis e são convertidas no próximo save.
+    """
+
+    # A limpeza de conversas expiradas roda a cada N conversas criadas
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, path: str = "conversations.db", ttl_seconds: float = 86400):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._creates = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "conversation_id TEXT PRIMARY KEY, "
+            "state TEXT NOT NULL, "
+            "created_at TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "version INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(conversations)")]
+        if "version" not in columns:
+            # Bancos criados antes do controle de versão
+            self._db.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)"
+        )
+        self._db.commit()
+
+    def create(self, state: ConversationState) -> ConversationRecord:
+        self._creates += 1
+        if self._creates % self.EVICTION_INTERVAL == 0:
+            self.evict_expired()
+        return super().create(state)
+
+    def get(self, conversation_id: str) -> Optional[ConversationRecord]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, created_at, updated_at, version FROM conversations WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        state_data, created_at, updated_at, version = row
+        if time.time() - updated_at > self.ttl_seconds:
+            self.delete(conversation_id)
+            return None
+
+        return ConversationRecord(
+            conversation_id=conversation_id,
+            state=(restore(state_data) if isinstance(state_data, bytes)
+                   else ConversationState.model_validate_json(state_data)),
+            created_at=datetime.fromisoformat(created_at),
+            version=version
+        )
+
+    def save(self, record: ConversationRecord):
+        with self._lock:
+            # Compare-and-set: só grava se ninguém alterou a conversa desde a leitura
+            cursor = self._db.execute(
+                "UPDATE conversations SET state = ?, updated_at = ?, version = version + 1 "
+                "WHERE conversation_id = ? AND version = ?",
+                (snapshot(record.state), time.time(), record.conversation_id, record.version)
+            )
+            self._db.commit()
+
+        if cursor.rowcount == 0:
+            raise ConversationConflictError(record.conversation_id)
+        record.version += 1
+
+    def _insert(self, record: ConversationRecord):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO conversations (conversation_id, state, created_at, updated_at, version) "
+                "VALUES (?, ?, ?, ?, 1)",
+                (record.conversation_id, snapshot(record.state),
+                 record.created_at.isoformat(), time.time())
+            )
+            self._db.commit()
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,)
+            )
+            self._db.commit()
+            return cursor.rowcount > 0
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM conversations WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+def create_conversation_store() -> ConversationStore:
+    """Cria o armazenamento de conversas configurado nas variáveis de ambiente"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    ttl_seconds = float(os.getenv("CONVERSATION_TTL", "86400"))
+
+    if backend == "memory":
+        return InMemoryConversationStore(
+            ttl_seconds=ttl_seconds,
+            max_entries=int(os.getenv("CONVERSATION_MAX_ENTRIES", "10000"))
+        )
+    if backend == "sqlite":
+        return SQLiteConversationStore(
+            path=os.getenv("CONVERSATION_DB_PATH", "conversations.db"),
+            ttl_seconds=ttl_seconds
+        )
+
+    raise ValueError(f"CONVERSATION_STORE inválido: {backend} (use 'memory' ou 'sqlite')")
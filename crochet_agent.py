@@ -1,18 +1,101 @@
+import json
 import os
-from typing import Dict, List, Any
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.prompts import ChatPromptTemplate
+import re
+import asyncio
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Any, AsyncIterator, Optional, Tuple, Union
 from models import ConversationState, CrochetPattern, PieceType, Size
+from pattern_parser import PATTERN_OUTPUT_SCHEMA, PatternStreamParser, parse_pattern_output
+from pattern_cache import PATTERN_INPUT_FIELDS, PatternCache, normalize_pattern_inputs, pattern_cache_key
+from pattern_library import create_pattern_library
+from similarity import SimilarityIndex, create_similarity_index
+from knowledge_base import TechniqueSplicer, create_knowledge_base
+from singleflight import SingleFlight
+from extraction import PIECE_TYPES, EntityExtractor
+from slots import SLOTS_BY_NAME, SlotFiller
+from history import create_history_policy
+from metrics import STAGE_SECONDS, timed
+
+# LangChain, cliente da OpenAI e NumPy são importados só quando usados, para o
+# servidor subir rápido: os primeiros turnos da conversa não precisam deles
+if TYPE_CHECKING:
+    from http_pool import HTTPPool
+    from llm_client import ResilientLLM
+    from stitch_math import GradedPlan, StitchPlan
+
+# Versão do prompt de geração; altere ao mudar o prompt para invalidar o cache
+PROMPT_VERSION = "5"
+
+# Formatos de resposta do LLM na geração: objeto JSON (padrão) ou texto livre
+PATTERN_OUTPUT_MODES = ("json", "text")
+
+# Campos que, ao mudar depois do pattern pronto, são revisados localmente
+# (materiais, notas e menções no texto) sem gerar o pattern de novo
+LOCALLY_REVISABLE_FIELDS = ("color", "yarn_type")
+
+# Como cada campo aparece nas mensagens para o usuário
+FIELD_LABELS = {
+    "piece_type": "peça",
+    "size": "tamanho",
+    "color": "cor",
+    "yarn_type": "fio",
+    "yarn_weight": "espessura do fio",
+    "style_details": "detalhes",
+    "measurements": "medidas",
+    "gauge": "amostra",
+}
 
 class CrochetConversationalAgent:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0.7,
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+        self.model_name = "gpt-4"
+        # Cliente do LLM e pool de conexões: criados no primeiro uso (ver `llm`)
+        self._llm: Optional["ResilientLLM"] = None
+        self._http_pool: Optional["HTTPPool"] = None
+        self._llm_lock = threading.Lock()
+        # Event loop das chamadas síncronas (ver `generate_pattern`), criado no primeiro uso
+        self._sync_loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Resposta estruturada (JSON com as listas do pattern) ou texto livre
+        self.pattern_output = os.getenv("PATTERN_OUTPUT", "json").lower()
+        if self.pattern_output not in PATTERN_OUTPUT_MODES:
+            raise ValueError(f"PATTERN_OUTPUT inválido: {self.pattern_output} (use 'json' ou 'text')")
+        
+        # Limita o número de chamadas ao LLM em andamento ao mesmo tempo
+        self.max_concurrent_generations = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.llm_semaphore = asyncio.Semaphore(self.max_concurrent_generations)
+        
+        # Cache de patterns já gerados (memória + disco opcional)
+        self.pattern_cache = PatternCache(
+            max_entries=int(os.getenv("PATTERN_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("PATTERN_CACHE_TTL", "86400")),
+            path=os.getenv("PATTERN_CACHE_PATH") or None
         )
         
+        # Biblioteca de todos os patterns gerados (busca por texto em GET /patterns). Com
+        # PATTERN_LIBRARY_REUSE=true, um pattern que só difira na cor ou no fio é
+        # revisado e entregue no lugar de uma nova geração
+        self.pattern_library = create_pattern_library()
+        self.library_reuse = os.getenv("PATTERN_LIBRARY_REUSE", "false").lower() in ("1", "true", "yes")
+        # Pedidos quase iguais (detalhes de estilo escritos de outro jeito) reaproveitam o pattern
+        self.similarity_index = create_similarity_index()
+        self._similarity_loaded = False
+        
+        # Pontos, construção e técnicas escritos localmente, fora da resposta do LLM
+        self.knowledge_base = create_knowledge_base()
+        
+        # Extrator de entidades (léxico compilado uma única vez) e preenchimento dos campos
+        self.extractor = EntityExtractor()
+        self.slot_filler = SlotFiller(
+            self.extractor, max_attempts=int(os.getenv("SLOT_MAX_ATTEMPTS", "2"))
+        )
+        
+        # Histórico limitado com resumo das mensagens antigas (ver history.py)
+        self.history_policy = create_history_policy()
+        
+        # Gerações em andamento, agrupadas por chave do cache
+        self.inflight_generations = SingleFlight()
+        
         # Estados possíveis da conversa
         self.conversation_states = {
             "greeting": "Cumprimentar e perguntar que tipo de peça quer fazer",
@@ -52,14 +135,51 @@ class CrochetConversationalAgent:
         O foco da conversa é somente crochê, caso o usuário fale sobre outros assuntos, retorne que você é um assistente de crochê e que o foco da conversa é somente crochê.
         """
     
+    @property
+    def llm(self) -> "ResilientLLM":
+        """Cliente do LLM, criado no primeiro uso (a chave da OpenAI só é exigida aqui)"""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    from http_pool import create_http_pool
+                    from llm_client import create_llm_client
+                    
+                    # Conexões HTTP reaproveitadas por todas as chamadas ao LLM
+                    self._http_pool = create_http_pool()
+                    # Prazo, novas tentativas, hedging e modelo reserva (ver llm_client.py)
+                    self._llm = create_llm_client(
+                        self.model_name,
+                        temperature=0.7,
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        pool=self._http_pool
+                    )
+        return self._llm
+    
+    @llm.setter
+    def llm(self, llm: Any):
+        self._llm = llm
+    
+    @property
+    def llm_ready(self) -> bool:
+        """Se o cliente do LLM já foi criado"""
+        return self._llm is not None
+    
+    @property
+    def http_pool(self) -> Optional["HTTPPool"]:
+        """Pool de conexões do LLM, ou None se o LLM ainda não foi usado"""
+        return self._http_pool
+    
+    async def aclose(self):
+        """Fecha as conexões do LLM, se foram abertas"""
+        if self._http_pool is not None:
+            await self._http_pool.aclose()
+    
+    @timed("get_next_question")
     def get_next_question(self, state: ConversationState, user_message: str) -> str:
         """Determina a próxima pergunta baseada no estado atual e na mensagem do usuário"""
         
         # Atualiza o histórico da conversa
-        state.conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
+        self.history_policy.append(state, "user", user_message, self.system_prompt)
         
         # Extrai informações da mensagem do usuário
         self._extract_information(state, user_message)
@@ -72,71 +192,27 @@ class CrochetConversationalAgent:
         
         # Atualiza o estado
         state.current_step = next_step
-        state.conversation_history.append({
-            "role": "assistant", 
-            "content": question
-        })
+        self.history_policy.append(state, "assistant", question, self.system_prompt)
         
         return question
     
+    def conversation_messages(self, state: ConversationState) -> List[Dict[str, str]]:
+        """Prompt conversacional da conversa: sistema, resumo das mensagens antigas e histórico recente"""
+        return self.history_policy.messages(state, self.system_prompt)
+    
+    def prompt_size(self, state: ConversationState) -> Dict[str, Any]:
+        """Tamanho efetivo (estimado em tokens) do prompt conversacional"""
+        return self.history_policy.prompt_size(state, self.system_prompt)
+    
+    @timed("extract_information")
     def _extract_information(self, state: ConversationState, message: str):
         """Extrai informações relevantes da mensagem do usuário"""
-        message_lower = message.lower()
-        
-        # Identifica tipo de peça
-        piece_types = {
-            "colete": "colete", "blusa": "blusa", "chapeu": "chapeu", 
-            "cachecol": "cachecol", "luvas": "luvas", "meias": "meias",
-            "cobertor": "cobertor", "bolsa": "bolsa"
-        }
-        
-        for keyword, piece_type in piece_types.items():
-            if keyword in message_lower:
-                state.collected_data["piece_type"] = piece_type
-                break
-        
-        # Identifica tamanho
-        sizes = ["xs", "s", "m", "l", "xl", "xxl", "pequeno", "médio", "grande"]
-        for size in sizes:
-            if size in message_lower:
-                state.collected_data["size"] = size.upper() if size in ["xs", "s", "m", "l", "xl", "xxl"] else size
-                break
-        
-        # Identifica cor
-        colors = ["azul", "vermelho", "verde", "amarelo", "preto", "branco", "rosa", "roxo", "cinza", "marrom"]
-        for color in colors:
-            if color in message_lower:
-                state.collected_data["color"] = color
-                break
-        
-        # Identifica detalhes específicos
-        if "manga" in message_lower:
-            if "bufante" in message_lower or "bufê" in message_lower:
-                state.collected_data["sleeve_type"] = "bufante"
-            elif "justa" in message_lower:
-                state.collected_data["sleeve_type"] = "justa"
-            elif "sem manga" in message_lower:
-                state.collected_data["sleeve_type"] = "sem manga"
+        self.slot_filler.fill(state, message)
     
+    @timed("determine_next_step")
     def _determine_next_step(self, state: ConversationState) -> str:
         """Determina qual deve ser o próximo passo da conversa"""
-        
-        data = state.collected_data
-        
-        if not data.get("piece_type"):
-            return "piece_type"
-        elif not data.get("size"):
-            return "size"
-        elif not data.get("color"):
-            return "color"
-        elif not data.get("yarn_type"):
-            return "yarn_preferences"
-        elif not data.get("yarn_weight"):
-            return "yarn_preferences"
-        elif not data.get("style_details"):
-            return "style_details"
-        else:
-            return "pattern_generation"
+        return self.slot_filler.next_step(state)
     
     def _generate_question(self, state: ConversationState, step: str) -> str:
         """Gera a pergunta apropriada para cada passo"""
@@ -147,17 +223,25 @@ class CrochetConversationalAgent:
             return "Olá! Que prazer te ajudar a criar um pattern de crochê personalizado! Que tipo de peça você gostaria de fazer hoje?"
         
         elif step == "piece_type":
+            if self.slot_filler.attempts(state, step) > 0:
+                pieces = sorted(set(PIECE_TYPES.values()))
+                return (f"Ainda não reconheci a peça. Por enquanto eu sei fazer: {', '.join(pieces)}. "
+                        f"Qual delas você quer? Se nenhuma servir, começo com um {SLOTS_BY_NAME['piece_type'].default}.")
             return "Que tipo de peça você quer fazer? Pode ser um colete, blusa, chapeu, cachecol, luvas, meias, cobertor ou bolsa?"
         
         elif step == "size":
             piece = data.get("piece_type", "peça")
-            return f"Perfeito! Um(a) {piece}. Qual tamanho você precisa? (XS, S, M, L, XL, XXL ou tem alguma medida específica?)"
+            return f"Perfeito! Um(a) {piece}. Qual tamanho você precisa? (XS, S, M, L, XL, XXL ou tem alguma medida específica, como \"busto 92 cm\"?)" + self._skip_hint(state, step)
         
         elif step == "color":
             return "Que cor você gostaria? Pode me dizer sua cor preferida ou se tem alguma paleta específica em mente?"
         
         elif step == "yarn_preferences":
-            return "Que tipo de fio você prefere trabalhar? E qual peso? (Por exemplo: algodão fino, lã média, acrílico grosso, etc.)"
+            if data.get("yarn_type") and not data.get("yarn_weight"):
+                return f"Ótimo, {data['yarn_type']}! E qual a espessura do fio? (fino, médio ou grosso)" + self._skip_hint(state, step)
+            if data.get("yarn_weight") and not data.get("yarn_type"):
+                return f"Fio {data['yarn_weight']}, anotado! E de qual material? (algodão, lã, acrílico, etc.)" + self._skip_hint(state, step)
+            return "Que tipo de fio você prefere trabalhar? E qual peso? (Por exemplo: algodão fino, lã média, acrílico grosso, etc.)" + self._skip_hint(state, step)
         
         elif step == "style_details":
             piece = data.get("piece_type", "")
@@ -167,18 +251,394 @@ class CrochetConversationalAgent:
                 return "Tem algum detalhe específico que você gostaria de incluir nesta peça?"
         
         elif step == "pattern_generation":
+            if state.pattern is not None:
+                changes = self.pattern_changes(state)
+                if not changes:
+                    return "Seu pattern já está pronto! Se quiser mudar algo, é só dizer (por exemplo: \"muda a cor para rosa\")."
+                described = ", ".join(
+                    FIELD_LABELS[field] if isinstance(data.get(field), dict) else f"{FIELD_LABELS[field]}: {data.get(field)}"
+                    for field in changes
+                )
+                return f"Certo! Vou atualizar seu pattern ({described})."
             return "Perfeito! Tenho todas as informações que preciso. Vou gerar seu pattern personalizado agora!"
         
         return "Como posso te ajudar com seu pattern de crochê?"
     
+    def _skip_hint(self, state: ConversationState, step: str) -> str:
+        """Ao repetir uma pergunta, lembra que dá para pular"""
+        if self.slot_filler.attempts(state, step) > 0:
+            return " Se não tiver preferência, é só dizer \"tanto faz\"."
+        return ""
+    
     def generate_pattern(self, state: ConversationState) -> CrochetPattern:
-        """Gera o pattern de crochê baseado nas informações coletadas"""
+        """Gera o pattern de crochê baseado nas informações coletadas
+        
+        Versão síncrona para scripts, fora de um event loop: roda agenerate_pattern,
+        então prazo, novas tentativas e modelo reserva são os mesmos da API. Todas as
+        chamadas usam o mesmo event loop, onde ficam as conexões do pool.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.agenerate_pattern(state), self._background_loop())
+        return future.result()
+    
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop próprio, rodando numa thread, para as chamadas síncronas"""
+        if self._sync_loop is None:
+            with self._llm_lock:
+                if self._sync_loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="crochet-sync-loop", daemon=True).start()
+                    self._sync_loop = loop
+        return self._sync_loop
+    
+    async def agenerate_pattern(self, state: ConversationState) -> CrochetPattern:
+        """Versão assíncrona de generate_pattern, que não bloqueia o event loop"""
+        
+        pattern = await self.aready_pattern(state)
+        if pattern is None:
+            pattern = await self.agenerate_pattern_for(state.collected_data)
+            self._remember_pattern(state, pattern)
+        return pattern
+    
+    def ready_pattern(self, state: ConversationState) -> Optional[CrochetPattern]:
+        """Pattern que pode ser entregue sem chamar o LLM, ou None
+        
+        O pattern da conversa é reaproveitado ou revisado; senão, valem o cache e a biblioteca.
+        """
+        pattern = self._reuse_or_revise_pattern(state)
+        if pattern is not None:
+            return pattern
+        
+        # Pedidos idênticos (ou só com outra cor/fio) já gerados voltam sem chamar o LLM
+        data = state.collected_data
+        pattern = self.stored_pattern(self.pattern_cache_key(data), data)
+        if pattern is not None:
+            self._remember_pattern(state, pattern)
+        return pattern
+    
+    async def aready_pattern(self, state: ConversationState) -> Optional[CrochetPattern]:
+        """ready_pattern sem bloquear o event loop: cache em disco e biblioteca rodam numa thread"""
+        if state.pattern is not None and not self.pattern_changes(state):
+            # Nada mudou: o pattern da conversa volta sem consultar nada
+            return state.pattern.model_copy(deep=True)
+        return await asyncio.to_thread(self.ready_pattern, state)
+    
+    @timed("generate_pattern")
+    async def agenerate_pattern_for(self, data: Dict[str, Any]) -> CrochetPattern:
+        """Gera (ou busca no cache) o pattern para os dados informados, sem conversa"""
+        
+        key = self.pattern_cache_key(data)
+        pattern = await self.astored_pattern(key, data)
+        if pattern is None:
+            # Gerações idênticas simultâneas compartilham uma única chamada ao LLM
+            inputs = dict(data)
+            pattern = await self.inflight_generations.do(
+                key, lambda: self._agenerate_and_cache(key, inputs)
+            )
+            pattern = pattern.model_copy(deep=True)
+        return pattern
+    
+    def attach_pattern(self, state: ConversationState, data: Dict[str, Any], pattern: CrochetPattern) -> bool:
+        """Guarda na conversa um pattern gerado fora dela (ex.: em segundo plano)
+        
+        Só grava se a conversa ainda pede os mesmos dados e não tem esse pattern.
+        """
+        inputs = normalize_pattern_inputs(data)
+        if normalize_pattern_inputs(state.collected_data) != inputs or state.pattern_inputs == inputs:
+            return False
+        self._remember_pattern(state, pattern)
+        return True
+    
+    async def astream_pattern(self, state: ConversationState, lookup: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """Gera o pattern em streaming, emitindo tokens, linhas de instrução e o pattern final
+        
+        Com `lookup=False`, quem chama já consultou aready_pattern e não achou nada.
+        """
         
         data = state.collected_data
+        key = self.pattern_cache_key(data)
+        
+        cached = await self.aready_pattern(state) if lookup else None
+        flight = None
+        if cached is None:
+            # Registra esta geração: pedidos idênticos simultâneos esperam por ela
+            flight = self.inflight_generations.claim(key)
+            if flight is None:
+                # Uma geração idêntica já está em andamento: aguarda por ela
+                cached = await self.agenerate_pattern(state)
+        
+        if cached is not None:
+            async for event in self.replay_pattern(cached):
+                yield event
+            return
+        
+        try:
+            async for event in self._astream_generation(data, key, flight):
+                if event["event"] == "pattern":
+                    self._remember_pattern(state, event["data"])
+                yield event
+        finally:
+            # Interrompida (erro ou cliente desconectado): quem esperava gera de novo
+            self.inflight_generations.abandon(flight)
+    
+    async def replay_pattern(self, pattern: CrochetPattern) -> AsyncIterator[Dict[str, Any]]:
+        """Eventos do streaming para um pattern já pronto: as linhas de instrução e o pattern"""
+        for line in pattern.instructions:
+            if line.strip():
+                yield {"event": "instruction", "data": line}
+        yield {"event": "pattern", "data": pattern}
+    
+    async def _astream_generation(self, data: Dict[str, Any], key: str,
+                                  flight: "asyncio.Future[CrochetPattern]") -> AsyncIterator[Dict[str, Any]]:
+        """Chamada ao LLM em streaming; o pattern final também vai para quem espera em `flight`"""
+        messages = self._build_pattern_messages(data)
+        
+        # Os marcadores de técnica são trocados pelo passo a passo conforme as linhas chegam
+        splicer = self._technique_splicer(data)
+        instructions: List[str] = []
+        
+        # Lê a resposta enquanto ela chega: cada linha de instrução sai assim que fecha
+        parser = PatternStreamParser()
+        
+        queued = time.perf_counter()
+        async with self.llm_semaphore:
+            STAGE_SECONDS.observe("llm_queue", time.perf_counter() - queued)
+            async for chunk in self._timed_stream(messages):
+                text = chunk.content
+                if not text:
+                    continue
+                
+                yield {"event": "token", "data": text}
+                
+                for field, value in parser.feed(text):
+                    if field == "instructions":
+                        for line in splicer.feed(str(value)) if splicer is not None else [str(value)]:
+                            instructions.append(line)
+                            yield {"event": "instruction", "data": line}
+        
+        # No modo texto a última linha só fecha aqui
+        streamed = len(parser.fields.get("instructions", []))
+        fields = parser.finish()
+        tail = [str(line) for line in fields["instructions"][streamed:]]
+        if splicer is not None:
+            tail = [spliced for line in tail for spliced in splicer.feed(line)] + splicer.finish()
+        for line in tail:
+            instructions.append(line)
+            yield {"event": "instruction", "data": line}
+        
+        pattern = self._build_pattern(data, {**fields, "instructions": instructions}, spliced=True)
+        await self._astore_pattern(key, data, pattern)
+        flight.set_result(pattern)
+        yield {"event": "pattern", "data": pattern.model_copy(deep=True)}
+    
+    def pattern_changes(self, state: ConversationState) -> List[str]:
+        """Campos que mudaram desde o último pattern entregue na conversa"""
+        if state.pattern is None:
+            return list(PATTERN_INPUT_FIELDS)
+        
+        inputs = normalize_pattern_inputs(state.collected_data)
+        return [field for field in PATTERN_INPUT_FIELDS if inputs[field] != state.pattern_inputs.get(field)]
+    
+    def _reuse_or_revise_pattern(self, state: ConversationState) -> Optional[CrochetPattern]:
+        """Devolve o pattern da conversa sem chamar o LLM, quando possível
+        
+        - nada mudou ("obrigado"): o mesmo pattern, na mesma versão
+        - só cor e/ou fio mudaram: revisa materiais, notas e menções no texto
+        - qualquer outra mudança: None, o pattern precisa ser gerado de novo
+        """
+        changes = self.pattern_changes(state)
+        if not changes:
+            return state.pattern.model_copy(deep=True)
+        
+        if state.pattern is None or not set(changes) <= set(LOCALLY_REVISABLE_FIELDS):
+            return None
+        
+        pattern = self._revise_pattern(state.pattern, state.pattern_inputs, state.collected_data, changes)
+        self._store_pattern(self.pattern_cache_key(state.collected_data), state.collected_data, pattern)
+        self._remember_pattern(state, pattern)
+        return pattern
+    
+    def _revise_pattern(self, pattern: CrochetPattern, old_inputs: Dict[str, str],
+                        data: Dict[str, Any], changes: List[str]) -> CrochetPattern:
+        """Atualiza só as seções afetadas pelos campos alterados"""
+        from stitch_math import plan_for
+        
+        revised = pattern.model_copy(deep=True)
+        revised.color = data.get('color', '')
+        plan = plan_for(data)
+        revised.materials = self._build_materials(data, plan)
+        # As notas calculadas vêm primeiro; as dicas escritas pelo LLM são mantidas
+        llm_notes = pattern.special_notes[len(self._build_special_notes(old_inputs, plan)):]
+        revised.special_notes = self._build_special_notes(data, plan)
+        
+        # Troca as menções ao valor antigo nas instruções e dicas ("fio azul" -> "fio rosa")
+        for field in changes:
+            old_value, new_value = old_inputs.get(field), data.get(field)
+            if not old_value or not new_value:
+                continue
+            mention = re.compile(rf"\b{re.escape(old_value)}\b", re.IGNORECASE)
+            revised.instructions = [mention.sub(str(new_value), line) for line in revised.instructions]
+            llm_notes = [mention.sub(str(new_value), note) for note in llm_notes]
+        
+        revised.special_notes += llm_notes
+        
+        return revised
+    
+    def _remember_pattern(self, state: ConversationState, pattern: CrochetPattern):
+        """Guarda o pattern entregue na conversa e incrementa sua versão"""
+        state.pattern = pattern.model_copy(deep=True)
+        state.pattern_inputs = normalize_pattern_inputs(state.collected_data)
+        state.pattern_version += 1
+    
+    def pattern_cache_key(self, data: Dict[str, Any]) -> str:
+        """Chave do cache para os dados coletados, considerando modelo e versão do prompt"""
+        return pattern_cache_key(data, self.model_name, self._prompt_variant())
+    
+    @property
+    def pattern_generator(self) -> str:
+        """Modelo e versão do prompt que geram os patterns (patterns de outro prompt não são reaproveitados)"""
+        return f"{self.model_name}:{self._prompt_variant()}"
+    
+    def _prompt_variant(self) -> str:
+        """Versão do prompt com as opções que o mudam (formato da resposta, base de técnicas)"""
+        return f"{PROMPT_VERSION}-{self.pattern_output}" + ("-kb" if self.knowledge_base is not None else "")
+    
+    def stored_pattern(self, key: str, data: Dict[str, Any]) -> Optional[CrochetPattern]:
+        """Pattern já gerado para os dados: do cache ou revisado a partir da biblioteca
+        
+        Da biblioteca vale, com `library_reuse`, um pattern que só mude cor e fio
+        ou, pelo índice de similaridade, um com detalhes de estilo quase iguais.
+        Consulta o SQLite: nos caminhos assíncronos, use `astored_pattern`.
+        """
+        pattern = self.pattern_cache.get(key)
+        if pattern is not None:
+            return pattern
+        
+        match = None
+        if self.library_reuse:
+            match = self.pattern_library.close_match(data, vary=LOCALLY_REVISABLE_FIELDS,
+                                                     generator=self.pattern_generator)
+        if match is None:
+            match = self._similar_pattern(data)
+        if match is None:
+            return None
+        pattern_id, inputs, pattern = match
+        changes = [field for field in LOCALLY_REVISABLE_FIELDS if inputs[field] != normalize_pattern_inputs(data)[field]]
+        if changes:
+            pattern = self._revise_pattern(pattern, inputs, data, changes)
+        self.pattern_library.mark_used(pattern_id)
+        self.pattern_cache.set(key, pattern)
+        return pattern
+    
+    def _similar_pattern(self, data: Dict[str, Any]) -> Optional[Tuple[int, Dict[str, str], CrochetPattern]]:
+        """Pattern da biblioteca com a mesma forma e detalhes de estilo parecidos, ou None"""
+        index = self._similarity()
+        found = index.lookup(data) if index is not None else None
+        if found is None:
+            return None
+        entry = self.pattern_library.get(found[0])
+        if entry is None:
+            return None
+        return entry["pattern_id"], entry["inputs"], entry["pattern"]
+    
+    def _similarity(self) -> Optional[SimilarityIndex]:
+        """Índice de similaridade, carregado da biblioteca (se persistida) no primeiro uso"""
+        if self.similarity_index is not None and not self._similarity_loaded:
+            self._similarity_loaded = True
+            for pattern_id, inputs in self.pattern_library.requests(self.pattern_generator):
+                self.similarity_index.add(pattern_id, inputs)
+        return self.similarity_index
+    
+    async def astored_pattern(self, key: str, data: Dict[str, Any]) -> Optional[CrochetPattern]:
+        """stored_pattern fora do event loop (biblioteca e cache em disco são SQLite)"""
+        return await asyncio.to_thread(self.stored_pattern, key, data)
+    
+    async def _astore_pattern(self, key: str, data: Dict[str, Any], pattern: CrochetPattern):
+        """_store_pattern fora do event loop"""
+        await asyncio.to_thread(self._store_pattern, key, data, pattern)
+    
+    def _store_pattern(self, key: str, data: Dict[str, Any], pattern: CrochetPattern):
+        """Guarda um pattern gerado (ou revisado) no cache, na biblioteca e no índice de similaridade"""
+        self.pattern_cache.set(key, pattern)
+        pattern_id = self.pattern_library.add(key, data, pattern, generator=self.pattern_generator)
+        index = self._similarity()
+        if index is not None:
+            index.add(pattern_id, data)
+    
+    @timed("generate_graded_pattern")
+    async def agenerate_graded_pattern(self, data: Dict[str, Any]) -> CrochetPattern:
+        """Gera um único pattern com os números de todos os tamanhos, numa só chamada ao LLM"""
+        
+        from stitch_math import grade_for
+        
+        # Todos os tamanhos calculados de uma vez; o tamanho do pattern é "XS (S, M, L, XL, XXL)"
+        graded = grade_for(data)
+        inputs = {**data, "size": graded.size_label}
+        key = self.pattern_cache_key(inputs)
+        
+        pattern = self.pattern_cache.get(key)
+        if pattern is None:
+            pattern = await self.inflight_generations.do(
+                key, lambda: self._agenerate_and_cache(key, inputs, graded)
+            )
+            pattern = pattern.model_copy(deep=True)
+        return pattern
+    
+    async def _agenerate_and_cache(self, key: str, data: Dict[str, Any],
+                                   plan: Optional["GradedPlan"] = None) -> CrochetPattern:
+        """Gera o pattern e guarda o resultado no cache e na biblioteca"""
+        pattern = await self._agenerate_uncached(data, plan)
+        await self._astore_pattern(key, data, pattern)
+        return pattern
+    
+    async def _agenerate_uncached(self, data: Dict[str, Any],
+                                  plan: Optional["GradedPlan"] = None) -> CrochetPattern:
+        """Chama o LLM para gerar o pattern, respeitando o limite de concorrência"""
+        
+        messages = self._build_pattern_messages(data, plan)
+        
+        # Espera por uma vaga antes de chamar o LLM
+        queued = time.perf_counter()
+        async with self.llm_semaphore:
+            STAGE_SECONDS.observe("llm_queue", time.perf_counter() - queued)
+            with STAGE_SECONDS.time("llm_generation"):
+                response = await self.llm.ainvoke(messages)
+        
+        return self._build_pattern(data, response.content, plan)
+    
+    async def _timed_stream(self, messages: List[Any]) -> AsyncIterator[Any]:
+        """Streaming do LLM, registrando o tempo até o primeiro token e o total"""
+        started = time.perf_counter()
+        first = True
+        with STAGE_SECONDS.time("llm_generation"):
+            async for chunk in self.llm.astream(messages):
+                if first:
+                    STAGE_SECONDS.observe("llm_first_token", time.perf_counter() - started)
+                    first = False
+                yield chunk
+    
+    def _build_pattern_messages(self, data: Dict[str, Any], plan: Optional["GradedPlan"] = None) -> List[Any]:
+        """Monta as mensagens enviadas ao LLM para gerar o pattern"""
+        from langchain.schema import HumanMessage, SystemMessage
+        from stitch_math import GradedPlan, plan_for
+        
+        # Os números vêm prontos do cálculo local; o LLM só escreve o texto
+        plan = plan or plan_for(data)
+        numbers = "\n".join(f"        - {line}" for line in plan.summary())
+        knowledge = ""
+        if self.knowledge_base is not None:
+            # Só os trechos relevantes: estrutura da peça, abreviações e marcadores das técnicas
+            section = self.knowledge_base.prompt_section(self.knowledge_base.retrieve(data))
+            knowledge = "\n" + "\n".join(f"        {line}" for line in section.split("\n")) if section else ""
+        grading = ""
+        if isinstance(plan, GradedPlan):
+            grading = f"""
+        O pattern é graduado: os números aparecem no formato {plan.size_label}, um valor por
+        tamanho. Mantenha esse formato em todas as contagens das instruções.
+        """
         
         # Prompt para geração do pattern
         pattern_prompt = f"""
-        Gere um pattern de crochê completo e detalhado baseado nas seguintes informações:
+        Escreva as instruções passo a passo de um pattern de crochê com as seguintes informações:
         
         Tipo de peça: {data.get('piece_type', 'não especificado')}
         Tamanho: {data.get('size', 'não especificado')}
@@ -187,42 +647,91 @@ class CrochetConversationalAgent:
         Peso do fio: {data.get('yarn_weight', 'não especificado')}
         Detalhes específicos: {data.get('style_details', 'não especificados')}
         
-        O pattern deve incluir:
-        1. Lista de materiais necessários
-        2. Tamanho do gancho recomendado
-        3. Medida da amostra (gauge)
-        4. Instruções passo a passo detalhadas
-        5. Pontos utilizados
-        6. Nível de dificuldade
-        7. Notas especiais
-        
-        Seja específico e técnico, mas mantenha as instruções claras para crocheteiros de nível intermediário.
+        Números já calculados (use exatamente estes valores, não recalcule):
+{numbers}
+{knowledge}
+        
+        Escreva apenas as instruções, parte por parte e carreira por carreira (agrupe as
+        carreiras repetidas), {"com as abreviações dos pontos" if knowledge else "citando os pontos utilizados"}. Não repita a lista de materiais,
+        a agulha nem a amostra. Mantenha as instruções claras para crocheteiros de nível intermediário.
+        {grading}"""
+        if self.pattern_output == "json":
+            # Uma linha de instrução por item: o parser entrega cada uma assim que fecha
+            pattern_prompt += f"""
+        Responda somente com um objeto JSON que siga este esquema, sem texto antes ou depois:
+        {json.dumps(PATTERN_OUTPUT_SCHEMA, ensure_ascii=False)}
+        Em "instructions", um item por linha de instrução (títulos das partes também).
+        Em "special_notes", dicas de acabamento e técnica específicas desta peça (opcional).
         """
         
-        messages = [
+        return [
             SystemMessage(content="Você é um especialista em crochê que cria patterns detalhados e profissionais."),
             HumanMessage(content=pattern_prompt)
         ]
-        
-        response = self.llm(messages)
-        pattern_text = response.content
-        
-        # Aqui você pode processar a resposta para extrair informações estruturadas
-        # Por enquanto, vou retornar um pattern básico estruturado
-        
+    
+    def _build_pattern(self, data: Dict[str, Any], output: Union[str, Dict[str, Any]],
+                       plan: Optional["GradedPlan"] = None, spliced: bool = False) -> CrochetPattern:
+        """Monta o CrochetPattern a partir da resposta do LLM e dos números calculados
+        
+        `output` é o texto da resposta ou os campos já lidos pelo PatternStreamParser.
+        Agulha, amostra, materiais, dificuldade e tempo vêm do cálculo local; do LLM
+        vêm as instruções e as dicas, somadas às notas calculadas. Com a base de
+        técnicas, o passo a passo das técnicas entra nas instruções (a menos que
+        já venha inserido, `spliced`) e a legenda dos pontos, nas notas.
+        """
+        from stitch_math import plan_for
+        
+        plan = plan or plan_for(data)
+        fields = parse_pattern_output(output) if isinstance(output, str) else output
+        instructions = [str(line) for line in fields["instructions"]]
+        notes = self._build_special_notes(data, plan)
+        notes += [str(note) for note in fields.get("special_notes") or [] if str(note) not in notes]
+        splicer = self._technique_splicer(data)
+        if splicer is not None:
+            if not spliced:
+                instructions = splicer.splice(instructions)
+            notes += [line for line in splicer.legend() if line not in notes]
         return CrochetPattern(
             piece_type=data.get('piece_type', ''),
             size=data.get('size', ''),
             color=data.get('color', ''),
             yarn_weight=data.get('yarn_weight', ''),
-            hook_size="5.0mm",  # Seria extraído da resposta do LLM
-            gauge="18 pontos x 20 carreiras = 10cm",
-            materials=["Fio de algodão", "Gancho 5.0mm", "Tesoura", "Agulha de tapeçaria"],
-            instructions=pattern_text.split('\n'),
-            special_notes=["Ajuste o tamanho conforme necessário"],
-            difficulty_level="Intermediário"
+            hook_size=plan.hook_size,
+            gauge=plan.gauge,
+            materials=self._build_materials(data, plan),
+            instructions=instructions,
+            special_notes=notes,
+            difficulty_level=plan.difficulty_level,
+            estimated_time=plan.estimated_time
         )
     
+    def _technique_splicer(self, data: Dict[str, Any]) -> Optional[TechniqueSplicer]:
+        """Insere o texto da base de técnicas nas instruções, ou None sem a base"""
+        if self.knowledge_base is None:
+            return None
+        return self.knowledge_base.splicer(self.knowledge_base.retrieve(data))
+    
+    def _build_materials(self, data: Dict[str, Any], plan: Union["StitchPlan", "GradedPlan"]) -> List[str]:
+        """Lista de materiais a partir do fio, da cor e da metragem calculada"""
+        # Campos pulados ("sem preferência") não entram na descrição do fio
+        yarn = " ".join(
+            str(data[field]) for field in ("yarn_type", "yarn_weight")
+            if data.get(field) and data[field] != "sem preferência"
+        )
+        color = data.get('color') if data.get('color') != "sem preferência" else None
+        return [f"Cerca de {plan.yarn_amount} de fio {yarn or 'de algodão'} na cor {color or 'à escolha'}",
+                f"Gancho {plan.hook_size}", "Marcadores de ponto", "Tesoura", "Agulha de tapeçaria"]
+    
+    def _build_special_notes(self, data: Dict[str, Any], plan: Union["StitchPlan", "GradedPlan"]) -> List[str]:
+        """Notas gerais, de amostra e sobre a cor"""
+        notes = [
+            f"Faça uma amostra antes de começar: {plan.gauge}. Se der mais pontos, use uma agulha maior; se der menos, uma menor",
+            "Ajuste o tamanho conforme necessário",
+        ]
+        if data.get('color'):
+            notes.append(f"Compre todo o fio {data['color']} do mesmo lote de tingimento para evitar diferença de tom")
+        return notes
+    
     def _create_initial_state(self) -> ConversationState:
         """Cria um estado inicial para uma nova conversa"""
         return ConversationState(
@@ -0,0 +1,307 @@
+import unicodedata
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Palavras que, logo antes de um termo ambíguo, indicam a que campo ele se refere
+CONTEXT_WORDS = {
+    "size": {"tamanho", "tam", "numero", "manequim"},
+    "yarn_weight": {"fio", "peso", "espessura", "linha"},
+}
+
+# Palavras que podem ficar entre a palavra de contexto e o termo ("tamanho para g")
+CONTEXT_FILLERS = {"para", "pra", "pro", "o", "a", "em", "no", "na", "de", "do", "da"}
+# Até quantas palavras antes do termo a palavra de contexto é procurada
+CONTEXT_LOOKBACK = 3
+
+# Léxico: campo -> {frase: valor canônico}
+# As frases são comparadas sem acentos e palavra por palavra
+PIECE_TYPES = {
+    "colete": "colete", "coletes": "colete",
+    "blusa": "blusa", "blusas": "blusa", "sueter": "blusa", "pulover": "blusa",
+    "cardigan": "blusa", "casaquinho": "blusa",
+    "chapeu": "chapeu", "chapeus": "chapeu", "gorro": "chapeu", "gorros": "chapeu",
+    "touca": "chapeu", "toucas": "chapeu", "boina": "chapeu", "boinas": "chapeu",
+    "cachecol": "cachecol", "cachecois": "cachecol", "echarpe": "cachecol",
+    "luva": "luvas", "luvas": "luvas", "mitene": "luvas", "mitenes": "luvas",
+    "meias": "meias",
+    "cobertor": "cobertor", "cobertores": "cobertor", "manta": "cobertor", "mantas": "cobertor",
+    "colcha": "cobertor",
+    "bolsa": "bolsa", "bolsas": "bolsa", "bolsinha": "bolsa", "sacola": "bolsa",
+}
+
+SIZES = {
+    "xs": "XS", "pp": "XS", "extra pequeno": "XS",
+    "pequeno": "S", "pequena": "S",
+    "grande": "L",
+    "xl": "XL", "gg": "XL",
+    "xxl": "XXL", "xg": "XXL", "xgg": "XXL", "extra grande": "XXL",
+    "tamanho unico": "único",
+}
+
+# Letras soltas só contam como tamanho com contexto ("tamanho m")
+# ou quando a pergunta atual é sobre tamanho
+WEAK_SIZES = {"s": "S", "p": "S", "m": "M", "l": "L", "g": "L"}
+
+COLORS = {
+    "azul": "azul", "azul marinho": "azul marinho", "azul bebe": "azul bebê",
+    "azul claro": "azul claro", "azul escuro": "azul escuro", "azul royal": "azul royal",
+    "vermelho": "vermelho", "vermelha": "vermelho",
+    "verde": "verde", "verde agua": "verde água", "verde musgo": "verde musgo",
+    "verde militar": "verde militar", "verde claro": "verde claro", "verde escuro": "verde escuro",
+    "amarelo": "amarelo", "amarela": "amarelo", "mostarda": "mostarda",
+    "preto": "preto", "preta": "preto",
+    "branco": "branco", "branca": "branco", "off white": "off-white", "cru": "cru",
+    "rosa": "rosa", "rosa bebe": "rosa bebê", "rosa claro": "rosa claro", "pink": "pink",
+    "roxo": "roxo", "roxa": "roxo", "lilas": "lilás", "lavanda": "lavanda",
+    "cinza": "cinza", "cinza claro": "cinza claro", "cinza escuro": "cinza escuro", "grafite": "grafite",
+    "marrom": "marrom", "caramelo": "caramelo", "bege": "bege", "creme": "creme", "nude": "nude",
+    "laranja": "laranja", "terracota": "terracota", "coral": "coral",
+    "vinho": "vinho", "bordo": "bordô", "dourado": "dourado", "prata": "prata",
+    "colorido": "colorido", "colorida": "colorido", "multicolorido": "colorido",
+}
+
+YARN_TYPES = {
+    "algodao": "algodão", "algodao egipcio": "algodão egípcio",
+    "acrilico": "acrílico", "lã merino": "lã merino", "la merino": "lã merino", "merino": "lã merino",
+    "linha": "linha", "barbante": "barbante", "fio de malha": "fio de malha",
+    "seda": "seda", "bambu": "bambu", "mohair": "mohair", "alpaca": "alpaca",
+    "viscose": "viscose", "poliester": "poliéster", "misto": "misto", "cashmere": "cashmere",
+}
+
+YARN_WEIGHTS = {
+    "extra fino": "extra fino", "lace": "extra fino",
+    "fino": "fino", "fina": "fino", "fingering": "fino", "sport": "fino",
+    "dk": "médio", "worsted": "médio", "aran": "médio",
+    "grosso": "grosso", "grossa": "grosso", "bulky": "grosso", "chunky": "grosso",
+    "extra grosso": "extra grosso", "extragrosso": "extra grosso", "super grosso": "extra grosso",
+    "jumbo": "extra grosso",
+}
+
+# Termos que podem ser tamanho ou peso do fio ("tamanho médio" x "algodão médio")
+AMBIGUOUS = {
+    "medio": (("size", "M"), ("yarn_weight", "médio")),
+    "media": (("size", "M"), ("yarn_weight", "médio")),
+}
+
+SLEEVES = {
+    "manga bufante": "bufante", "mangas bufantes": "bufante", "bufante": "bufante",
+    "bufe": "bufante",
+    "manga justa": "justa", "mangas justas": "justa",
+    "sem manga": "sem manga", "sem mangas": "sem manga", "regata": "sem manga",
+    "manga curta": "curta", "mangas curtas": "curta",
+    "manga longa": "longa", "mangas longas": "longa", "manga comprida": "longa",
+    "mangas compridas": "longa",
+    "manga raglan": "raglan", "mangas raglan": "raglan",
+    "manga sino": "sino", "mangas sino": "sino",
+    "manga 3 4": "3/4", "mangas 3 4": "3/4", "manga tres quartos": "3/4",
+}
+
+STYLE_DETAILS = {
+    "decote v": "decote V", "decote em v": "decote V", "gola v": "decote V",
+    "decote redondo": "decote redondo", "gola redonda": "decote redondo",
+    "decote canoa": "decote canoa", "decote quadrado": "decote quadrado",
+    "gola alta": "gola alta", "gola role": "gola alta",
+    "cropped": "cropped",
+    "ate a cintura": "comprimento até a cintura", "ate o quadril": "comprimento até o quadril",
+    "comprimento curto": "comprimento curto", "comprimento longo": "comprimento longo",
+    "franja": "franjas", "franjas": "franjas",
+    "capuz": "capuz", "pompom": "pompom",
+    "botoes": "botões", "bolso": "bolsos", "bolsos": "bolsos",
+    "renda": "rendado", "rendado": "rendado", "vazado": "vazado",
+}
+
+# Medidas informadas pelo usuário ("busto 92 cm", "largura de 20cm"), em cm
+MEASUREMENT_WORDS = {
+    "busto": "circumference", "peito": "circumference", "torax": "circumference",
+    "cabeca": "circumference", "circunferencia": "circumference", "mao": "circumference",
+    "largura": "width",
+    "comprimento": "length", "altura": "length",
+}
+# Palavras que podem aparecer entre a medida e o número
+MEASUREMENT_FILLERS = {"de", "da", "do", "com", "tem", "e"}
+
+# Amostra informada ("18 pontos x 20 carreiras")
+GAUGE_STITCH_WORDS = {"pontos", "pts", "pb"}
+GAUGE_ROW_WORDS = {"carreiras", "voltas", "carr"}
+GAUGE_JOINERS = {"x", "por", "e"}
+
+# Tabela de bytes: maiúsculas viram minúsculas, o que não é letra ou dígito vira espaço
+_SEPARATORS = bytes(
+    c + 32 if 65 <= c <= 90 else c if (48 <= c <= 57 or 97 <= c <= 122) else 32
+    for c in range(256)
+)
+
+# "lã" sem acento vira "la", que também é "lá"; a forma acentuada é trocada
+# antes da remoção de acentos por uma palavra que não existe em português
+_WOOL_TOKEN = "la0"
+
+
+def tokenize(text: str) -> List[str]:
+    """Divide o texto em palavras minúsculas, sem acentos e sem pontuação"""
+    if "ã" in text or "Ã" in text:
+        text = text.lower().replace("lã", _WOOL_TOKEN)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+    # Daqui em diante tudo roda em C: descarta acentos, minúsculas, separa as palavras
+    return text.encode("ascii", "ignore").translate(_SEPARATORS).decode("ascii").split()
+
+
+class _Entry(NamedTuple):
+    tokens: List[str]
+    length: int
+    candidates: Tuple[Tuple[str, str], ...]
+    weak: bool = False
+
+
+class EntityExtractor:
+    """Extrai os campos do pedido com uma única passada pelas palavras da mensagem
+
+    O léxico é compilado uma vez num índice pela primeira palavra de cada frase.
+    A mensagem é dividida em palavras já sem acento (operações em C, sem laço
+    por caractere) e só as posições cuja palavra abre alguma frase são
+    examinadas, tentando a frase mais longa primeiro. Como a comparação é por
+    palavra, "m" não casa com "um" nem "s" com "mangas", e "azul marinho" tem
+    prioridade sobre "azul".
+    """
+
+    def __init__(self):
+        self._index: Dict[str, List[_Entry]] = {}
+
+        for slot, lexicon in (("piece_type", PIECE_TYPES), ("size", SIZES), ("color", COLORS),
+                              ("yarn_type", YARN_TYPES), ("yarn_weight", YARN_WEIGHTS),
+                              ("sleeve_type", SLEEVES), ("style_details", STYLE_DETAILS)):
+            for phrase, value in lexicon.items():
+                self._add(phrase, ((slot, value),))
+
+        for phrase, value in WEAK_SIZES.items():
+            self._add(phrase, (("size", value),), weak=True)
+        for phrase, candidates in AMBIGUOUS.items():
+            self._add(phrase, candidates, weak=True)
+
+        # "lã" com acento é sempre fio; "la" sem acento só quando a pergunta é sobre o fio
+        self._add(_WOOL_TOKEN, (("yarn_type", "lã"),))
+        self._add("la", (("yarn_type", "lã"),), weak=True)
+
+        for entries in self._index.values():
+            entries.sort(key=lambda entry: entry.length, reverse=True)
+
+    def _add(self, phrase: str, candidates, weak: bool = False):
+        tokens = tokenize(phrase)
+        self._index.setdefault(tokens[0], []).append(_Entry(tokens, len(tokens), tuple(candidates), weak))
+
+    def extract(self, message: str, expected_slots: Iterable[str] = ()) -> Dict[str, Any]:
+        """Retorna os campos encontrados na mensagem
+
+        `expected_slots` são os campos da pergunta atual; eles desempatam termos
+        ambíguos e liberam letras soltas como tamanho.
+        """
+        expected = set(expected_slots)
+        tokens = tokenize(message)
+
+        index = self._index
+        found: Dict[str, Any] = {}
+        style: Dict[str, None] = {}
+        previous_slot, previous_end = None, -1
+        next_free = 0
+
+        for i in [i for i, token in enumerate(tokens) if token in index]:
+            if i < next_free:
+                continue
+
+            for entry in index[tokens[i]]:
+                if entry.length == 1 or tokens[i:i + entry.length] == entry.tokens:
+                    break
+            else:
+                continue
+
+            next_free = i + entry.length
+            if entry.weak:
+                adjacent_slot = previous_slot if previous_end == i else None
+                slot_value = self._resolve(entry, _context_word(tokens, i), adjacent_slot, expected)
+                if slot_value is None:
+                    previous_slot = None
+                    continue
+                slot, value = slot_value
+            else:
+                slot, value = entry.candidates[0]
+            previous_slot, previous_end = slot, next_free
+
+            if slot == "style_details":
+                style[value] = None
+            elif slot == "sleeve_type":
+                style["sem manga" if value == "sem manga" else f"manga {value}"] = None
+                found.setdefault(slot, value)
+            elif slot not in found:
+                found[slot] = value
+
+        if style:
+            found["style_details"] = ", ".join(style)
+        if any(token[0].isdigit() for token in tokens):
+            self._extract_numbers(tokens, found)
+        return found
+
+    def _extract_numbers(self, tokens: List[str], found: Dict[str, Any]):
+        """Medidas em cm (que tornam o tamanho personalizado) e amostra"""
+        measurements: Dict[str, float] = {}
+        for i, token in enumerate(tokens):
+            name = MEASUREMENT_WORDS.get(token)
+            if name is None:
+                continue
+            j = i + 1
+            while j < len(tokens) and tokens[j] in MEASUREMENT_FILLERS:
+                j += 1
+            value = _centimeters(tokens[j]) if j < len(tokens) else None
+            if value:
+                measurements.setdefault(name, value)
+
+        if measurements:
+            found["measurements"] = measurements
+            found.setdefault("size", "personalizado")
+
+        for i in range(len(tokens) - 4):
+            stitches, unit, joiner, rows, row_unit = tokens[i:i + 5]
+            if (stitches.isdigit() and unit in GAUGE_STITCH_WORDS and joiner in GAUGE_JOINERS
+                    and rows.isdigit() and row_unit in GAUGE_ROW_WORDS):
+                found["gauge"] = {"stitches": int(stitches), "rows": int(rows)}
+                break
+
+    def _resolve(self, entry: _Entry, previous_word: str, adjacent_slot: Optional[str],
+                 expected: set) -> Optional[Tuple[str, str]]:
+        if not entry.weak:
+            return entry.candidates[0]
+
+        # 1. contexto: "tamanho m", "tamanho para g", "fio médio", "algodão médio"
+        for slot, value in entry.candidates:
+            if previous_word in CONTEXT_WORDS.get(slot, ()):
+                return slot, value
+            if slot == "yarn_weight" and adjacent_slot == "yarn_type":
+                return slot, value
+
+        # 2. o campo que acabou de ser perguntado
+        for slot, value in entry.candidates:
+            if slot in expected:
+                return slot, value
+
+        return None
+
+
+def _context_word(tokens: List[str], i: int) -> str:
+    """Palavra antes de tokens[i], pulando preposições e artigos ("tamanho para g" -> "tamanho")"""
+    for j in range(i - 1, max(i - 1 - CONTEXT_LOOKBACK, -1), -1):
+        if tokens[j] not in CONTEXT_FILLERS:
+            return tokens[j]
+    return ""
+
+
+def _centimeters(token: str) -> Optional[float]:
+    """ "92" ou "92cm" -> 92.0"""
+    if token.endswith("cm"):
+        token = token[:-2]
+    return float(token) if token.isdigit() and int(token) > 0 else None
+
+
+_default_extractor = EntityExtractor()
+
+
+def extract_entities(message: str, expected_slots: Iterable[str] = ()) -> Dict[str, Any]:
+    """Atalho para o extrator padrão"""
+    return _default_extractor.extract(message, expected_slots)
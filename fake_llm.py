@@ -0,0 +1,107 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from typing import Any, AsyncIterator, List
+
+from langchain.schema import AIMessage
+from langchain.schema.messages import AIMessageChunk
+
+# Frases usadas para montar as instruções falsas
+PHRASES = [
+    "faça 1 ponto baixo em cada ponto",
+    "aumente 1 ponto nas laterais",
+    "trabalhe em pontos altos até o fim da carreira",
+    "vire o trabalho e faça 1 corrente",
+    "feche com 1 ponto baixíssimo",
+    "diminua 1 ponto no início e no fim",
+    "repita a sequência até a marcação",
+    "prenda o fio e esconda as pontas",
+]
+
+
+class FakeChatModel:
+    """LLM local e determinístico para testes de carga, sem chamar a OpenAI
+
+    Imita a interface usada pelo agente (`ainvoke` e `astream`). A latência até o primeiro token segue uma distribuição log-normal
+    (`latency_median`, `latency_sigma`) e o texto sai a `tokens_per_second`,
+    também com variação log-normal (`rate_sigma`). Os sorteios dependem só de
+    `seed` e do número da chamada, então a mesma sequência de chamadas tem
+    sempre as mesmas latências.
+    """
+
+    def __init__(self, model_name: str = "fake", latency_median: float = 0.8,
+                 latency_sigma: float = 0.5, tokens_per_second: float = 60.0,
+                 rate_sigma: float = 0.2, response_tokens: int = 250, seed: int = 0):
+        self.model_name = model_name
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.rate_sigma = rate_sigma
+        self.response_tokens = response_tokens
+        self.seed = seed
+        self.calls = 0
+
+    async def ainvoke(self, messages: List[Any]) -> AIMessage:
+        latency, rate, tokens = self._next_call(messages)
+        await asyncio.sleep(latency + len(tokens) / rate)
+        return AIMessage(content="".join(tokens))
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[AIMessageChunk]:
+        latency, rate, tokens = self._next_call(messages)
+        await asyncio.sleep(latency)
+        # Entrega em lotes de ~50 ms para não criar um timer por token
+        batch = max(1, int(rate * 0.05))
+        for start in range(0, len(tokens), batch):
+            if start:
+                await asyncio.sleep(batch / rate)
+            yield AIMessageChunk(content="".join(tokens[start:start + batch]))
+
+    def _next_call(self, messages: List[Any]):
+        """Sorteia latência e velocidade desta chamada e monta o texto"""
+        rng = random.Random(f"{self.seed}:{self.calls}")
+        self.calls += 1
+        latency = rng.lognormvariate(math.log(self.latency_median), self.latency_sigma) if self.latency_median > 0 else 0.0
+        rate = self.tokens_per_second * rng.lognormvariate(0, self.rate_sigma)
+        return latency, rate, self._tokens(messages, rng)
+
+    def _tokens(self, messages: List[Any], rng: random.Random) -> List[str]:
+        """Instruções no formato "Carreira N: ...", com cerca de `response_tokens` palavras
+
+        Se o prompt pede JSON, as linhas saem no objeto do modo estruturado.
+        """
+        prompt = messages[-1].content if messages else ""
+        # O cabeçalho cita a peça pedida no prompt ("Tipo de peça: colete")
+        match = re.search(r"Tipo de peça:\s*([^\n]+)", prompt)
+        piece = match.group(1).strip()[:60] if match else "peça"
+        lines = [f"Instruções ({self.model_name}) para: {piece}"]
+        words = len(lines[0].split(" "))
+        while words < self.response_tokens:
+            line = f"Carreira {len(lines)}: {rng.choice(PHRASES)}, {rng.choice(PHRASES)}."
+            lines.append(line)
+            words += len(line.split(" "))
+
+        # Marcadores de técnica pedidos no prompt ([[Manga bufante]]) entram antes da última linha
+        lines[-1:-1] = list(dict.fromkeys(re.findall(r"\[\[[^\[\]]+\]\]", prompt)))
+
+        if "objeto JSON" in prompt:
+            text = json.dumps({"instructions": lines, "special_notes": [rng.choice(PHRASES).capitalize()]},
+                              ensure_ascii=False)
+        else:
+            text = "\n".join(lines) + "\n"
+        return re.findall(r"\S+\s*", text)
+
+
+def create_fake_llm(model_name: str) -> FakeChatModel:
+    """LLM falso configurado pelas variáveis de ambiente FAKE_LLM_*"""
+    return FakeChatModel(
+        model_name=model_name,
+        latency_median=float(os.getenv("FAKE_LLM_LATENCY", "0.8")),
+        latency_sigma=float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5")),
+        tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "60")),
+        rate_sigma=float(os.getenv("FAKE_LLM_RATE_SIGMA", "0.2")),
+        response_tokens=int(os.getenv("FAKE_LLM_TOKENS", "250")),
+        seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+    )
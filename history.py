@@ -0,0 +1,115 @@
+import os
+from typing import Any, Dict, List
+
+from models import ConversationState
+
+# Tamanho máximo de cada trecho do usuário guardado no resumo
+SUMMARY_SNIPPET_CHARS = 120
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa de tokens (~4 caracteres por token) quando o provedor não informa"""
+    return -(-len(text) // 4)
+
+
+def _message_tokens(message: Dict[str, str]) -> int:
+    # ~4 tokens de formatação por mensagem no formato de chat
+    return estimate_tokens(message["content"]) + 4
+
+
+class HistoryPolicy:
+    """Histórico limitado: as últimas mensagens e um resumo das anteriores
+
+    `conversation_history` funciona como um buffer circular de até
+    `max_messages` mensagens. A mensagem mais antiga sai também quando o prompt
+    (sistema + resumo + histórico) passa de `token_budget`. Quem sai entra no
+    resumo de forma incremental, sem chamar o LLM: as perguntas do agente só
+    são contadas (saem de modelos fixos) e as mensagens do usuário viram trechos
+    curtos, descartados do mais antigo quando o resumo passa de
+    `summary_tokens`. Os dados já coletados também entram no resumo, já que são
+    o que a conversa acumulou de mais importante.
+    """
+
+    def __init__(self, max_messages: int = 12, token_budget: int = 1500, summary_tokens: int = 200):
+        # Sempre fica pelo menos a última troca (pergunta e resposta)
+        self.max_messages = max(2, max_messages)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+
+    def append(self, state: ConversationState, role: str, content: str, system_prompt: str = ""):
+        """Adiciona uma mensagem e aplica os limites de mensagens e tokens"""
+        state.conversation_history.append({"role": role, "content": content})
+        history = state.conversation_history
+        fixed_tokens = self._fixed_tokens(state, system_prompt)
+        history_tokens = sum(_message_tokens(message) for message in history)
+
+        while len(history) > 2 and (len(history) > self.max_messages
+                                    or fixed_tokens + history_tokens > self.token_budget):
+            evicted = history.pop(0)
+            history_tokens -= _message_tokens(evicted)
+            self._summarize(state, evicted)
+            fixed_tokens = self._fixed_tokens(state, system_prompt)
+
+    def _fixed_tokens(self, state: ConversationState, system_prompt: str) -> int:
+        """Tokens do prompt fora do histórico: sistema e resumo"""
+        summary = self.summary_text(state)
+        return _message_tokens({"content": system_prompt}) + (_message_tokens({"content": summary}) if summary else 0)
+
+    def _summarize(self, state: ConversationState, message: Dict[str, str]):
+        """Incorpora ao resumo uma mensagem que saiu do histórico"""
+        state.summarized_messages += 1
+        if message["role"] != "user":
+            return
+
+        snippet = " ".join(message["content"].split())
+        if len(snippet) > SUMMARY_SNIPPET_CHARS:
+            snippet = snippet[:SUMMARY_SNIPPET_CHARS - 1] + "…"
+        lines = state.history_summary.splitlines() + [f"- {snippet}"]
+        # Os trechos mais antigos saem primeiro; o último sempre fica
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        state.history_summary = "\n".join(lines)
+
+    def summary_text(self, state: ConversationState) -> str:
+        """Mensagem que substitui as mensagens resumidas no prompt ("" se nada saiu do histórico)"""
+        if not state.summarized_messages:
+            return ""
+        parts = [f"Resumo das {state.summarized_messages} mensagens anteriores da conversa."]
+        if state.collected_data:
+            collected = "; ".join(f"{key}: {value}" for key, value in state.collected_data.items())
+            parts.append(f"Dados já coletados: {collected}")
+        if state.history_summary:
+            parts.append(f"O usuário disse:\n{state.history_summary}")
+        return "\n".join(parts)
+
+    def messages(self, state: ConversationState, system_prompt: str) -> List[Dict[str, str]]:
+        """Mensagens do prompt conversacional: sistema, resumo (se houver) e histórico recente"""
+        messages = [{"role": "system", "content": system_prompt}]
+        summary = self.summary_text(state)
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        return messages + state.conversation_history
+
+    def prompt_size(self, state: ConversationState, system_prompt: str) -> Dict[str, Any]:
+        """Tamanho efetivo (estimado) do prompt conversacional de uma conversa"""
+        system = _message_tokens({"content": system_prompt})
+        summary = self._fixed_tokens(state, system_prompt) - system
+        history = sum(_message_tokens(message) for message in state.conversation_history)
+        total = system + summary + history
+        return {
+            "messages": len(state.conversation_history),
+            "summarized_messages": state.summarized_messages,
+            "tokens": {"system": system, "summary": summary, "history": history, "total": total},
+            "token_budget": self.token_budget,
+            "max_messages": self.max_messages,
+            "within_budget": total <= self.token_budget,
+        }
+
+
+def create_history_policy() -> HistoryPolicy:
+    """Cria a política de histórico configurada nas variáveis de ambiente"""
+    return HistoryPolicy(
+        max_messages=int(os.getenv("HISTORY_MAX_MESSAGES", "12")),
+        token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "1500")),
+        summary_tokens=int(os.getenv("HISTORY_SUMMARY_TOKENS", "200")),
+    )
@@ -0,0 +1,109 @@
+import os
+import weakref
+from typing import Any, Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPPool:
+    """Pool de conexões HTTP compartilhado por todas as chamadas ao LLM
+
+    Um cliente síncrono e um assíncrono (o SDK da OpenAI exige os dois tipos),
+    com o mesmo limite de conexões, keep-alive e timeouts. As conexões abertas
+    ficam vivas entre as chamadas, evitando um handshake TLS a cada geração.
+    HTTP/2 é usado quando pedido e o pacote `h2` estiver instalado.
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive: int = 10,
+                 keepalive_expiry: float = 60.0, connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0, http2: bool = True):
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=connect_timeout)
+
+        self.requests = 0
+        self.connections_opened = 0
+        # Conexões já contadas; somem sozinhas quando o pool as descarta
+        self._seen: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+        hooks = {"response": [self._on_response]}
+        async_hooks = {"response": [self._aon_response]}
+        self.sync_client = httpx.Client(limits=self.limits, timeout=self.timeout,
+                                        http2=self.http2, event_hooks=hooks)
+        self.async_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout,
+                                              http2=self.http2, event_hooks=async_hooks)
+
+    def stats(self) -> Dict[str, Any]:
+        """Conexões abertas, ociosas e em uso, requisições à espera e reaproveitamento"""
+        pools = {"async": self._pool_stats(self.async_client), "sync": self._pool_stats(self.sync_client)}
+        return {
+            **pools,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            # Requisições por conexão aberta: quanto maior, mais reaproveitamento
+            "reuse_ratio": round(self.requests / self.connections_opened, 2) if self.connections_opened else None,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "http2": self.http2,
+        }
+
+    async def aclose(self):
+        """Fecha as conexões dos dois clientes"""
+        self.sync_client.close()
+        await self.async_client.aclose()
+
+    def _on_response(self, response: httpx.Response):
+        self._count(self.sync_client)
+
+    async def _aon_response(self, response: httpx.Response):
+        self._count(self.async_client)
+
+    def _count(self, client: Any):
+        self.requests += 1
+        for connection in self._connections(client):
+            if connection not in self._seen:
+                self._seen.add(connection)
+                self.connections_opened += 1
+
+    @staticmethod
+    def _connections(client: Any) -> list:
+        # O pool do httpcore fica atrás do transporte padrão do httpx
+        pool = getattr(client._transport, "_pool", None)
+        return list(pool.connections) if pool is not None else []
+
+    def _pool_stats(self, client: Any) -> Dict[str, Any]:
+        connections = self._connections(client)
+        pool = getattr(client._transport, "_pool", None)
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "in_use": sum(1 for c in connections if not c.is_idle() and not c.is_closed()),
+            "http2_connections": sum(1 for c in connections if c.info().startswith("HTTP/2")),
+            # Requisições esperando uma conexão livre (pool no limite)
+            "waiting_requests": sum(1 for r in getattr(pool, "_requests", []) if r.is_queued()),
+        }
+
+
+def create_http_pool() -> HTTPPool:
+    """Cria o pool de conexões com a configuração das variáveis de ambiente"""
+    # Por padrão a leitura pode durar tanto quanto uma tentativa de chamada ao LLM
+    read_timeout = os.getenv("LLM_HTTP_READ_TIMEOUT", os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+    return HTTPPool(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+        connect_timeout=float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5")),
+        read_timeout=float(read_timeout),
+        http2=os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes"),
+    )
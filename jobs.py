@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import CrochetPattern, JobStatus, PatternJob
+
+# Executa a geração: (conversation_id, dados coletados) -> pattern
+JobRunner = Callable[[Optional[str], Dict[str, Any]], Awaitable[CrochetPattern]]
+
+
+class QueueFullError(Exception):
+    """A fila de geração atingiu o limite de jobs pendentes"""
+
+
+class PatternJobQueue:
+    """Fila de geração de patterns em segundo plano, persistida em SQLite
+
+    - `submit` grava o job como "queued" e devolve na hora; pedidos repetidos
+      da mesma conversa com os mesmos dados reaproveitam o job pendente
+    - um pool de workers asyncio pega os jobs na ordem de chegada e executa o
+      `runner`; cada job pego recebe um prazo (lease) para terminar
+    - jobs "queued", ou "running" com prazo vencido (processo que caiu ou
+      reiniciou), são retomados por qualquer processo que use o mesmo arquivo
+    - jobs concluídos ficam disponíveis para consulta por `retention_seconds`
+    """
+
+    # Intervalo máximo entre consultas à fila quando não há aviso de job novo
+    POLL_INTERVAL = 1.0
+    # A limpeza de jobs antigos roda no máximo uma vez por intervalo (segundos)
+    EVICTION_INTERVAL = 60.0
+
+    def __init__(self, runner: JobRunner, path: str = "jobs.db", workers: int = 2,
+                 max_queue: int = 100, retention_seconds: float = 3600, lease_seconds: float = 300):
+        self.runner = runner
+        self.path = path
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._last_eviction = 0.0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pattern_jobs ("
+            "job_id TEXT PRIMARY KEY, "
+            "conversation_id TEXT, "
+            "inputs_key TEXT NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "result TEXT, "
+            "error TEXT, "
+            "created_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "lease_until REAL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS pattern_jobs_status ON pattern_jobs (status, created_at)"
+        )
+        self._db.commit()
+
+    async def start(self):
+        """Inicia os workers no event loop atual"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Para os workers; jobs em andamento voltam para a fila quando o prazo vencer"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        """Se há workers ativos"""
+        return any(not task.done() for task in self._tasks)
+
+    def submit(self, conversation_id: Optional[str], inputs_key: str, data: Dict[str, Any]) -> PatternJob:
+        """Enfileira a geração e devolve o job (ou o job pendente idêntico)"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM pattern_jobs "
+                "WHERE conversation_id IS ? AND inputs_key = ? AND status IN (?, ?)",
+                (conversation_id, inputs_key, JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+            ).fetchone()
+            if row is not None:
+                return self._to_job(row)
+
+            (queued,) = self._db.execute(
+                "SELECT COUNT(*) FROM pattern_jobs WHERE status = ?", (JobStatus.QUEUED.value,)
+            ).fetchone()
+            if queued >= self.max_queue:
+                raise QueueFullError(f"{queued} jobs na fila")
+
+            job_id = str(uuid.uuid4())
+            self._db.execute(
+                "INSERT INTO pattern_jobs (job_id, conversation_id, inputs_key, payload, status, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, conversation_id, inputs_key, json.dumps(data, ensure_ascii=False),
+                 JobStatus.QUEUED.value, now, now)
+            )
+            self._db.commit()
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return PatternJob(
+            job_id=job_id, status=JobStatus.QUEUED, conversation_id=conversation_id,
+            created_at=datetime.fromtimestamp(now), updated_at=datetime.fromtimestamp(now)
+        )
+
+    def get(self, job_id: str) -> Optional[PatternJob]:
+        """Estado atual do job, com o pattern quando pronto"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM pattern_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def evict_expired(self) -> int:
+        """Remove jobs concluídos há mais tempo que a retenção; retorna quantos saíram"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM pattern_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JobStatus.DONE.value, JobStatus.FAILED.value, time.time() - self.retention_seconds)
+            )
+            self._db.commit()
+        self._last_eviction = time.monotonic()
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Jobs por status e configuração da fila"""
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM pattern_jobs GROUP BY status"
+            ).fetchall())
+        return {
+            **{status.value: counts.get(status.value, 0) for status in JobStatus},
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+        }
+
+    _COLUMNS = "job_id, status, conversation_id, created_at, updated_at, result, error"
+
+    def _to_job(self, row: tuple) -> PatternJob:
+        job_id, status, conversation_id, created_at, updated_at, result, error = row
+        return PatternJob(
+            job_id=job_id,
+            status=JobStatus(status),
+            conversation_id=conversation_id,
+            created_at=datetime.fromtimestamp(created_at),
+            updated_at=datetime.fromtimestamp(updated_at),
+            pattern=CrochetPattern.model_validate_json(result) if result else None,
+            error=error,
+        )
+
+    def _claim(self) -> Optional[Tuple[str, Optional[str], Dict[str, Any]]]:
+        """Pega o job mais antigo disponível; o UPDATE condicional evita que dois processos peguem o mesmo"""
+        now = time.time()
+        available = "(status = ? OR (status = ? AND lease_until < ?))"
+        params = (JobStatus.QUEUED.value, JobStatus.RUNNING.value, now)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT job_id, conversation_id, payload FROM pattern_jobs WHERE {available} "
+                "ORDER BY created_at LIMIT 1", params
+            ).fetchone()
+            if row is None:
+                return None
+
+            cursor = self._db.execute(
+                f"UPDATE pattern_jobs SET status = ?, lease_until = ?, updated_at = ? "
+                f"WHERE job_id = ? AND {available}",
+                (JobStatus.RUNNING.value, now + self.lease_seconds, now, row[0], *params)
+            )
+            self._db.commit()
+
+        if cursor.rowcount == 0:
+            return None
+        job_id, conversation_id, payload = row
+        return job_id, conversation_id, json.loads(payload)
+
+    def _finish(self, job_id: str, pattern: Optional[CrochetPattern] = None, error: Optional[str] = None):
+        status = JobStatus.DONE if pattern is not None else JobStatus.FAILED
+        with self._lock:
+            self._db.execute(
+                "UPDATE pattern_jobs SET status = ?, result = ?, error = ?, updated_at = ?, "
+                "lease_until = NULL WHERE job_id = ?",
+                (status.value, pattern.model_dump_json() if pattern is not None else None,
+                 error, time.time(), job_id)
+            )
+            self._db.commit()
+
+    async def _worker(self):
+        # As chamadas ao SQLite rodam numa thread: o disco não bloqueia o event loop
+        while True:
+            if time.monotonic() - self._last_eviction > self.EVICTION_INTERVAL:
+                await asyncio.to_thread(self.evict_expired)
+
+            claimed = await asyncio.to_thread(self._claim)
+            if claimed is None:
+                # Espera um aviso de job novo ou o próximo ciclo de consulta
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            job_id, conversation_id, data = claimed
+            try:
+                pattern = await self.runner(conversation_id, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self._finish, job_id, error=str(e))
+            else:
+                await asyncio.to_thread(self._finish, job_id, pattern=pattern)
+
+
+def create_pattern_job_queue(runner: JobRunner) -> Optional[PatternJobQueue]:
+    """Cria a fila de geração em segundo plano, se habilitada nas variáveis de ambiente"""
+    if os.getenv("PATTERN_JOBS", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    return PatternJobQueue(
+        runner,
+        path=os.getenv("PATTERN_JOB_DB_PATH", "jobs.db"),
+        workers=int(os.getenv("PATTERN_JOB_WORKERS", "2")),
+        max_queue=int(os.getenv("PATTERN_JOB_QUEUE_LIMIT", "100")),
+        retention_seconds=float(os.getenv("PATTERN_JOB_RETENTION", "3600")),
+        lease_seconds=float(os.getenv("PATTERN_JOB_LEASE", "300")),
+    )
@@ -0,0 +1,296 @@
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from extraction import tokenize
+from similarity import style_features
+
+
+class Stitch(NamedTuple):
+    abbreviation: str
+    name: str
+    definition: str
+
+
+class Technique(NamedTuple):
+    title: str
+    # Frases que ativam a técnica nos detalhes de estilo ("sem manga" vira "!manga")
+    phrases: Tuple[str, ...]
+    steps: Tuple[str, ...]
+    stitches: Tuple[str, ...]
+
+
+class Construction(NamedTuple):
+    parts: Tuple[str, ...]
+    stitches: Tuple[str, ...]
+
+
+class Retrieval(NamedTuple):
+    """Trechos da base relevantes para um pedido"""
+    construction: Optional[Construction]
+    techniques: Tuple[Technique, ...]
+    stitches: Tuple[Stitch, ...]
+
+
+# Definições canônicas dos pontos, pela abreviação usada nas instruções
+STITCHES = {stitch.abbreviation: stitch for stitch in (
+    Stitch("corr", "correntinha", "faça uma laçada e puxe pela alça que está na agulha"),
+    Stitch("pbx", "ponto baixíssimo", "insira a agulha no ponto, faça uma laçada e puxe por todas as alças da agulha"),
+    Stitch("pb", "ponto baixo", "insira a agulha no ponto, puxe uma alça (2 alças na agulha), faça uma laçada e feche as 2"),
+    Stitch("mpa", "meio ponto alto", "laçada, insira a agulha no ponto e puxe uma alça (3 alças), laçada e feche as 3 de uma vez"),
+    Stitch("pa", "ponto alto", "laçada, insira a agulha no ponto e puxe uma alça (3 alças), feche 2 alças duas vezes"),
+    Stitch("pad", "ponto alto duplo", "duas laçadas, insira a agulha e puxe uma alça (4 alças), feche 2 alças três vezes"),
+    Stitch("aum", "aumento", "2 pontos no mesmo ponto da carreira anterior"),
+    Stitch("dim", "diminuição", "trabalhe 2 pontos sem a última laçada de cada um e feche todas as alças juntas"),
+    Stitch("am", "anel mágico", "enrole o fio em volta dos dedos, trabalhe os pontos dentro do anel e puxe a ponta para fechar"),
+    Stitch("pafr", "ponto alto em relevo pela frente", "pa com a agulha passando pela frente, ao redor da haste do ponto de baixo"),
+    Stitch("patr", "ponto alto em relevo por trás", "pa com a agulha passando por trás, ao redor da haste do ponto de baixo"),
+    Stitch("pbat", "ponto baixo pela alça de trás", "pb inserindo a agulha só na alça de trás do ponto, o que forma o canelado"),
+    Stitch("pip", "ponto pipoca", "5 pa no mesmo ponto; tire a agulha, insira no 1º pa e puxe a alça do último"),
+    Stitch("pcar", "ponto caranguejo", "pb trabalhado da esquerda para a direita (ao contrário), formando um cordão na borda"),
+)}
+
+# Ordem de construção de cada tipo de peça (valores de PieceType)
+CONSTRUCTIONS = {
+    "colete": Construction((
+        "Costas: base de corr na largura das costas e carreiras retas até a cava",
+        "Cavas: deixe de trabalhar os pontos das laterais e siga reto até o ombro",
+        "Frentes: iguais às costas até o decote",
+        "Ombros: una frente e costas com pbx",
+        "Acabamento: 1 carreira de pb ao redor das cavas e das bordas",
+    ), ("corr", "pb", "pa", "pbx")),
+    "blusa": Construction((
+        "Costas e frente: base de corr na largura da peça e carreiras retas até a cava",
+        "Cavas e decote: deixe de trabalhar os pontos das cavas e faça o decote na frente",
+        "Ombros e laterais: una com pbx",
+        "Mangas: pegue os pontos ao redor da cava e trabalhe em direção ao punho",
+        "Barras: acabamento na barra, nos punhos e no decote",
+    ), ("corr", "pb", "pa", "dim", "pbx")),
+    "chapeu": Construction((
+        "Topo: am e aumentos distribuídos em cada carreira até o diâmetro da cabeça",
+        "Corpo: carreiras sem aumentos até a altura desejada",
+        "Barra: carreiras de acabamento na borda",
+    ), ("am", "pb", "mpa", "aum", "pbx")),
+    "cachecol": Construction((
+        "Base: corr na largura do cachecol",
+        "Corpo: carreiras retas, virando o trabalho, até o comprimento desejado",
+        "Acabamento: 1 carreira de pb ao redor de toda a peça",
+    ), ("corr", "pb", "pa")),
+    "luvas": Construction((
+        "Punho: faixa canelada fechada em anel",
+        "Mão: carreiras em círculo a partir do punho",
+        "Polegar: abertura com corr, depois carreiras em círculo nos pontos da abertura",
+        "Dedos ou borda: feche a ponta ou termine com carreiras de pb",
+    ), ("corr", "pb", "pbat", "dim", "pbx")),
+    "meias": Construction((
+        "Ponta: am e aumentos até a largura do pé",
+        "Pé: carreiras em círculo até o calcanhar",
+        "Calcanhar: carreiras de ida e volta sobre metade dos pontos, com dim",
+        "Cano e punho: carreiras em círculo e faixa canelada no topo",
+    ), ("am", "pb", "aum", "dim", "pbat")),
+    "cobertor": Construction((
+        "Base: corr na largura do cobertor (ou quadrados iguais, unidos no final)",
+        "Corpo: carreiras retas até o comprimento desejado",
+        "Borda: carreiras de acabamento ao redor, com 3 pontos em cada canto",
+    ), ("corr", "pb", "pa")),
+    "bolsa": Construction((
+        "Fundo: base de corr e carreiras ao redor da base, com aumentos nas pontas",
+        "Laterais: carreiras em círculo sem aumentos até a altura da bolsa",
+        "Alças: corr no comprimento da alça presas nas laterais e cobertas com pb",
+    ), ("corr", "pb", "aum", "pbx")),
+}
+
+# Técnicas de mangas, decotes e acabamentos
+TECHNIQUES = (
+    Technique("Manga bufante", ("manga bufante", "bufante", "balone"), (
+        "Pegue os pontos ao redor da cava com 1 carreira de pb",
+        "Franzido: 2 pa em cada ponto da metade de cima da cava (ombro) e 1 pa nos demais",
+        "Trabalhe em pa, sem aumentos, até o comprimento da manga",
+        "Punho: 1 carreira de dim em todos os pontos e 2 carreiras de pb para prender o volume",
+    ), ("pb", "pa", "dim")),
+    Technique("Manga longa", ("manga longa", "manga comprida"), (
+        "Pegue os pontos ao redor da cava com 1 carreira de pb",
+        "Faça 1 dim no início e 1 no fim da carreira a cada 6 carreiras, até a largura do punho",
+        "Punho: 4 carreiras de pbat",
+    ), ("pb", "dim", "pbat")),
+    Technique("Manga curta", ("manga curta",), (
+        "Pegue os pontos ao redor da cava com 1 carreira de pb",
+        "Trabalhe 6 a 8 carreiras retas",
+        "Barra: 2 carreiras de pb",
+    ), ("pb",)),
+    Technique("Cava sem manga", ("!manga", "regata", "cavada"), (
+        "Ao redor da cava: 1 carreira de pb, com 1 dim nas curvas para não franzir",
+        "Finalize com 1 carreira de pbx para firmar a borda",
+    ), ("pb", "dim", "pbx")),
+    Technique("Decote V", ("decote v", "gola v"), (
+        "Na altura do decote, divida a frente ao meio e trabalhe cada lado separado",
+        "Faça 1 dim na borda do decote a cada 2 carreiras, até o ombro",
+        "Acabamento: pb ao redor do decote, com 1 dim no vértice do V em cada carreira",
+    ), ("pb", "dim")),
+    Technique("Decote redondo", ("decote redondo", "gola redonda", "decote careca"), (
+        "Na altura do decote, deixe de trabalhar os pontos centrais da frente",
+        "Em cada lado, faça 1 dim na borda do decote por carreira, 3 vezes, e siga reto até o ombro",
+        "Acabamento: 2 carreiras de pb ao redor do decote",
+    ), ("pb", "dim")),
+    Technique("Gola alta", ("gola alta", "gola role", "gola rule"), (
+        "Pegue os pontos ao redor do decote com 1 carreira de pa",
+        "Carreiras de pafr e patr alternados, até a altura da gola",
+        "Dobre a gola para fora",
+    ), ("pa", "pafr", "patr")),
+    Technique("Barra canelada", ("canelado", "canelada", "ribana"), (
+        "Base de corr na altura da barra",
+        "Carreiras de pbat, indo e voltando, até a largura da peça",
+        "Una a barra à peça com pbx",
+    ), ("corr", "pbat", "pbx")),
+    Technique("Capuz", ("capuz",), (
+        "Pegue os pontos ao redor do decote, deixando a frente aberta",
+        "Carreiras retas até a altura da cabeça",
+        "Dobre ao meio e una o topo com pbx",
+    ), ("pa", "pbx")),
+    Technique("Bolso", ("bolso",), (
+        "Faça um retângulo em pb do tamanho do bolso",
+        "Costure três lados na frente da peça com pbx",
+    ), ("pb", "pbx")),
+    Technique("Franja", ("franja",), (
+        "Corte fios com o dobro do comprimento da franja",
+        "Dobre 2 ou 3 fios ao meio, passe a dobra por um ponto da borda e puxe as pontas por dentro da dobra",
+    ), ()),
+    Technique("Acabamento caranguejo", ("caranguejo",), (
+        "Na última carreira da borda, não vire o trabalho e faça pcar em todos os pontos",
+    ), ("pcar",)),
+)
+
+# Marcador que o LLM escreve onde entra uma técnica: [[Manga bufante]]
+MARKER = re.compile(r"\[\[\s*([^\[\]]+?)\s*\]\]")
+
+# Pontos que podem ser pedidos nos detalhes ("ponto pipoca") e entram na legenda
+_STITCH_PHRASES = {"pipoca": "pip", "ponto pipoca": "pip", "relevo": "pafr", "caranguejo": "pcar"}
+
+
+class KnowledgeBase:
+    """Base local de pontos, construção por tipo de peça e técnicas
+
+    As frases de cada técnica ficam num índice invertido em memória (palavra ->
+    frases que a contêm), e uma técnica entra quando todas as palavras de uma
+    de suas frases aparecem nos detalhes de estilo. O prompt recebe só a
+    estrutura da peça, as abreviações e um marcador por técnica; o passo a
+    passo das técnicas e a legenda dos pontos são inseridos localmente no
+    pattern (TechniqueSplicer), em vez de o LLM escrevê-los a cada geração.
+    """
+
+    def __init__(self):
+        # Palavra -> [(palavras da frase, técnica ou abreviação do ponto)]
+        self._index: Dict[str, List[Tuple[Set[str], Any]]] = {}
+        for technique in TECHNIQUES:
+            for phrase in technique.phrases:
+                self._add(phrase, technique)
+        for phrase, abbreviation in _STITCH_PHRASES.items():
+            self._add(phrase, abbreviation)
+        self._by_title = {" ".join(tokenize(technique.title)): technique for technique in TECHNIQUES}
+
+    def _add(self, phrase: str, target: Any):
+        words = set(style_features(phrase) if not phrase.startswith("!") else [phrase])
+        for word in words:
+            self._index.setdefault(word, []).append((words, target))
+
+    def retrieve(self, data: Dict[str, Any]) -> Retrieval:
+        """Construção da peça, técnicas citadas nos detalhes e os pontos que elas usam"""
+        words = set(style_features(str(data.get("style_details") or "")))
+        techniques: List[Technique] = []
+        abbreviations: List[str] = []
+        for word in words:
+            for phrase, target in self._index.get(word, ()):
+                if not phrase <= words:
+                    continue
+                if isinstance(target, Technique) and target not in techniques:
+                    techniques.append(target)
+                elif isinstance(target, str) and target not in abbreviations:
+                    abbreviations.append(target)
+        # Ordem fixa (a da base), para o mesmo pedido gerar sempre o mesmo prompt
+        techniques.sort(key=TECHNIQUES.index)
+
+        piece_type = " ".join(tokenize(str(data.get("piece_type") or "")))
+        construction = CONSTRUCTIONS.get(piece_type)
+        for group in ([construction.stitches] if construction else []) + [t.stitches for t in techniques]:
+            abbreviations += [abbreviation for abbreviation in group if abbreviation not in abbreviations]
+        stitches = tuple(STITCHES[abbreviation] for abbreviation in STITCHES if abbreviation in abbreviations)
+        return Retrieval(construction, tuple(techniques), stitches)
+
+    def prompt_section(self, retrieval: Retrieval) -> str:
+        """Trecho compacto do prompt: estrutura, abreviações e marcadores das técnicas"""
+        lines = []
+        if retrieval.construction is not None:
+            # Só o nome de cada parte, na ordem de construção
+            lines.append("Partes, nesta ordem: " + "; ".join(part.split(":")[0] for part in retrieval.construction.parts))
+        if retrieval.stitches:
+            lines.append("Pontos: use só as abreviações " + ", ".join(stitch.abbreviation for stitch in retrieval.stitches)
+                         + ". Não explique os pontos: a legenda entra nas notas automaticamente.")
+        if retrieval.techniques:
+            lines.append("Técnicas: onde cada uma é feita, escreva só o marcador numa linha própria, sem explicar "
+                         "a técnica (o passo a passo é inserido automaticamente): "
+                         + ", ".join(f"[[{technique.title}]]" for technique in retrieval.techniques))
+        return "\n".join(lines)
+
+    def splicer(self, retrieval: Retrieval) -> "TechniqueSplicer":
+        return TechniqueSplicer(retrieval, self._by_title)
+
+
+class TechniqueSplicer:
+    """Insere nas instruções, linha a linha, o texto canônico da base
+
+    - no lugar de cada marcador [[técnica]], o título e o passo a passo
+    - no fim, as técnicas do pedido que o LLM não marcou
+
+    A legenda dos pontos usados (`legend`) vai para as notas do pattern.
+    """
+
+    def __init__(self, retrieval: Retrieval, techniques_by_title: Dict[str, Technique]):
+        self.retrieval = retrieval
+        self._by_title = techniques_by_title
+        self._spliced: Set[str] = set()
+
+    def legend(self) -> List[str]:
+        """Legenda dos pontos citados pelas abreviações"""
+        return [f"{stitch.abbreviation} ({stitch.name}): {stitch.definition}" for stitch in self.retrieval.stitches]
+
+    def feed(self, line: str) -> List[str]:
+        """Linha de instrução do LLM, com os marcadores expandidos"""
+        names = MARKER.findall(line)
+        if not names:
+            return [line]
+        found = [self._by_title.get(" ".join(tokenize(name))) for name in names]
+        # Marcador sozinho vira o título da técnica; no meio de uma frase, a frase
+        # termina em ":" antes do passo a passo. Marcadores desconhecidos ficam só com o texto
+        text = MARKER.sub(lambda match: "" if self._by_title.get(" ".join(tokenize(match.group(1))))
+                          else match.group(1), line).rstrip(" :.").strip()
+        if not text:
+            text = " / ".join(technique.title for technique in found if technique)
+        lines = [f"{text}:" if any(found) else text]
+        for technique in found:
+            if technique is not None and technique.title not in self._spliced:
+                self._spliced.add(technique.title)
+                lines += technique.steps
+        return lines
+
+    def finish(self) -> List[str]:
+        """Técnicas pedidas que não apareceram em nenhum marcador"""
+        lines = []
+        for technique in self.retrieval.techniques:
+            if technique.title not in self._spliced:
+                self._spliced.add(technique.title)
+                lines += [f"{technique.title}:", *technique.steps]
+        return lines
+
+    def splice(self, lines: List[str]) -> List[str]:
+        """Instruções completas de uma vez (geração sem streaming)"""
+        spliced = []
+        for line in lines:
+            spliced += self.feed(line)
+        return spliced + self.finish()
+
+
+def create_knowledge_base() -> Optional[KnowledgeBase]:
+    """Cria a base de técnicas, se habilitada nas variáveis de ambiente"""
+    if os.getenv("KNOWLEDGE_BASE", "true").lower() not in ("1", "true", "yes"):
+        return None
+    return KnowledgeBase()
@@ -0,0 +1,351 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import openai
+from langchain.chat_models import ChatOpenAI
+from langchain.chat_models.base import BaseChatModel
+
+from fake_llm import create_fake_llm
+from history import estimate_tokens
+from http_pool import HTTPPool
+
+T = TypeVar("T")
+
+# Códigos HTTP que indicam falha passageira do provedor (vale tentar de novo)
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """O prazo total da chamada ao LLM acabou antes de uma resposta"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Erros de rede, timeout, limite de taxa e 5xx: podem dar certo numa nova tentativa"""
+    if isinstance(error, LLMDeadlineExceeded):
+        return False
+    if isinstance(error, (TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+class LatencyWindow:
+    """Últimas latências observadas, para estimar percentis"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResilientLLM:
+    """Camada de chamadas ao LLM com prazo, novas tentativas, hedging e modelo reserva
+
+    - cada chamada tem um prazo total (`deadline`) e cada tentativa um limite
+      próprio (`attempt_timeout`)
+    - erros passageiros (rede, timeout, 429, 5xx) são repetidos até
+      `max_retries` vezes, com espera exponencial aleatória (full jitter)
+    - com `hedge_percentile`, se a resposta demorar mais que esse percentil das
+      latências recentes, uma segunda requisição idêntica é disparada e vale a
+      que responder primeiro (a outra é cancelada)
+    - com `fallback`, esgotadas as tentativas no modelo principal, a chamada vai
+      para o modelo reserva; parte do prazo (uma tentativa) fica reservada para ele
+
+    No streaming, as tentativas e o hedging valem até o primeiro token; depois
+    dele, um erro interrompe a resposta.
+    """
+
+    def __init__(self, primary: Any, fallback: Any = None, deadline: float = 90.0,
+                 attempt_timeout: float = 30.0, max_retries: int = 2, retry_base_delay: float = 0.5,
+                 retry_max_delay: float = 8.0, hedge_percentile: Optional[float] = None,
+                 hedge_min_samples: int = 20, latency_window: int = 200):
+        self.primary = primary
+        self.fallback = fallback
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+        # Latência da resposta completa (ainvoke) e do primeiro token (astream)
+        self.latencies = {"invoke": LatencyWindow(latency_window), "first_token": LatencyWindow(latency_window)}
+
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    async def ainvoke(self, messages: List[Any]) -> Any:
+        """Chamada completa ao LLM"""
+        async def attempt(llm: Any, timeout: float) -> Any:
+            return await self._attempt(lambda: self._invoke_once(llm, messages), timeout, "invoke")
+
+        return await self._run(attempt)
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[Any]:
+        """Streaming da resposta; tentativas e hedging valem até o primeiro token"""
+        started = time.monotonic()
+
+        async def attempt(llm: Any, timeout: float) -> Tuple[Any, Any]:
+            return await self._attempt(lambda: self._open_stream(llm, messages), timeout,
+                                       "first_token", discard=self._close_stream)
+
+        first, stream = await self._run(attempt)
+        if stream is None:
+            return
+
+        completion: List[str] = []
+        try:
+            completion.append(first.content)
+            yield first
+            while True:
+                remaining = started + self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LLMDeadlineExceeded(f"prazo de {self.deadline}s esgotado")
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMDeadlineExceeded(f"prazo de {self.deadline}s esgotado") from None
+                completion.append(chunk.content)
+                yield chunk
+        finally:
+            await stream.aclose()
+            self._count_tokens(messages, "".join(completion))
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de tentativas, hedging e modelo reserva, e latências recentes"""
+        latency = {}
+        for name, window in self.latencies.items():
+            latency[name] = {
+                "samples": len(window),
+                **{f"p{p}": window.percentile(p) for p in (50, 95, 99)},
+            }
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "hedge_delay": {name: self.hedge_delay(name) for name in self.latencies},
+            "latency": latency,
+        }
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Espera antes da requisição extra, ou None se o hedging estiver desligado/sem amostras"""
+        window = self.latencies[kind]
+        if self.hedge_percentile is None or len(window) < self.hedge_min_samples:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    def _routes(self, deadline: float) -> List[Tuple[Any, float, int]]:
+        """(modelo, prazo, tentativas extras) na ordem em que são usados"""
+        if self.fallback is None:
+            return [(self.primary, deadline, self.max_retries)]
+        return [(self.primary, deadline - self.attempt_timeout, self.max_retries),
+                (self.fallback, deadline, 0)]
+
+    async def _run(self, attempt: Callable[[Any, float], Awaitable[T]]) -> T:
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        routes = self._routes(deadline)
+        for i, (llm, llm_deadline, retries) in enumerate(routes):
+            if i > 0:
+                self.fallbacks += 1
+            try:
+                return await self._with_retries(llm, attempt, llm_deadline, retries)
+            except Exception as e:
+                if i == len(routes) - 1 or not is_transient(e):
+                    self.failures += 1
+                    raise
+
+    async def _with_retries(self, llm: Any, attempt: Callable[[Any, float], Awaitable[T]],
+                            deadline: float, retries: int) -> T:
+        for n in range(retries + 1):
+            timeout = min(self.attempt_timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise LLMDeadlineExceeded(f"prazo de {self.deadline}s esgotado")
+            try:
+                return await attempt(llm, timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                delay = self._backoff(n, e)
+                if not is_transient(e) or n == retries or time.monotonic() + delay >= deadline:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _invoke_once(self, llm: Any, messages: List[Any]) -> Any:
+        """Uma requisição completa; modelos do LangChain informam os tokens usados"""
+        if isinstance(llm, BaseChatModel):
+            return self._message_from(messages, await llm.agenerate([messages]))
+        message = await llm.ainvoke(messages)
+        self._count_tokens(messages, message.content)
+        return message
+
+    def _message_from(self, messages: List[Any], result: Any) -> Any:
+        message = result.generations[0][0].message
+        self._count_tokens(messages, message.content, (result.llm_output or {}).get("token_usage"))
+        return message
+
+    def _count_tokens(self, messages: List[Any], completion: str, usage: Optional[Dict[str, int]] = None):
+        """Soma os tokens da chamada: os do provedor, ou uma estimativa pelo texto"""
+        usage = usage or {}
+        self.prompt_tokens += usage.get("prompt_tokens") or estimate_tokens(
+            "".join(str(message.content) for message in messages)
+        )
+        self.completion_tokens += usage.get("completion_tokens") or estimate_tokens(completion)
+
+    async def _attempt(self, start: Callable[[], Awaitable[T]], timeout: float, kind: str,
+                       discard: Optional[Callable[[T], Awaitable[None]]] = None) -> T:
+        """Uma tentativa, com uma requisição extra se passar do atraso de hedging"""
+        started = time.monotonic()
+        hedge_delay = self.hedge_delay(kind)
+        if hedge_delay is None or hedge_delay >= timeout:
+            result = await asyncio.wait_for(start(), timeout)
+        else:
+            result = await asyncio.wait_for(self._hedged(start, hedge_delay, discard), timeout)
+        self.latencies[kind].add(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, start: Callable[[], Awaitable[T]], delay: float,
+                      discard: Optional[Callable[[T], Awaitable[None]]]) -> T:
+        first = asyncio.ensure_future(start())
+        pending = {first}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedges += 1
+                pending.add(asyncio.ensure_future(start()))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    if winner is not first:
+                        self.hedge_wins += 1
+                    return winner.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                if discard is not None:
+                    for task in pending:
+                        if not task.cancelled() and task.exception() is None:
+                            await discard(task.result())
+
+    @staticmethod
+    async def _open_stream(llm: Any, messages: List[Any]) -> Tuple[Any, Any]:
+        """Abre o stream e espera o primeiro pedaço: (pedaço, stream) ou (None, None) se vazio"""
+        stream = llm.astream(messages).__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            return None, None
+        except BaseException:
+            await stream.aclose()
+            raise
+        return first, stream
+
+    @staticmethod
+    async def _close_stream(opened: Tuple[Any, Any]):
+        _, stream = opened
+        if stream is not None:
+            await stream.aclose()
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Espera exponencial com jitter; respeita o Retry-After do provedor quando houver"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.retry_max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+
+def create_llm_client(model_name: str, temperature: float, api_key: Optional[str],
+                      pool: Optional[HTTPPool] = None) -> ResilientLLM:
+    """Cria o cliente do LLM (principal e reserva opcional) a partir das variáveis de ambiente
+
+    Com `pool`, todas as requisições (dos dois modelos) usam as mesmas conexões.
+    """
+    attempt_timeout = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+    hedge_percentile = os.getenv("LLM_HEDGE_PERCENTILE")
+    fallback_model = os.getenv("LLM_FALLBACK_MODEL")
+    # LLM local para testes de carga, sem chamar a OpenAI (ver fake_llm.py)
+    fake = os.getenv("LLM_BACKEND", "openai") == "fake"
+
+    clients: Dict[str, Any] = {}
+    if pool is not None and not fake:
+        # As novas tentativas ficam nesta camada, não no SDK da OpenAI
+        options = dict(api_key=api_key, base_url=os.getenv("OPENAI_API_BASE") or None,
+                       timeout=pool.timeout, max_retries=0)
+        clients = {
+            "client": openai.OpenAI(http_client=pool.sync_client, **options).chat.completions,
+            "async_client": openai.AsyncOpenAI(http_client=pool.async_client, **options).chat.completions,
+        }
+
+    def chat_model(model: str) -> Any:
+        if fake:
+            return create_fake_llm(model)
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=api_key,
+            request_timeout=attempt_timeout,
+            max_retries=0,
+            **clients
+        )
+
+    return ResilientLLM(
+        chat_model(model_name),
+        fallback=chat_model(fallback_model) if fallback_model else None,
+        deadline=float(os.getenv("LLM_DEADLINE", "90")),
+        attempt_timeout=attempt_timeout,
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        retry_base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5")),
+        retry_max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "8")),
+        hedge_percentile=float(hedge_percentile) if hedge_percentile else None,
+        hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20")),
+    )
@@ -1,37 +1,104 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import os
+import sys
+import asyncio
 from dotenv import load_dotenv
-from typing import Dict
-import uuid
-from datetime import datetime
+from contextlib import AsyncExitStack
+from typing import Optional, Tuple
+from starlette.concurrency import run_in_threadpool
 
-from models import ChatMessage, PatternRequest, CrochetPattern
+from models import ChatMessage, PatternRequest, CrochetPattern, GradedPatternRequest, PatternJob
 from crochet_agent import CrochetConversationalAgent
+from conversation_store import (
+    ConversationConflictError, ConversationRecord, InMemoryConversationStore, create_conversation_store
+)
+from streaming import format_sse
+from jobs import QueueFullError, create_pattern_job_queue
+from scheduler import SchedulerSaturatedError, create_scheduler
+from speculation import create_speculator
+from metrics import REGISTRY, STAGE_SECONDS, timed
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
-app = FastAPI(title="Crochet Pattern AI", version="1.0.0")
-
-# Configuração CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
-# Inicializa o agente conversacional
+# Inicializa o agente conversacional (o cliente do LLM só é criado no primeiro uso)
 agent = CrochetConversationalAgent()
 
-# Armazena conversas ativas (em produção, use um banco de dados)
-conversations: Dict[str, Dict] = {}
+# Armazena conversas ativas (memória ou SQLite, conforme CONVERSATION_STORE)
+conversation_store = create_conversation_store()
+
+async def _run_pattern_job(conversation_id: Optional[str], data: dict) -> CrochetPattern:
+    """Gera o pattern de um job e, se a conversa ainda pede esses dados, guarda nela"""
+    pattern = await agent.agenerate_pattern_for(data)
+    if conversation_id:
+        # O armazenamento pode bloquear: roda fora do event loop
+        await run_in_threadpool(_attach_job_pattern, conversation_id, data, pattern)
+    return pattern
+
+def _attach_job_pattern(conversation_id: str, data: dict, pattern: CrochetPattern):
+    record = conversation_store.get(conversation_id)
+    if record is not None and agent.attach_pattern(record.state, data, pattern):
+        _save_pattern(record)
+
+# Controle de admissão: lanes separadas para turnos e gerações, com filas limitadas
+scheduler = create_scheduler()
+# Proxies (IPs) cujo header X-Client-Id identifica o cliente nas filas do scheduler
+trusted_proxies = {host.strip() for host in os.getenv("TRUSTED_PROXIES", "").split(",") if host.strip()}
+
+# Geração em segundo plano (PATTERN_JOBS=true): /chat devolve um job_id em vez de esperar o LLM
+pattern_jobs = create_pattern_job_queue(_run_pattern_job)
+
+# Geração especulativa (SPECULATIVE_GENERATION=true): começa antes da última resposta
+speculator = create_speculator(agent)
 
-@app.get("/")
+# Métricas lidas dos componentes na hora da coleta (GET /metrics)
+REGISTRY.gauge("crochet_live_conversations", "Conversas guardadas no armazenamento",
+               lambda: len(conversation_store))
+def _cache_lookups() -> dict:
+    stats = agent.pattern_cache.stats()
+    return {"hit": stats["hits"] + stats["disk_hits"], "miss": stats["misses"]}
+
+REGISTRY.counter("crochet_pattern_cache_lookups_total", "Consultas ao cache de patterns por resultado",
+                 _cache_lookups, label="result")
+REGISTRY.gauge("crochet_pattern_cache_hit_ratio", "Fração das consultas ao cache de patterns com acerto",
+               lambda: agent.pattern_cache.stats()["hit_ratio"])
+REGISTRY.gauge("crochet_pattern_library_entries", "Patterns guardados na biblioteca",
+               lambda: len(agent.pattern_library))
+REGISTRY.counter("crochet_llm_tokens_total", "Tokens enviados (prompt) e recebidos (completion) do LLM",
+                 lambda: {kind: agent.llm.stats()[f"{kind}_tokens"] for kind in ("prompt", "completion")}
+                 if agent.llm_ready else None, label="kind")
+REGISTRY.counter("crochet_llm_events_total", "Chamadas ao LLM, novas tentativas, timeouts, hedging e modelo reserva",
+                 lambda: {event: agent.llm.stats()[event] for event in
+                          ("calls", "retries", "timeouts", "hedges", "hedge_wins", "fallbacks", "failures")}
+                 if agent.llm_ready else None, label="event")
+REGISTRY.counter("crochet_speculation_total", "Especulações resolvidas por resultado (aproveitada, revisada, cancelada)",
+                 lambda: {result: speculator.stats()[result] for result in ("hits", "patched", "misses", "abandoned")}
+                 if speculator is not None else None, label="result")
+REGISTRY.counter("crochet_speculation_wasted_tokens_total", "Tokens (estimados) gastos em especulações canceladas",
+                 lambda: speculator.wasted_tokens if speculator is not None else None)
+REGISTRY.gauge("crochet_scheduler_active", "Trabalhos em execução por lane",
+               lambda: {lane: stats["active"] for lane, stats in scheduler.stats().items()}, label="lane")
+REGISTRY.gauge("crochet_scheduler_queued", "Trabalhos aguardando vaga por lane",
+               lambda: {lane: stats["queued"] for lane, stats in scheduler.stats().items()}, label="lane")
+
+async def _startup():
+    if pattern_jobs is not None:
+        await pattern_jobs.start()
+    if os.getenv("LLM_PREWARM", "false").lower() in ("1", "true", "yes"):
+        # Cria o cliente do LLM em segundo plano, sem atrasar o início do servidor
+        asyncio.get_running_loop().run_in_executor(None, lambda: agent.llm)
+
+async def _shutdown():
+    if pattern_jobs is not None:
+        await pattern_jobs.stop()
+    await agent.aclose()
+
+@router.get("/")
 async def root():
     """Página inicial com interface de chat"""
     return HTMLResponse(content="""
@@ -160,7 +227,7 @@ async def root():
                 input.value = '';
 
                 try {
-                    const response = await fetch('/chat', {
+                    const response = await fetch('/chat/stream', {
                         method: 'POST',
                         headers: {
                             'Content-Type': 'application/json',
@@ -171,18 +238,29 @@ async def root():
                         })
                     });
 
-                    const data = await response.json();
-                    
-                    if (data.conversation_id) {
-                        conversationId = data.conversation_id;
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
                     }
 
-                    // Adiciona resposta do assistente
-                    addMessage(data.response, 'assistant');
+                    // Lê os eventos SSE conforme chegam
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let patternView = null;
+
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+
+                        buffer += decoder.decode(value, { stream: true });
+                        const frames = buffer.split('\\n\\n');
+                        buffer = frames.pop();
 
-                    // Se for um pattern, exibe de forma especial
-                    if (data.pattern) {
-                        displayPattern(data.pattern);
+                        for (const frame of frames) {
+                            const event = parseEvent(frame);
+                            if (!event) continue;
+                            patternView = handleEvent(event, patternView);
+                        }
                     }
 
                 } catch (error) {
@@ -191,30 +269,111 @@ async def root():
                 }
             }
 
+            function parseEvent(frame) {
+                let name = 'message';
+                let data = '';
+                for (const line of frame.split('\\n')) {
+                    if (line.startsWith('event: ')) name = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                return data ? { name, data: JSON.parse(data) } : null;
+            }
+
+            function handleEvent(event, patternView) {
+                if (event.name === 'message') {
+                    if (event.data.conversation_id) {
+                        conversationId = event.data.conversation_id;
+                    }
+                    // Adiciona resposta do assistente
+                    addMessage(event.data.response, 'assistant');
+                } else if (event.name === 'instruction') {
+                    // Mostra cada instrução assim que ela termina de ser gerada
+                    patternView = patternView || createPatternView();
+                    const line = document.createElement('div');
+                    line.textContent = event.data;
+                    patternView.instructions.appendChild(line);
+                    scrollToBottom();
+                } else if (event.name === 'pattern') {
+                    patternView = patternView || createPatternView();
+                    fillPatternHeader(patternView, event.data);
+                } else if (event.name === 'job') {
+                    // O pattern está sendo gerado em segundo plano
+                    pollJob(event.data.job_id);
+                } else if (event.name === 'error') {
+                    addMessage('Desculpe, ocorreu um erro ao gerar o pattern. Tente novamente.', 'assistant');
+                }
+                return patternView;
+            }
+
+            async function pollJob(jobId) {
+                try {
+                    const response = await fetch(`/patterns/jobs/${jobId}`);
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    const job = await response.json();
+
+                    if (job.status === 'done') {
+                        fillPatternHeader(createPatternView(), job.pattern);
+                    } else if (job.status === 'failed') {
+                        addMessage('Desculpe, ocorreu um erro ao gerar o pattern. Tente novamente.', 'assistant');
+                    } else {
+                        setTimeout(() => pollJob(jobId), 2000);
+                    }
+                } catch (error) {
+                    console.error('Erro:', error);
+                    addMessage('Desculpe, ocorreu um erro ao gerar o pattern. Tente novamente.', 'assistant');
+                }
+            }
+
             function addMessage(content, sender) {
                 const messagesContainer = document.getElementById('chatMessages');
                 const messageDiv = document.createElement('div');
                 messageDiv.className = `message ${sender}-message`;
                 messageDiv.textContent = content;
                 messagesContainer.appendChild(messageDiv);
-                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                scrollToBottom();
             }
 
-            function displayPattern(pattern) {
+            function createPatternView() {
                 const messagesContainer = document.getElementById('chatMessages');
                 const patternDiv = document.createElement('div');
                 patternDiv.className = 'pattern-display';
                 patternDiv.innerHTML = `
                     <h3>🧶 Seu Pattern de Crochê</h3>
+                    <div class="pattern-header"></div>
+                    <h4>Instruções:</h4>
+                    <div class="pattern-instructions"></div>
+                `;
+                messagesContainer.appendChild(patternDiv);
+                scrollToBottom();
+                return {
+                    header: patternDiv.querySelector('.pattern-header'),
+                    instructions: patternDiv.querySelector('.pattern-instructions')
+                };
+            }
+
+            function fillPatternHeader(patternView, pattern) {
+                patternView.header.innerHTML = `
                     <p><strong>Peça:</strong> ${pattern.piece_type}</p>
                     <p><strong>Tamanho:</strong> ${pattern.size}</p>
                     <p><strong>Cor:</strong> ${pattern.color}</p>
                     <p><strong>Dificuldade:</strong> ${pattern.difficulty_level}</p>
                     <p><strong>Tempo estimado:</strong> ${pattern.estimated_time}</p>
-                    <h4>Instruções:</h4>
-                    <div>${pattern.instructions.join('<br>')}</div>
                 `;
-                messagesContainer.appendChild(patternDiv);
+                // Se nenhuma instrução chegou em streaming, mostra todas de uma vez
+                if (!patternView.instructions.hasChildNodes()) {
+                    for (const instruction of pattern.instructions) {
+                        const line = document.createElement('div');
+                        line.textContent = instruction;
+                        patternView.instructions.appendChild(line);
+                    }
+                }
+                scrollToBottom();
+            }
+
+            function scrollToBottom() {
+                const messagesContainer = document.getElementById('chatMessages');
                 messagesContainer.scrollTop = messagesContainer.scrollHeight;
             }
         </script>
@@ -222,64 +381,403 @@ async def root():
     </html>
     """)
 
-@app.post("/chat")
-async def chat(request: PatternRequest):
+@timed("state_lookup")
+def _get_or_create_conversation(conversation_id: Optional[str]) -> ConversationRecord:
+    """Retorna a conversa, criando uma nova se necessário"""
+    # Se não há conversation_id, cria uma nova conversa
+    if not conversation_id:
+        return conversation_store.create(agent._create_initial_state())
+    
+    record = conversation_store.get(conversation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Conversa não encontrada")
+    
+    return record
+
+@timed("state_save")
+def _save_conversation(record: ConversationRecord):
+    """Salva a conversa, recusando a mensagem se outra requisição a alterou antes"""
+    try:
+        conversation_store.save(record)
+    except ConversationConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="A conversa foi atualizada por outra mensagem. Tente novamente."
+        )
+
+@timed("state_save")
+def _save_pattern(record: ConversationRecord):
+    """Guarda o pattern entregue na conversa
+
+    Se outra mensagem alterou a conversa enquanto o pattern era gerado, o estado
+    mais novo prevalece; o pattern continua no cache para o próximo pedido.
+    """
+    try:
+        conversation_store.save(record)
+    except ConversationConflictError:
+        pass
+
+def _submit_pattern_job(conversation_id: str, state) -> PatternJob:
+    """Enfileira a geração do pattern da conversa"""
+    try:
+        return pattern_jobs.submit(
+            conversation_id, agent.pattern_cache_key(state.collected_data), dict(state.collected_data)
+        )
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Muitos patterns sendo gerados agora. Tente novamente em instantes.",
+            headers={"Retry-After": "30"}
+        )
+
+def _client_id(http_request: Request) -> str:
+    """Identifica o cliente para a divisão justa das filas do scheduler
+
+    Vale o IP da conexão. O header X-Client-Id, que o próprio cliente escolhe,
+    só é aceito quando a conexão vem de um proxy confiável (TRUSTED_PROXIES).
+    """
+    host = http_request.client.host if http_request.client is not None else None
+    if host in trusted_proxies:
+        return http_request.headers.get("x-client-id") or host
+    return host or "anonimo"
+
+def _speculate(conversation_id: str, state):
+    """Resolve a especulação da conversa e, se só falta a última resposta, inicia outra"""
+    if speculator is not None:
+        speculator.observe(conversation_id, state)
+
+def _process_turn(request: PatternRequest) -> Tuple[ConversationRecord, str]:
+    """Turno baseado em regras: carrega a conversa e calcula a próxima pergunta"""
+    record = _get_or_create_conversation(request.conversation_id)
+    response = agent.get_next_question(record.state, request.message)
+    return record, response
+
+async def _run_turn(request: PatternRequest, client: str) -> Tuple[ConversationRecord, str]:
+    """Executa o turno na lane "turn", fora do event loop (o armazenamento pode bloquear)"""
+    async with scheduler.slot("turn", client):
+        return await run_in_threadpool(_process_turn, request)
+
+@router.post("/chat")
+@timed("chat")
+async def chat(request: PatternRequest, http_request: Request):
     """Endpoint principal para conversar com o agente"""
+    client = _client_id(http_request)
     try:
-        # Se não há conversation_id, cria uma nova conversa
-        if not request.conversation_id:
-            conversation_id = str(uuid.uuid4())
-            conversations[conversation_id] = {
-                "state": agent._create_initial_state(),
-                "created_at": datetime.now()
-            }
-        else:
-            conversation_id = request.conversation_id
-            if conversation_id not in conversations:
-                raise HTTPException(status_code=404, detail="Conversa não encontrada")
-        
-        # Obtém o estado da conversa
-        state = conversations[conversation_id]["state"]
-        
         # Processa a mensagem do usuário
-        response = agent.get_next_question(state, request.message)
+        record, response = await _run_turn(request, client)
+        conversation_id, state = record.conversation_id, record.state
+        _speculate(conversation_id, state)
         
         # Verifica se deve gerar o pattern
         pattern = None
+        job = None
         if state.current_step == "pattern_generation":
-            pattern = agent.generate_pattern(state)
-            # Converte para dict para serialização JSON
-            pattern = pattern.dict()
+            # Reaproveita, revisa ou busca no cache sem chamar o LLM
+            pattern = await agent.aready_pattern(state)
+            if pattern is None and pattern_jobs is not None:
+                # Sem esperar o LLM: enfileira a geração
+                job = await run_in_threadpool(_submit_pattern_job, conversation_id, state)
+        
+        if state.current_step == "pattern_generation" and pattern is None and job is None:
+            # A vaga de geração é reservada antes de gravar o turno: se a lane
+            # estiver saturada (429), nada muda e a mensagem pode ser reenviada
+            async with scheduler.slot("generation", client):
+                _save_conversation(record)
+                pattern = await agent.agenerate_pattern_for(state.collected_data)
+                agent.attach_pattern(state, state.collected_data, pattern)
+                _save_pattern(record)
+        else:
+            _save_conversation(record)
         
-        return {
+        with STAGE_SECONDS.time("serialization"):
+            if pattern is not None:
+                # Converte para dict para serialização JSON
+                pattern = pattern.dict()
+            
+            return {
+                "response": response,
+                "conversation_id": conversation_id,
+                "current_step": state.current_step,
+                "collected_data": state.collected_data,
+                "pattern": pattern,
+                "pattern_version": state.pattern_version,
+                "job_id": job.job_id if job else None
+            }
+        
+    except (HTTPException, SchedulerSaturatedError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
+@router.post("/chat/stream")
+async def chat_stream(request: PatternRequest, http_request: Request):
+    """Versão em streaming (Server-Sent Events) do endpoint de chat"""
+    client = _client_id(http_request)
+    record, response = await _run_turn(request, client)
+    conversation_id, state = record.conversation_id, record.state
+    _speculate(conversation_id, state)
+    
+    job = None
+    ready = None
+    admission = AsyncExitStack()
+    if state.current_step == "pattern_generation":
+        # Reaproveitado, revisado ou do cache: vai direto para o streaming, sem nova consulta
+        ready = await agent.aready_pattern(state)
+    if state.current_step == "pattern_generation" and ready is None:
+        if pattern_jobs is not None:
+            job = await run_in_threadpool(_submit_pattern_job, conversation_id, state)
+        else:
+            # Reservada antes de gravar o turno; liberada ao fim do streaming
+            await admission.enter_async_context(scheduler.slot("generation", client))
+    
+    try:
+        _save_conversation(record)
+    except HTTPException:
+        await admission.aclose()
+        raise
+    
+    async def events():
+        yield format_sse("message", {
             "response": response,
             "conversation_id": conversation_id,
             "current_step": state.current_step,
-            "collected_data": state.collected_data,
-            "pattern": pattern
-        }
+            "collected_data": state.collected_data
+        })
+        
+        try:
+            if job is not None:
+                # O cliente acompanha a geração por GET /patterns/jobs/{id}
+                yield format_sse("job", {"job_id": job.job_id, "status": job.status.value})
+            elif state.current_step == "pattern_generation":
+                if ready is not None:
+                    stream = agent.replay_pattern(ready)
+                else:
+                    stream = agent.astream_pattern(state, lookup=False)
+                async for event in stream:
+                    data = event["data"]
+                    if event["event"] == "pattern":
+                        _save_pattern(record)
+                        data = data.dict()
+                    yield format_sse(event["event"], data)
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Erro interno: {str(e)}"})
+        finally:
+            await admission.aclose()
         
+        yield format_sse("done", {
+            "conversation_id": conversation_id,
+            "pattern_version": state.pattern_version
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/patterns/graded")
+async def graded_pattern(request: GradedPatternRequest, http_request: Request):
+    """Gera um pattern com todos os tamanhos (XS a XXL) numa única chamada ao LLM"""
+    data = request.model_dump()
+    data["piece_type"] = request.piece_type.value
+    try:
+        async with scheduler.slot("generation", _client_id(http_request)):
+            pattern = await agent.agenerate_graded_pattern(data)
+    except (HTTPException, SchedulerSaturatedError):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+    
+    from stitch_math import grade_for
+    return {
+        "pattern": pattern.dict(),
+        # Metragem, novelos e tempo de cada tamanho, calculados localmente
+        "sizes": grade_for(data).by_size()
+    }
+
+@router.get("/patterns/jobs/{job_id}")
+async def get_pattern_job(job_id: str):
+    """Status de uma geração em segundo plano e, quando pronto, o pattern"""
+    job = await run_in_threadpool(pattern_jobs.get, job_id) if pattern_jobs is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
 
-@app.get("/conversations/{conversation_id}")
+@router.get("/patterns")
+async def search_patterns(q: str = "", piece_type: Optional[str] = None, size: Optional[str] = None,
+                          yarn_weight: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """Busca na biblioteca de patterns gerados (texto livre e filtros), dos mais recentes aos mais antigos"""
+    results = await run_in_threadpool(
+        agent.pattern_library.search, q, limit=max(1, min(limit, 100)), offset=max(0, offset),
+        piece_type=piece_type, size=size, yarn_weight=yarn_weight
+    )
+    return {"query": q, "results": results}
+
+@router.get("/patterns/{pattern_id}")
+async def get_library_pattern(pattern_id: int):
+    """Pattern da biblioteca, com os dados do pedido que o gerou"""
+    entry = agent.pattern_library.get(pattern_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Pattern não encontrado")
+    return entry
+
+@router.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """Obtém o histórico de uma conversa específica"""
-    if conversation_id not in conversations:
+    record = conversation_store.get(conversation_id)
+    if record is None:
         raise HTTPException(status_code=404, detail="Conversa não encontrada")
     
     return {
         "conversation_id": conversation_id,
-        "history": conversations[conversation_id]["state"].conversation_history,
-        "collected_data": conversations[conversation_id]["state"].collected_data,
-        "created_at": conversations[conversation_id]["created_at"]
+        "history": record.state.conversation_history,
+        "collected_data": record.state.collected_data,
+        "created_at": record.created_at,
+        "pattern": record.state.pattern,
+        "pattern_version": record.state.pattern_version,
+        # Confiança de cada campo e turnos até chegar ao pattern
+        **agent.slot_filler.report(record.state)
     }
 
-@app.get("/health")
+@router.get("/conversations/{conversation_id}/prompt")
+async def get_conversation_prompt(conversation_id: str):
+    """Tamanho efetivo do prompt conversacional: histórico recente, resumo e orçamento de tokens"""
+    record = conversation_store.get(conversation_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Conversa não encontrada")
+    
+    return {
+        "conversation_id": conversation_id,
+        **agent.prompt_size(record.state),
+        "summary": agent.history_policy.summary_text(record.state)
+    }
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Estatísticas do cache de patterns e das gerações agrupadas"""
+    return {
+        **agent.pattern_cache.stats(),
+        "inflight_generations": agent.inflight_generations.stats(),
+        "pattern_jobs": pattern_jobs.stats() if pattern_jobs is not None else None,
+        "speculation": speculator.stats() if speculator is not None else None,
+        "library": agent.pattern_library.stats(),
+        "similarity": agent.similarity_index.stats() if agent.similarity_index is not None else None
+    }
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    """Ocupação e profundidade das filas de cada lane do scheduler"""
+    return scheduler.stats()
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """Tentativas, hedging, uso do modelo reserva e latências recentes do LLM"""
+    if not agent.llm_ready:
+        return {"initialized": False}
+    return agent.llm.stats()
+
+@router.get("/llm/pool")
+async def llm_pool_stats():
+    """Uso do pool de conexões HTTP com o provedor do LLM"""
+    if agent.http_pool is None:
+        return {"initialized": False}
+    return agent.http_pool.stats()
+
+@router.get("/metrics")
+async def metrics():
+    """Métricas no formato do Prometheus: tempo por etapa, tokens, cache, conversas e filas"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/health")
 async def health_check():
     """Endpoint de saúde da API"""
     return {"status": "healthy", "message": "Crochet Pattern AI está funcionando!"}
 
+@router.get("/ready")
+async def readiness_check():
+    """Prontidão para receber tráfego: armazenamento acessível, LLM configurado e fila rodando
+
+    Diferente de /health (processo vivo), responde 503 enquanto algo impedir o atendimento.
+    """
+    checks = {}
+    try:
+        len(conversation_store)
+        checks["conversation_store"] = "ok"
+    except Exception as e:
+        checks["conversation_store"] = f"erro: {e}"
+    
+    if os.getenv("LLM_BACKEND", "openai") != "fake" and not os.getenv("OPENAI_API_KEY"):
+        checks["llm"] = "erro: OPENAI_API_KEY não configurada"
+    else:
+        checks["llm"] = "ok" if agent.llm_ready else "ok (criado no primeiro uso)"
+    
+    if pattern_jobs is not None:
+        checks["pattern_jobs"] = "ok" if pattern_jobs.running else "erro: workers parados"
+    
+    ready = not any(check.startswith("erro") for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
+async def _scheduler_saturated(request: Request, exc: SchedulerSaturatedError):
+    """Lane saturada: recusa com 429 e estima quando tentar de novo"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Servidor ocupado no momento. Tente novamente em instantes."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+def _worker_count() -> int:
+    """Quantos processos servem o app: WORKERS, WEB_CONCURRENCY ou `--workers`/`-w` da linha de comando
+
+    Os workers do uvicorn e do gunicorn herdam a linha de comando do processo
+    principal, então `uvicorn main:app --workers 4` também é detectado.
+    """
+    counts = [os.getenv("WORKERS", "1"), os.getenv("WEB_CONCURRENCY", "1")]
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg.startswith("--workers="):
+            counts.append(arg.split("=", 1)[1])
+        elif arg in ("--workers", "-w") and i + 1 < len(args):
+            counts.append(args[i + 1])
+    return max(int(count) if count.isdigit() else 1 for count in counts)
+
+def create_app() -> FastAPI:
+    """Cria o app FastAPI
+    
+    Nada pesado acontece aqui: LangChain, o cliente da OpenAI e o NumPy só são
+    carregados quando a primeira geração precisar deles.
+    """
+    if _worker_count() > 1 and isinstance(conversation_store, InMemoryConversationStore):
+        # Cada worker é um processo: as conversas precisam estar num armazenamento compartilhado
+        raise RuntimeError("Com mais de um worker use CONVERSATION_STORE=sqlite para compartilhar as conversas")
+    
+    app = FastAPI(title="Crochet Pattern AI", version="1.0.0")
+    
+    # Configuração CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    app.include_router(router)
+    app.add_exception_handler(SchedulerSaturatedError, _scheduler_saturated)
+    app.add_event_handler("startup", _startup)
+    app.add_event_handler("shutdown", _shutdown)
+    return app
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1:
+        # O armazenamento compartilhado já foi verificado em create_app()
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
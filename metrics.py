@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Limites (segundos) dos buckets dos histogramas: de 0,5 ms (extração) a 60 s (LLM)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Valores de uma métrica lida na hora da coleta: {valor do label: valor} ou um número
+Collector = Callable[[], Any]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histograma com buckets fixos e um label, no formato do Prometheus
+
+    `observe` custa uma busca binária e um incremento sob lock, baixo o
+    bastante para ficar ligado em produção.
+    """
+
+    def __init__(self, name: str, help: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # valor do label -> (contagem por bucket, soma, total)
+        self._series: Dict[str, List[Any]] = {}
+
+    def observe(self, label_value: str, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value: str) -> Iterator[None]:
+        """Mede a duração do bloco"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - started)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {value: (list(counts), total, count) for value, (counts, total, count) in self._series.items()}
+        for value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {_format_value(total)}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+
+class CollectedMetric:
+    """Counter ou gauge cujo valor é lido de outro componente na hora da coleta"""
+
+    def __init__(self, name: str, help: str, kind: str, collect: Collector, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.collect = collect
+        self.label = label
+
+    def render(self) -> List[str]:
+        try:
+            values = self.collect()
+        except Exception:
+            # Um componente indisponível não derruba a coleta das outras métricas
+            return []
+        if values is None:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.label is None:
+            lines.append(f"{self.name} {_format_value(values)}")
+        else:
+            for value, number in sorted(values.items()):
+                lines.append(f'{self.name}{{{self.label}="{value}"}} {_format_value(number)}')
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas expostas em /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def histogram(self, name: str, help: str, label: str) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, label))
+
+    def counter(self, name: str, help: str, collect: Collector, label: Optional[str] = None):
+        self._metrics[name] = CollectedMetric(name, help, "counter", collect, label)
+
+    def gauge(self, name: str, help: str, collect: Collector, label: Optional[str] = None):
+        self._metrics[name] = CollectedMetric(name, help, "gauge", collect, label)
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "crochet_stage_duration_seconds",
+    "Duração de cada etapa do atendimento (extração, estado, fila e geração do LLM, serialização)",
+    label="stage",
+)
+
+
+def timed(stage: str):
+    """Decorator que registra a duração da função (síncrona ou assíncrona) em STAGE_SECONDS"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    STAGE_SECONDS.observe(stage, time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 from enum import Enum
+from datetime import datetime
 
 class PieceType(str, Enum):
     COAT = "colete"
@@ -26,6 +27,15 @@ class ConversationState(BaseModel):
     collected_data: Dict[str, Any] = {}
     missing_information: List[str] = []
     conversation_history: List[Dict[str, str]] = []
+    slot_confidence: Dict[str, float] = {}  # 1.0 reconhecido, 0.5 texto livre, 0.0 pulado/padrão
+    slot_attempts: Dict[str, int] = {}  # perguntas sem resposta aproveitável, por campo
+    turn_count: int = 0
+    turns_to_pattern: Optional[int] = None
+    pattern: Optional["CrochetPattern"] = None  # último pattern entregue nesta conversa
+    pattern_version: int = 0  # incrementa a cada pattern novo ou revisado
+    pattern_inputs: Dict[str, str] = {}  # dados normalizados usados no pattern atual
+    history_summary: str = ""  # trechos das mensagens do usuário que saíram do histórico
+    summarized_messages: int = 0  # mensagens que saíram do histórico (ver history.py)
 
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
@@ -45,6 +55,33 @@ class CrochetPattern(BaseModel):
     difficulty_level: str
     estimated_time: str
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class PatternJob(BaseModel):
+    """Geração de pattern em segundo plano"""
+    job_id: str
+    status: JobStatus
+    conversation_id: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    pattern: Optional[CrochetPattern] = None
+    error: Optional[str] = None
+
 class PatternRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
+
+class GradedPatternRequest(BaseModel):
+    """Pedido de pattern com todos os tamanhos (XS a XXL) de uma vez"""
+    piece_type: PieceType
+    color: str = "sem preferência"
+    yarn_type: str = "sem preferência"
+    yarn_weight: str = "médio"
+    style_details: str = "sem detalhes"
+    gauge: Optional[Dict[str, float]] = None  # {"stitches": 18, "rows": 20} por 10cm
+
+ConversationState.model_rebuild()
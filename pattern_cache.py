@@ -0,0 +1,145 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from models import CrochetPattern
+
+# Campos da conversa que influenciam o prompt de geração
+PATTERN_INPUT_FIELDS = (
+    "piece_type", "size", "color", "yarn_type", "yarn_weight", "style_details", "measurements", "gauge"
+)
+
+
+def normalize_pattern_inputs(data: Dict[str, Any]) -> Dict[str, str]:
+    """Normaliza os dados coletados para que pedidos equivalentes tenham a mesma forma"""
+    normalized = {}
+    for field in PATTERN_INPUT_FIELDS:
+        value = data.get(field) or ""
+        if isinstance(value, dict):
+            value = json.dumps(value, sort_keys=True)
+        normalized[field] = " ".join(str(value).lower().split())
+    return normalized
+
+
+def pattern_cache_key(data: Dict[str, Any], model: str, prompt_version: str) -> str:
+    """Gera a chave canônica (hash) de um pedido de pattern"""
+    payload = {
+        "inputs": normalize_pattern_inputs(data),
+        "model": model,
+        "prompt_version": prompt_version,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PatternCache:
+    """Cache de patterns endereçado por conteúdo: LRU em memória com TTL e camada opcional em disco"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        self._entries: "OrderedDict[str, Tuple[float, CrochetPattern]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            # WAL permite que vários workers compartilhem o mesmo arquivo
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pattern_cache ("
+                "key TEXT PRIMARY KEY, pattern TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[CrochetPattern]:
+        """Retorna uma cópia do pattern em cache, ou None se não houver entrada válida"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, pattern = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return pattern.model_copy(deep=True)
+                del self._entries[key]
+
+            pattern = self._get_from_disk(key, now)
+            if pattern is not None:
+                self.disk_hits += 1
+                return pattern.model_copy(deep=True)
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, pattern: CrochetPattern):
+        """Armazena um pattern no cache (memória e, se configurado, disco)"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, pattern.model_copy(deep=True))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pattern_cache (key, pattern, expires_at) VALUES (?, ?, ?)",
+                    (key, pattern.model_dump_json(), expires_at)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Remove todas as entradas, inclusive as do disco"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM pattern_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso do cache"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+    def _remember(self, key: str, expires_at: float, pattern: CrochetPattern):
+        self._entries[key] = (expires_at, pattern)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[CrochetPattern]:
+        if self._db is None:
+            return None
+
+        row = self._db.execute(
+            "SELECT pattern, expires_at FROM pattern_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        pattern_json, expires_at = row
+        if expires_at <= now:
+            self._db.execute("DELETE FROM pattern_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+
+        # Promove a entrada para a memória
+        pattern = CrochetPattern.model_validate_json(pattern_json)
+        self._remember(key, expires_at, pattern)
+        return pattern
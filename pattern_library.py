@@ -0,0 +1,219 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from models import CrochetPattern
+from pattern_cache import PATTERN_INPUT_FIELDS, normalize_pattern_inputs
+
+# Campos do pedido no índice de texto (medidas e amostra ficam de fora)
+TEXT_FIELDS = ("piece_type", "size", "color", "yarn_type", "yarn_weight", "style_details")
+
+# Campos do pedido que podem ser filtrados na busca
+SEARCH_FILTERS = ("piece_type", "size", "yarn_weight")
+
+
+class PatternLibrary:
+    """Biblioteca de patterns gerados, em SQLite com índice de texto (FTS5)
+
+    Cada pattern é guardado com os dados normalizados do pedido (uma linha por
+    chave do cache). A busca por texto usa o FTS5 sobre os campos do pedido
+    (sem acentos: "algodao" acha "algodão") e devolve os mais recentes primeiro,
+    o que mantém a consulta em milissegundos mesmo com centenas de milhares de
+    patterns. `close_match` procura um pattern com a mesma forma (peça, tamanho,
+    espessura, detalhes) que só difira nos campos que podem ser revisados
+    localmente.
+
+    Com `max_entries`, a biblioteca guarda no máximo esse número de patterns;
+    acima disso os mais antigos saem (inclusive do índice de texto). Sem ele,
+    nada é descartado.
+    """
+
+    def __init__(self, path: str = ":memory:", max_entries: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.reuses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{field} TEXT NOT NULL" for field in PATTERN_INPUT_FIELDS)
+        # AUTOINCREMENT: o id de um pattern substituído não volta a ser usado
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS patterns ("
+            "pattern_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "inputs_key TEXT NOT NULL UNIQUE, "
+            "generator TEXT NOT NULL, "
+            f"{columns}, "
+            "pattern TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "uses INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS patterns_shape "
+            "ON patterns (piece_type, size, yarn_weight, style_details)"
+        )
+        # Índice de texto externo: o conteúdo fica só em `patterns`, mantido pelos triggers
+        indexed = ", ".join(TEXT_FIELDS)
+        self._db.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS patterns_fts USING fts5({indexed}, "
+            "content='patterns', content_rowid='pattern_id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        new_values = ", ".join(f"new.{field}" for field in TEXT_FIELDS)
+        old_values = ", ".join(f"old.{field}" for field in TEXT_FIELDS)
+        self._db.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS patterns_ai AFTER INSERT ON patterns BEGIN
+                INSERT INTO patterns_fts (rowid, {indexed}) VALUES (new.pattern_id, {new_values});
+            END;
+            CREATE TRIGGER IF NOT EXISTS patterns_ad AFTER DELETE ON patterns BEGIN
+                INSERT INTO patterns_fts (patterns_fts, rowid, {indexed})
+                VALUES ('delete', old.pattern_id, {old_values});
+            END;
+        """)
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM patterns").fetchone()[0]
+
+    def add(self, key: str, data: Dict[str, Any], pattern: CrochetPattern, generator: str = "") -> int:
+        """Guarda o pattern gerado para os dados do pedido; o mesmo pedido substitui o anterior
+
+        `generator` identifica modelo e versão do prompt, para que `close_match`
+        não devolva patterns de um prompt antigo.
+        """
+        inputs = normalize_pattern_inputs(data)
+        with self._lock:
+            # Substituir apaga e insere de novo, então os triggers mantêm o índice de texto
+            self._count -= self._db.execute("DELETE FROM patterns WHERE inputs_key = ?", (key,)).rowcount
+            cursor = self._db.execute(
+                f"INSERT INTO patterns (inputs_key, generator, {', '.join(PATTERN_INPUT_FIELDS)}, pattern, created_at) "
+                f"VALUES (?, ?, {', '.join('?' for _ in PATTERN_INPUT_FIELDS)}, ?, ?)",
+                (key, generator, *(inputs[field] for field in PATTERN_INPUT_FIELDS),
+                 pattern.model_dump_json(), time.time())
+            )
+            self._count += 1
+            if self.max_entries and self._count > self.max_entries:
+                # Os mais antigos saem; os triggers tiram as linhas do índice de texto
+                removed = self._db.execute(
+                    "DELETE FROM patterns WHERE pattern_id IN "
+                    "(SELECT pattern_id FROM patterns ORDER BY pattern_id LIMIT ?)",
+                    (self._count - self.max_entries,)
+                ).rowcount
+                self._count -= removed
+                self.evictions += removed
+            self._db.commit()
+            return cursor.lastrowid
+
+    def get(self, pattern_id: int) -> Optional[Dict[str, Any]]:
+        """Pattern guardado, com os dados do pedido, ou None"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._columns()} FROM patterns WHERE pattern_id = ?", (pattern_id,)
+            ).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def search(self, query: str = "", limit: int = 20, offset: int = 0, **filters: Optional[str]) -> List[Dict[str, Any]]:
+        """Busca por texto nos dados do pedido e/ou filtros exatos, dos mais recentes para os mais antigos"""
+        terms = [f'"{term}"*' for term in re.findall(r"\w+", query.lower())]
+        conditions = {field: " ".join(str(value).lower().split()) for field, value in filters.items()
+                      if field in SEARCH_FILTERS and value}
+
+        with self._lock:
+            self.searches += 1
+            if terms:
+                # O FTS5 só busca o texto livre; os filtros continuam exatos, como sem `query`
+                where = "".join(f" AND p.{field} = ?" for field in conditions)
+                rows = self._db.execute(
+                    f"SELECT {self._columns('p.')} FROM patterns_fts f JOIN patterns p ON p.pattern_id = f.rowid "
+                    f"WHERE patterns_fts MATCH ?{where} ORDER BY f.rowid DESC LIMIT ? OFFSET ?",
+                    (" ".join(terms), *conditions.values(), limit, offset)
+                ).fetchall()
+            else:
+                where = " AND ".join(f"{field} = ?" for field in conditions) or "1"
+                rows = self._db.execute(
+                    f"SELECT {self._columns()} FROM patterns WHERE {where} "
+                    "ORDER BY pattern_id DESC LIMIT ? OFFSET ?",
+                    (*conditions.values(), limit, offset)
+                ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def close_match(self, data: Dict[str, Any], vary: Sequence[str] = (),
+                    generator: str = "") -> Optional[Tuple[int, Dict[str, str], CrochetPattern]]:
+        """Pattern com os mesmos dados do pedido, exceto talvez os campos em `vary`
+
+        Entre os candidatos, prefere os que já coincidem nos campos de `vary` e os
+        mais reaproveitados. Retorna (id, dados normalizados do pattern, pattern).
+        """
+        inputs = normalize_pattern_inputs(data)
+        fixed = [field for field in PATTERN_INPUT_FIELDS if field not in vary]
+        order = ", ".join([f"({field} = ?) DESC" for field in vary] + ["uses DESC", "pattern_id DESC"])
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._columns()} FROM patterns "
+                f"WHERE {' AND '.join(f'{field} = ?' for field in fixed)} AND generator = ? "
+                f"ORDER BY {order} LIMIT 1",
+                (*(inputs[field] for field in fixed), generator, *(inputs[field] for field in vary))
+            ).fetchone()
+        if row is None:
+            return None
+        entry = self._entry(row)
+        return entry["pattern_id"], entry["inputs"], entry["pattern"]
+
+    def requests(self, generator: str = "") -> List[Tuple[int, Dict[str, str]]]:
+        """(id, dados normalizados do pedido) de todos os patterns do gerador, dos mais antigos aos mais novos"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT pattern_id, {', '.join(PATTERN_INPUT_FIELDS)} FROM patterns "
+                "WHERE generator = ? ORDER BY pattern_id", (generator,)
+            ).fetchall()
+        return [(pattern_id, dict(zip(PATTERN_INPUT_FIELDS, inputs))) for pattern_id, *inputs in rows]
+
+    def mark_used(self, pattern_id: int):
+        """Conta um reaproveitamento do pattern"""
+        with self._lock:
+            self.reuses += 1
+            self._db.execute("UPDATE patterns SET uses = uses + 1 WHERE pattern_id = ?", (pattern_id,))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho da biblioteca, buscas, reaproveitamentos e remoções por limite"""
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "searches": self.searches,
+            "reuses": self.reuses,
+            "persistent": self.path != ":memory:",
+        }
+
+    def __len__(self) -> int:
+        return self._count
+
+    @staticmethod
+    def _columns(prefix: str = "") -> str:
+        fields = ("pattern_id", *PATTERN_INPUT_FIELDS, "pattern", "created_at", "uses")
+        return ", ".join(prefix + field for field in fields)
+
+    @staticmethod
+    def _entry(row: tuple) -> Dict[str, Any]:
+        pattern_id, *inputs, pattern_json, created_at, uses = row
+        return {
+            "pattern_id": pattern_id,
+            "inputs": dict(zip(PATTERN_INPUT_FIELDS, inputs)),
+            "pattern": CrochetPattern.model_validate_json(pattern_json),
+            "created_at": datetime.fromtimestamp(created_at),
+            "uses": uses,
+        }
+
+
+def create_pattern_library() -> PatternLibrary:
+    """Cria a biblioteca de patterns, persistida em arquivo SQLite e sem limite de tamanho por padrão"""
+    max_entries = int(os.getenv("PATTERN_LIBRARY_MAX_ENTRIES") or "0")
+    return PatternLibrary(
+        path=os.getenv("PATTERN_LIBRARY_PATH", "patterns.db"),
+        max_entries=max_entries or None,
+    )
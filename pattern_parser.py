@@ -0,0 +1,238 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from streaming import InstructionLineBuffer
+
+# Campos do CrochetPattern que o LLM escreve; os demais vêm do cálculo local (stitch_math)
+PATTERN_OUTPUT_FIELDS = ("instructions", "special_notes")
+
+# Esquema pedido ao LLM no modo estruturado
+PATTERN_OUTPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "instructions": {"type": "array", "items": {"type": "string"}},
+        "special_notes": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["instructions"],
+}
+
+# Campo (ou item de lista) concluído durante o streaming: (campo, valor)
+ParsedItem = Tuple[str, Any]
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_FENCE = re.compile(r"^\s*```")
+
+
+class PatternStreamParser:
+    """Lê a resposta do LLM em uma única passada, enquanto ela chega
+
+    No modo estruturado o LLM devolve um objeto JSON (ver
+    PATTERN_OUTPUT_SCHEMA). Cada string de uma lista de primeiro nível (ex.:
+    uma linha de `instructions`) é devolvida por `feed` assim que fecha, sem
+    esperar o resto do objeto. O parser é tolerante:
+    - texto antes do objeto (ex.: cerca ```json) é ignorado, e o que vier depois também
+    - objeto truncado ou malformado: fica o que foi lido até o problema
+    - resposta sem JSON: cada linha não vazia vira uma instrução, como no modo texto
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        # "detect" até o primeiro caractere útil; depois "json", "text" ou "done"
+        self._mode = "detect"
+        self._prefix = ""
+        self._lines = InstructionLineBuffer()
+        self._raw: List[str] = []
+
+        # Estado do leitor de JSON
+        self._stack: List[str] = []  # "{" ou "["
+        self._key: Optional[str] = None  # chave de primeiro nível atual
+        self._expect_key = False
+        self._string: Optional[List[str]] = None
+        self._escape: Optional[str] = None  # None, "" (após a barra) ou dígitos de \uXXXX
+        self._scalar: List[str] = []
+        self.malformed = False
+
+    def feed(self, text: str) -> List[ParsedItem]:
+        """Processa um pedaço da resposta e devolve os itens que ficaram completos"""
+        self._raw.append(text)
+        if self._mode == "detect":
+            text = self._detect(text)
+        if self._mode == "text":
+            lines = self._text_lines(self._lines.feed(text))
+            self.fields.setdefault("instructions", []).extend(lines)
+            return [("instructions", line) for line in lines]
+        if self._mode == "json":
+            return self._feed_json(text)
+        return []
+
+    def finish(self) -> Dict[str, Any]:
+        """Campos lidos; sem JSON aproveitável, as linhas da resposta viram instruções"""
+        if self._mode == "detect":
+            self._mode = "text"
+            self._lines.feed(self._prefix)
+        if self._mode == "text":
+            for line in self._text_lines(self._lines.flush()):
+                self.fields.setdefault("instructions", []).append(line)
+        elif self._mode == "json" and self._stack:
+            # Resposta cortada no meio (limite de tokens, conexão caiu)
+            self.malformed = True
+        for field in PATTERN_OUTPUT_FIELDS:
+            if isinstance(self.fields.get(field), str):
+                # Lista entregue como uma única string
+                self.fields[field] = [line.strip() for line in self.fields[field].split("\n") if line.strip()]
+        if self._mode != "text" and not self.fields.get("instructions"):
+            self.malformed = True
+            self.fields["instructions"] = self._fallback_lines()
+        return self.fields
+
+    def _detect(self, text: str) -> str:
+        """Decide entre JSON e texto pelo primeiro caractere útil; devolve o que falta ler"""
+        self._prefix += text
+        while True:
+            stripped = self._prefix.lstrip()
+            if not stripped:
+                return ""
+            if stripped.startswith("```"):
+                # Cerca de código: descarta a linha de abertura
+                if "\n" not in stripped:
+                    return ""
+                self._prefix = stripped.split("\n", 1)[1]
+                continue
+            self._mode = "json" if stripped.startswith("{") else "text"
+            rest, self._prefix = stripped, ""
+            return rest
+
+    def _text_lines(self, lines: List[str]) -> List[str]:
+        return [line.strip() for line in lines if not _FENCE.match(line)]
+
+    def _fallback_lines(self) -> List[str]:
+        """Linhas do texto bruto, sem a sintaxe JSON, para respostas que não deu para ler"""
+        text = "".join(self._raw)
+        lines = []
+        for line in text.replace("\\n", "\n").split("\n"):
+            line = line.strip().strip("{}[],").strip()
+            line = re.sub(r'^"?(instructions|special_notes)"?\s*:\s*\[?', "", line).strip().strip('"').strip()
+            if line and not _FENCE.match(line):
+                lines.append(line)
+        return lines
+
+    def _feed_json(self, text: str) -> List[ParsedItem]:
+        items: List[ParsedItem] = []
+        for char in text:
+            if self._mode != "json":
+                break
+            if self._string is not None:
+                self._read_string_char(char, items)
+            elif char == '"':
+                self._string = []
+            elif char in "{[":
+                self._end_scalar(items)
+                if char == "{" and not self._stack:
+                    self._expect_key = True
+                elif len(self._stack) == 1 and char == "[" and self._key is not None:
+                    self.fields.setdefault(self._key, [])
+                self._stack.append(char)
+            elif char in "}]":
+                self._end_scalar(items)
+                if not self._stack or (self._stack[-1] == "{") != (char == "}"):
+                    self._fail()
+                    break
+                self._stack.pop()
+                if not self._stack:
+                    self._mode = "done"
+            elif char == ",":
+                self._end_scalar(items)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+            elif char == ":":
+                if len(self._stack) == 1:
+                    self._expect_key = False
+            elif not char.isspace():
+                self._scalar.append(char)
+        return items
+
+    def _read_string_char(self, char: str, items: List[ParsedItem]):
+        if self._escape is not None:
+            if self._escape == "" and char != "u":
+                self._string.append(_ESCAPES.get(char, char))
+                self._escape = None
+            elif self._escape == "":
+                self._escape = "u"
+            else:
+                self._escape += char
+                if len(self._escape) == 5:
+                    try:
+                        code = int(self._escape[1:], 16)
+                    except ValueError:
+                        code = None
+                        self.malformed = True
+                    if code is not None and 0xDC00 <= code <= 0xDFFF and self._string \
+                            and 0xD800 <= ord(self._string[-1]) <= 0xDBFF:
+                        # Par substituto (\ud83e\uddf6): junta as duas metades
+                        high = ord(self._string.pop())
+                        code = 0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)
+                    if code is not None:
+                        self._string.append(chr(code))
+                    self._escape = None
+        elif char == "\\":
+            self._escape = ""
+        elif char == '"':
+            value, self._string = "".join(self._string), None
+            self._value(value, items)
+        else:
+            self._string.append(char)
+
+    def _value(self, value: Any, items: List[ParsedItem]):
+        """Valor completo: chave ou valor de primeiro nível, ou item de uma lista de primeiro nível"""
+        depth = len(self._stack)
+        if depth == 1 and self._expect_key:
+            self._key = value
+            self._expect_key = False
+        elif depth == 1 and self._key is not None:
+            self.fields[self._key] = value
+            items.append((self._key, value))
+        elif depth == 2 and self._stack[-1] == "[" and self._key is not None:
+            # Um item com quebras de linha vira várias linhas
+            values = [line.strip() for line in value.split("\n") if line.strip()] if isinstance(value, str) else [value]
+            self.fields[self._key].extend(values)
+            items.extend((self._key, line) for line in values)
+
+    def _end_scalar(self, items: List[ParsedItem]):
+        """Números, true/false/null terminam no próximo separador"""
+        if not self._scalar:
+            return
+        token, self._scalar = "".join(self._scalar), []
+        try:
+            self._value(json.loads(token), items)
+        except ValueError:
+            self.malformed = True
+
+    def _fail(self):
+        self.malformed = True
+        self._mode = "done"
+
+
+def parse_pattern_output(text: str) -> Dict[str, Any]:
+    """Lê a resposta completa do LLM (JSON, JSON malformado ou texto)"""
+    # Caminho rápido: JSON válido vai direto para o json da biblioteca padrão
+    body = text.strip()
+    if body.startswith("```"):
+        body = body.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+    if body.startswith("{"):
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            fields = None
+        if isinstance(fields, dict) and all(
+            isinstance(fields.get(field), list) and all(isinstance(item, str) for item in fields[field])
+            for field in PATTERN_OUTPUT_FIELDS if field in fields
+        ) and fields.get("instructions"):
+            for field in PATTERN_OUTPUT_FIELDS:
+                if field in fields:
+                    fields[field] = [line.strip() for item in fields[field] for line in item.split("\n") if line.strip()]
+            return fields
+
+    parser = PatternStreamParser()
+    parser.feed(text)
+    return parser.finish()
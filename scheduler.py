@@ -0,0 +1,178 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+from metrics import STAGE_SECONDS
+
+
+class SchedulerSaturatedError(Exception):
+    """A fila da lane (ou a cota do cliente nela) está cheia"""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"lane {lane} saturada")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Lane:
+    """Vagas de execução para um tipo de trabalho, com fila limitada e justa entre clientes
+
+    Até `capacity` trabalhos rodam ao mesmo tempo. Os demais esperam numa fila
+    separada por cliente; a vaga liberada passa para o próximo cliente em
+    rodízio, de modo que um cliente com muitos pedidos não atrasa os outros.
+    Pedidos além de `max_queue` (no total) ou `max_queued_per_client` (por
+    cliente) são recusados na hora.
+    """
+
+    # Peso da última medição na média móvel do tempo de serviço
+    SERVICE_TIME_WEIGHT = 0.2
+
+    def __init__(self, name: str, capacity: int, max_queue: int, max_queued_per_client: int,
+                 initial_service_seconds: float = 1.0):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_queued_per_client = max_queued_per_client
+
+        self.active = 0
+        self.queued = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_service_seconds = initial_service_seconds
+
+    async def acquire(self, client: str) -> float:
+        """Espera uma vaga; retorna o instante de início (para `release`)"""
+        if self.active < self.capacity and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return time.monotonic()
+
+        waiting = self._waiting.get(client)
+        if self.queued >= self.max_queue or (waiting and len(waiting) >= self.max_queued_per_client):
+            self.rejected += 1
+            raise SchedulerSaturatedError(self.name, self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client, deque()).append(future)
+        self.queued += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # A vaga chegou junto com o cancelamento: devolve para o próximo
+                self.release(None)
+            else:
+                self._forget(client, future)
+            raise
+
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, started: Any):
+        """Libera a vaga, entregando-a ao próximo cliente da fila em rodízio"""
+        if started is not None:
+            elapsed = time.monotonic() - started
+            self.avg_service_seconds += self.SERVICE_TIME_WEIGHT * (elapsed - self.avg_service_seconds)
+
+        while self._waiting:
+            client, waiting = next(iter(self._waiting.items()))
+            future = waiting.popleft()
+            self.queued -= 1
+            if waiting:
+                self._waiting.move_to_end(client)
+            else:
+                del self._waiting[client]
+            if not future.done():
+                # A vaga passa direto para quem esperava; `active` não muda
+                future.set_result(None)
+                return
+
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Estimativa (segundos) de quando a fila terá espaço"""
+        seconds = self.avg_service_seconds * (self.queued + 1) / max(1, self.capacity)
+        return min(60, max(1, math.ceil(seconds)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_clients": len(self._waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": round(self.avg_service_seconds, 4),
+            "retry_after": self.retry_after(),
+        }
+
+    def _forget(self, client: str, future: asyncio.Future):
+        waiting = self._waiting.get(client)
+        if waiting is None or future not in waiting:
+            return
+        waiting.remove(future)
+        self.queued -= 1
+        if not waiting:
+            del self._waiting[client]
+
+
+class Scheduler:
+    """Controle de admissão na frente do agente, com uma lane por tipo de trabalho
+
+    - "turn": turnos baseados em regras (`get_next_question`), baratos e numerosos
+    - "generation": gerações com o LLM, caras e em número limitado
+    """
+
+    def __init__(self, lanes: Dict[str, Lane]):
+        self.lanes = lanes
+
+    async def acquire(self, lane: str, client: str) -> float:
+        with STAGE_SECONDS.time(f"{lane}_admission"):
+            return await self.lanes[lane].acquire(client)
+
+    def release(self, lane: str, started: float):
+        self.lanes[lane].release(started)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, client: str) -> AsyncIterator[None]:
+        """Executa o bloco ocupando uma vaga da lane
+
+        Lança `SchedulerSaturatedError` (429 na API) se a lane estiver saturada.
+        """
+        started = await self.acquire(lane, client)
+        try:
+            yield
+        finally:
+            self.release(lane, started)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Profundidade das filas e ocupação de cada lane"""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+def create_scheduler() -> Scheduler:
+    """Cria o scheduler com as capacidades configuradas nas variáveis de ambiente"""
+    per_client = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_CLIENT", "4"))
+    return Scheduler({
+        "turn": Lane(
+            "turn",
+            capacity=int(os.getenv("SCHEDULER_TURN_CAPACITY", "32")),
+            max_queue=int(os.getenv("SCHEDULER_TURN_QUEUE", "256")),
+            max_queued_per_client=per_client,
+            initial_service_seconds=0.01,
+        ),
+        "generation": Lane(
+            "generation",
+            capacity=int(os.getenv("SCHEDULER_GENERATION_CAPACITY", os.getenv("LLM_MAX_CONCURRENCY", "4"))),
+            max_queue=int(os.getenv("SCHEDULER_GENERATION_QUEUE", "16")),
+            max_queued_per_client=per_client,
+            initial_service_seconds=20.0,
+        ),
+    })
@@ -0,0 +1,220 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from extraction import extract_entities, tokenize
+from pattern_cache import normalize_pattern_inputs
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from knowledge_base import KnowledgeBase
+
+# Campos que precisam ser iguais: mudam as contas do pattern (cor e fio são revisados localmente)
+SHAPE_FIELDS = ("piece_type", "size", "yarn_weight", "measurements", "gauge")
+
+# Texto livre comparado por similaridade
+SIMILAR_FIELD = "style_details"
+
+# Palavras sem conteúdo para o pattern; "com" é o padrão ("com manga" = "manga")
+_STOPWORDS = frozenset(("a", "o", "as", "os", "e", "em", "de", "do", "da", "dos", "das",
+                        "no", "na", "um", "uma", "com", "tipo", "estilo"))
+# A palavra seguinte é negada: "sem manga" não pode parecer com "com manga"
+_NEGATIONS = frozenset(("sem", "nao"))
+
+
+def style_features(text: str) -> List[str]:
+    """Palavras do texto, sem acentos, plural e palavras vazias; as negadas ganham o prefixo "!"
+
+    "sem manga, decote V" e "decote em V sem mangas" viram as mesmas palavras.
+    """
+    words = []
+    negate = False
+    for word in tokenize(text):
+        if word in _NEGATIONS:
+            negate = True
+            continue
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        words.append("!" + word if negate else word)
+        negate = False
+    return words
+
+
+_knowledge_base: Optional["KnowledgeBase"] = None
+
+
+def detail_terms(text: str) -> Tuple[Tuple[str, ...], List[str]]:
+    """Separa os detalhes em termos reconhecidos e texto livre
+
+    Termos reconhecidos são os valores de manga e estilo do extrator ("manga
+    longa", "decote V") e as técnicas da base (knowledge_base.py); eles
+    precisam coincidir exatamente, porque "manga longa" e "manga curta" são
+    parecidas como texto e diferentes como pattern. Retorna (termos ordenados,
+    palavras livres, já normalizadas por style_features).
+    """
+    global _knowledge_base
+    if _knowledge_base is None:
+        from knowledge_base import KnowledgeBase
+
+        _knowledge_base = KnowledgeBase()
+
+    found = extract_entities(text, (SIMILAR_FIELD,)).get(SIMILAR_FIELD, "")
+    terms = {term.lower() for term in found.split(", ") if term}
+    covered: Set[str] = set()
+    for term in terms:
+        covered.update(style_features(term))
+    for technique in _knowledge_base.retrieve({SIMILAR_FIELD: text}).techniques:
+        terms.add(technique.title.lower())
+        for phrase in technique.phrases:
+            covered.update(style_features(phrase) if not phrase.startswith("!") else [phrase])
+    return tuple(sorted(terms)), [word for word in style_features(text) if word not in covered]
+
+
+def embed(words: List[str], dim: int) -> "np.ndarray":
+    """Vetor normalizado (norma 1) de n-gramas de caracteres com hashing, calculado localmente
+
+    Cada palavra contribui com ela inteira e com seus trigramas ("<de", "dec",
+    ..., "te>"), de modo que variações de grafia ("bufante"/"bufantes",
+    "decote v"/"decote em v") continuam próximas. O sinal vem do hash, o que
+    reduz o efeito das colisões.
+    """
+    import numpy as np
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in words:
+        # Palavras negadas ficam num espaço de hash separado
+        prefix = word[0] if word[0] == "!" else ""
+        padded = f"<{word[len(prefix):]}>"
+        grams = [word] + [prefix + padded[i:i + 3] for i in range(len(padded) - 2)]
+        for gram in grams:
+            code = zlib.crc32(gram.encode())
+            vector[code % dim] += 1.0 if code & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm:
+        vector /= norm
+    return vector
+
+
+class _Group:
+    """Vetores de uma mesma forma de pedido (peça, tamanho, espessura, medidas, amostra e termos)"""
+
+    def __init__(self, dim: int):
+        import numpy as np
+
+        self.matrix = np.zeros((8, dim), dtype=np.float32)
+        # Texto normalizado -> linha da matriz; um vetor por texto distinto
+        self.rows: "OrderedDict[str, int]" = OrderedDict()
+        # Linha -> id do pattern
+        self.ids: List[int] = []
+
+
+class SimilarityIndex:
+    """Índice de vetores dos pedidos já gerados, para reaproveitar pedidos quase iguais
+
+    A chave exata do cache não reconhece "sem manga, decote V" e "decote em V
+    sem mangas" como o mesmo pedido. Os termos reconhecidos nos detalhes
+    (mangas, decotes, técnicas) entram na forma do pedido e precisam ser
+    iguais; o resto do texto vira um vetor (n-gramas com hashing, sem serviço
+    externo) e a busca é a maior similaridade de cosseno, um produto
+    matriz-vetor no NumPy, entre os pedidos com a mesma forma. Acima de
+    `threshold` o pattern é reaproveitado.
+
+    Cada forma guarda um vetor por texto distinto, no máximo `max_rows` (os
+    mais antigos saem primeiro), então a busca continua abaixo de 1 ms mesmo
+    com a biblioteca crescendo.
+    """
+
+    def __init__(self, threshold: float = 0.85, dim: int = 256, max_rows: int = 4096):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_rows = max_rows
+        self._groups: Dict[Tuple[str, ...], _Group] = {}
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def add(self, pattern_id: int, data: Dict[str, Any]):
+        """Indexa o pedido de um pattern guardado na biblioteca"""
+        shape, words = self._shape(data)
+        text = " ".join(sorted(words))
+        vector = embed(words, self.dim)
+
+        with self._lock:
+            group = self._groups.get(shape)
+            if group is None:
+                group = self._groups[shape] = _Group(self.dim)
+            if text in group.rows:
+                # Mesmo texto: o pattern mais recente passa a valer
+                row = group.rows.pop(text)
+            elif len(group.rows) >= self.max_rows:
+                _, row = group.rows.popitem(last=False)
+            else:
+                row = len(group.ids)
+                group.ids.append(0)
+                if row == len(group.matrix):
+                    import numpy as np
+
+                    group.matrix = np.concatenate([group.matrix, np.zeros_like(group.matrix)])
+            group.matrix[row] = vector
+            group.ids[row] = pattern_id
+            group.rows[text] = row
+
+    def lookup(self, data: Dict[str, Any]) -> Optional[Tuple[int, float]]:
+        """(id do pattern, similaridade) do pedido mais parecido acima do limiar, ou None"""
+        shape, words = self._shape(data)
+        text = " ".join(sorted(words))
+
+        with self._lock:
+            self.lookups += 1
+            group = self._groups.get(shape)
+            if group is None or not group.rows:
+                return None
+            row = group.rows.get(text)
+            if row is not None:
+                self.hits += 1
+                return group.ids[row], 1.0
+
+            scores = group.matrix[:len(group.ids)] @ embed(words, self.dim)
+            row = int(scores.argmax())
+            score = float(scores[row])
+            if score < self.threshold:
+                return None
+            self.hits += 1
+            return group.ids[row], round(score, 4)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho do índice e pedidos reaproveitados por similaridade"""
+        return {
+            "entries": len(self),
+            "shapes": len(self._groups),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "threshold": self.threshold,
+        }
+
+    def __len__(self) -> int:
+        return sum(len(group.rows) for group in self._groups.values())
+
+    @staticmethod
+    def _shape(data: Dict[str, Any]) -> Tuple[Tuple[str, ...], List[str]]:
+        """(forma do pedido com os termos reconhecidos, palavras livres dos detalhes)"""
+        inputs = normalize_pattern_inputs(data)
+        terms, words = detail_terms(str(data.get(SIMILAR_FIELD) or ""))
+        return tuple(inputs[field] for field in SHAPE_FIELDS) + terms, words
+
+
+def create_similarity_index() -> Optional[SimilarityIndex]:
+    """Cria o índice de similaridade, se habilitado nas variáveis de ambiente"""
+    if os.getenv("PATTERN_SIMILARITY", "true").lower() not in ("1", "true", "yes"):
+        return None
+
+    return SimilarityIndex(
+        threshold=float(os.getenv("PATTERN_SIMILARITY_THRESHOLD", "0.85")),
+        max_rows=int(os.getenv("PATTERN_SIMILARITY_MAX_ROWS", "4096")),
+    )
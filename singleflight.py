@@ -0,0 +1,121 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class FlightAbandoned(Exception):
+    """Quem reivindicou a execução (`claim`) desistiu antes de entregar o resultado"""
+
+
+class _Call:
+    """Execução em andamento compartilhada entre os chamadores de uma mesma chave"""
+
+    def __init__(self, task: "asyncio.Future[Any]"):
+        self.task = task
+        self.waiters = 0
+        # Iniciada por `start`: segue até o fim mesmo sem ninguém esperando
+        self.detached = False
+
+
+class SingleFlight:
+    """Agrupa chamadas assíncronas concorrentes com a mesma chave em uma única execução
+
+    - Todos os chamadores recebem o mesmo resultado (ou a mesma exceção)
+    - Falhas não ficam memorizadas: a próxima chamada executa de novo
+    - Se um chamador é cancelado, os demais continuam esperando; a execução
+      só é cancelada quando não sobra ninguém esperando por ela (exceto as
+      iniciadas por `start`, que vão até o fim)
+    - Com `claim`, o próprio chamador faz o trabalho (ex.: em streaming) e
+      entrega o resultado aos demais; se ele desistir, quem esperava executa de novo
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa fn() para a chave, ou aguarda a execução que já está em andamento"""
+        while True:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._start(key, fn)
+            else:
+                self.coalesced += 1
+
+            call.waiters += 1
+            try:
+                return await asyncio.shield(call.task)
+            except FlightAbandoned:
+                # A execução reivindicada não terminou: tenta de novo
+                continue
+            finally:
+                call.waiters -= 1
+                if call.waiters == 0 and not call.task.done() and not call.detached:
+                    # Ninguém mais espera pelo resultado: libera a chave e cancela
+                    self._forget(key, call)
+                    call.task.cancel()
+
+    def start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> "asyncio.Task[Any]":
+        """Inicia fn() para a chave sem esperar pelo resultado (ou devolve a execução em andamento)
+
+        A execução fica registrada na hora, então um `do` logo em seguida já a
+        aproveita. Sem ninguém esperando, ela não é cancelada.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._start(key, fn)
+        call.detached = True
+        return call.task
+
+    def claim(self, key: str) -> "Optional[asyncio.Future[Any]]":
+        """Registra a chave como em andamento, com o trabalho feito por quem chamou
+
+        Quem chamou entrega o resultado (ou a exceção) no futuro devolvido, e
+        chama `abandon` se desistir antes. Retorna None se já houver execução.
+        """
+        if key in self._calls:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        call = _Call(future)
+        # Quem reivindicou decide o fim: a saída dos que esperam não cancela nada
+        call.detached = True
+        self._calls[key] = call
+        future.add_done_callback(lambda task: self._finish(key, call))
+        self.executions += 1
+        return future
+
+    @staticmethod
+    def abandon(future: "asyncio.Future[Any]"):
+        """Desiste de uma execução reivindicada; quem esperava por ela executa de novo"""
+        if not future.done():
+            future.set_exception(FlightAbandoned())
+
+    def inflight(self, key: str) -> Optional["asyncio.Future[Any]"]:
+        """Retorna a execução em andamento para a chave, se houver"""
+        call = self._calls.get(key)
+        return call.task if call is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de execuções e de chamadas agrupadas"""
+        return {
+            "inflight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> _Call:
+        call = _Call(asyncio.ensure_future(fn()))
+        self._calls[key] = call
+        call.task.add_done_callback(lambda task: self._finish(key, call))
+        self.executions += 1
+        return call
+
+    def _finish(self, key: str, call: _Call):
+        self._forget(key, call)
+        # Marca a exceção como consumida mesmo que ninguém esteja esperando
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,150 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from extraction import EntityExtractor, tokenize
+from models import ConversationState
+
+
+class SlotSpec(NamedTuple):
+    """Como um campo do pedido é perguntado e preenchido"""
+    name: str
+    step: str
+    # Aceita "tanto faz" como resposta
+    skippable: bool = True
+    # Guarda a resposta livre do usuário quando nada do léxico é reconhecido
+    free_text: bool = False
+    # Valor usado ao pular o campo ou ao esgotar as tentativas
+    default: Optional[str] = None
+
+
+# Campos na ordem em que são perguntados
+SLOTS = (
+    # A peça não aceita "tanto faz", mas sem peça reconhecida depois de todas as
+    # tentativas a conversa segue com a peça mais simples em vez de perguntar para sempre
+    SlotSpec("piece_type", "piece_type", skippable=False, default="cachecol"),
+    SlotSpec("size", "size", default="M"),
+    SlotSpec("color", "color", free_text=True, default="sem preferência"),
+    SlotSpec("yarn_type", "yarn_preferences", default="sem preferência"),
+    SlotSpec("yarn_weight", "yarn_preferences", default="médio"),
+    SlotSpec("style_details", "style_details", free_text=True, default="sem detalhes"),
+)
+SLOTS_BY_NAME = {spec.name: spec for spec in SLOTS}
+
+# Campos que cada passo da conversa pergunta ao usuário
+STEP_SLOTS: Dict[str, tuple] = {}
+for _spec in SLOTS:
+    STEP_SLOTS.setdefault(_spec.step, ())
+    STEP_SLOTS[_spec.step] += (_spec.name,)
+STEP_SLOTS["style_details"] += ("sleeve_type",)
+
+# Respostas que significam "qualquer opção serve"
+SKIP_PHRASES = (
+    "tanto faz", "qualquer", "qualquer um", "qualquer uma", "nao sei", "sei la", "sem preferencia",
+    "nao tenho preferencia", "pode escolher", "voce escolhe", "pular", "pula", "nenhum",
+    "nenhuma", "nada", "sem detalhes", "so isso",
+)
+
+# Confiança de cada forma de preenchimento
+CONFIDENCE_EXTRACTED = 1.0
+CONFIDENCE_FREE_TEXT = 0.5
+CONFIDENCE_SKIPPED = 0.0
+
+
+class SlotFiller:
+    """Preenche os campos do pedido turno a turno, com número de tentativas limitado
+
+    A cada mensagem:
+    - o que o extrator reconhece é gravado com confiança 1.0
+    - os campos da pergunta atual que continuam vazios podem ser pulados
+      ("tanto faz"), preenchidos com o texto livre da resposta, ou, depois de
+      `max_attempts` respostas sem nada aproveitável, recebem o valor padrão
+    Assim nenhuma pergunta se repete para sempre e a conversa sempre chega à
+    geração do pattern em um número limitado de turnos.
+    """
+
+    def __init__(self, extractor: EntityExtractor, max_attempts: int = 2):
+        self.extractor = extractor
+        self.max_attempts = max_attempts
+        self._skip_phrases = [f" {' '.join(tokenize(phrase))} " for phrase in SKIP_PHRASES]
+
+    def fill(self, state: ConversationState, message: str):
+        """Atualiza os campos da conversa com a resposta do usuário"""
+        state.turn_count += 1
+        expected = STEP_SLOTS.get(state.current_step, ())
+
+        found = self.extractor.extract(message, expected)
+        style_details = found.pop("style_details", None)
+        for slot, value in found.items():
+            self._set(state, slot, value, CONFIDENCE_EXTRACTED)
+        if style_details:
+            self._set(state, "style_details", self._merge_style(state, style_details), CONFIDENCE_EXTRACTED)
+
+        pending = [slot for slot in expected if slot in SLOTS_BY_NAME and not state.collected_data.get(slot)]
+        if not pending:
+            return
+
+        skipped = self._is_skip(message)
+        answer = " ".join(message.split())[:200]
+        for slot in pending:
+            spec = SLOTS_BY_NAME[slot]
+            if skipped and spec.skippable:
+                self._set(state, slot, spec.default, CONFIDENCE_SKIPPED)
+            elif spec.free_text and answer and not found:
+                self._set(state, slot, answer, CONFIDENCE_FREE_TEXT)
+            else:
+                state.slot_attempts[slot] = state.slot_attempts.get(slot, 0) + 1
+                if spec.default is not None and state.slot_attempts[slot] >= self.max_attempts:
+                    self._set(state, slot, spec.default, CONFIDENCE_SKIPPED)
+
+    def next_step(self, state: ConversationState) -> str:
+        """Primeiro passo com campos faltando, ou a geração do pattern"""
+        missing = self.missing_slots(state)
+        state.missing_information = missing
+        if missing:
+            return SLOTS_BY_NAME[missing[0]].step
+
+        if state.turns_to_pattern is None:
+            state.turns_to_pattern = state.turn_count
+        return "pattern_generation"
+
+    def missing_slots(self, state: ConversationState) -> List[str]:
+        """Campos ainda não preenchidos, na ordem em que serão perguntados"""
+        return [spec.name for spec in SLOTS if not state.collected_data.get(spec.name)]
+
+    def attempts(self, state: ConversationState, step: str) -> int:
+        """Quantas vezes o passo já foi perguntado sem resposta aproveitável"""
+        return max((state.slot_attempts.get(slot, 0) for slot in STEP_SLOTS.get(step, ())), default=0)
+
+    def report(self, state: ConversationState) -> Dict[str, Any]:
+        """Resumo do preenchimento: valores, confiança e turnos até o pattern"""
+        return {
+            "slots": {
+                spec.name: {
+                    "value": state.collected_data.get(spec.name),
+                    "confidence": state.slot_confidence.get(spec.name),
+                    "attempts": state.slot_attempts.get(spec.name, 0),
+                }
+                for spec in SLOTS
+            },
+            "missing": self.missing_slots(state),
+            "turn_count": state.turn_count,
+            "turns_to_pattern": state.turns_to_pattern,
+        }
+
+    def _set(self, state: ConversationState, slot: str, value: Any, confidence: float):
+        state.collected_data[slot] = value
+        if slot in SLOTS_BY_NAME:
+            state.slot_confidence[slot] = confidence
+
+    def _merge_style(self, state: ConversationState, style_details: str) -> str:
+        """Detalhes de estilo se acumulam ao longo da conversa"""
+        previous = state.collected_data.get("style_details")
+        if not previous or state.slot_confidence.get("style_details", 1.0) < CONFIDENCE_EXTRACTED:
+            return style_details
+
+        known = previous.split(", ")
+        new_details = [detail for detail in style_details.split(", ") if detail not in known]
+        return ", ".join(known + new_details)
+
+    def _is_skip(self, message: str) -> bool:
+        text = f" {' '.join(tokenize(message))} "
+        return any(phrase in text for phrase in self._skip_phrases)
@@ -0,0 +1,199 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from history import estimate_tokens
+from models import ConversationState, CrochetPattern
+from pattern_cache import PATTERN_INPUT_FIELDS, normalize_pattern_inputs
+from slots import SLOTS_BY_NAME
+
+if TYPE_CHECKING:
+    from crochet_agent import CrochetConversationalAgent
+
+
+class _Speculation:
+    """Geração antecipada de uma conversa, à espera da última resposta"""
+
+    def __init__(self, key: str, inputs: Dict[str, Any]):
+        self.key = key
+        self.inputs = inputs
+        # Se esta especulação iniciou a chamada ao LLM (e não reaproveitou cache ou outra geração)
+        self.owner = False
+        self.task: Optional["asyncio.Task[Optional[CrochetPattern]]"] = None
+
+
+class Speculator:
+    """Gera o pattern antes da última resposta da conversa
+
+    Quando só faltam os campos do passo atual e todos têm valor padrão (hoje,
+    os detalhes de estilo), a geração começa em segundo plano com esse padrão,
+    que é o que vale se a pessoa responder "tanto faz". Na resposta seguinte:
+    - mesmos dados: a geração de verdade aproveita a que está em andamento
+      (SingleFlight) ou o cache, e a espera diminui ou some
+    - só cor e/ou fio diferentes: o pattern especulado é revisado localmente
+    - qualquer outra diferença: a especulação é cancelada
+
+    A especulação tem prioridade baixa: só começa quando há vaga no limite de
+    chamadas ao LLM e até `max_inflight` de cada vez. Como os detalhes de
+    estilo são texto livre, a maioria das respostas reais é um erro que gasta
+    uma geração inteira; por isso ela vem desligada (create_speculator).
+    """
+
+    def __init__(self, agent: "CrochetConversationalAgent", max_inflight: int = 2, max_entries: int = 1000):
+        self.agent = agent
+        self.max_inflight = max_inflight
+        self.max_entries = max_entries
+        # conversation_id -> especulação pendente, da mais antiga para a mais nova
+        self._pending: "OrderedDict[str, _Speculation]" = OrderedDict()
+
+        self.started = 0
+        self.skipped = 0
+        self.hits = 0
+        self.patched = 0
+        self.misses = 0
+        self.abandoned = 0
+        self.wasted_tokens = 0
+
+    def observe(self, conversation_id: str, state: ConversationState):
+        """Chamado após cada turno: resolve a especulação pendente e, se for o caso, inicia outra"""
+        inputs = self.speculative_inputs(state)
+        key = self.agent.pattern_cache_key(inputs) if inputs is not None else None
+
+        speculation = self._pending.pop(conversation_id, None)
+        if speculation is not None:
+            if speculation.key == key:
+                # O último passo ainda não foi respondido: a especulação continua valendo
+                self._pending[conversation_id] = speculation
+                return
+            self._resolve(speculation, state)
+
+        if inputs is not None:
+            self._start(conversation_id, key, inputs)
+
+    def speculative_inputs(self, state: ConversationState) -> Optional[Dict[str, Any]]:
+        """Dados do pattern supondo o valor padrão para o que falta, ou None se ainda falta mais de um passo"""
+        if state.pattern is not None:
+            return None
+        missing = self.agent.slot_filler.missing_slots(state)
+        specs = [SLOTS_BY_NAME[slot] for slot in missing]
+        if not specs or any(spec.step != state.current_step or spec.default is None for spec in specs):
+            return None
+        return {**state.collected_data, **{spec.name: spec.default for spec in specs}}
+
+    def stats(self) -> Dict[str, Any]:
+        """Especulações iniciadas, aproveitadas, revisadas, canceladas e tokens desperdiçados"""
+        resolved = self.hits + self.patched + self.misses
+        return {
+            "pending": len(self._pending),
+            "inflight": self._inflight(),
+            "started": self.started,
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "patched": self.patched,
+            "misses": self.misses,
+            "abandoned": self.abandoned,
+            "hit_rate": round((self.hits + self.patched) / resolved, 4) if resolved else None,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+    def _inflight(self) -> int:
+        return sum(1 for speculation in self._pending.values()
+                   if speculation.task is not None and not speculation.task.done())
+
+    def _start(self, conversation_id: str, key: str, inputs: Dict[str, Any]):
+        # Prioridade baixa: não disputa vaga com gerações que alguém está esperando
+        if self.agent.llm_semaphore.locked() or self._inflight() >= self.max_inflight:
+            self.skipped += 1
+            return
+
+        speculation = _Speculation(key, inputs)
+        speculation.task = asyncio.ensure_future(self._speculate(speculation))
+        speculation.task.add_done_callback(_consume_exception)
+        self._pending[conversation_id] = speculation
+        self.started += 1
+
+        while len(self._pending) > self.max_entries:
+            # Conversas que não voltaram: a geração segue e fica no cache
+            self._pending.popitem(last=False)
+            self.abandoned += 1
+
+    async def _speculate(self, speculation: _Speculation) -> Optional[CrochetPattern]:
+        agent = self.agent
+        if not agent.llm_ready:
+            # Cria o cliente do LLM fora do event loop (importa LangChain e OpenAI)
+            await asyncio.get_running_loop().run_in_executor(None, lambda: agent.llm)
+
+        pattern = await agent.astored_pattern(speculation.key, speculation.inputs)
+        if pattern is not None:
+            return pattern
+        speculation.owner = agent.inflight_generations.inflight(speculation.key) is None
+        inputs = dict(speculation.inputs)
+        return await agent.inflight_generations.do(
+            speculation.key, lambda: agent._agenerate_and_cache(speculation.key, inputs)
+        )
+
+    def _resolve(self, speculation: _Speculation, state: ConversationState):
+        """Compara a especulação com os dados finais: aproveita, revisa ou cancela"""
+        from crochet_agent import LOCALLY_REVISABLE_FIELDS
+
+        data = dict(state.collected_data)
+        key = self.agent.pattern_cache_key(data)
+        if key == speculation.key:
+            self.hits += 1
+            return
+
+        old_inputs = normalize_pattern_inputs(speculation.inputs)
+        new_inputs = normalize_pattern_inputs(data)
+        changes = [field for field in PATTERN_INPUT_FIELDS if old_inputs[field] != new_inputs[field]]
+        if self.agent.slot_filler.missing_slots(state) or not set(changes) <= set(LOCALLY_REVISABLE_FIELDS):
+            self.misses += 1
+            self.wasted_tokens += self._spent_tokens(speculation)
+            speculation.task.cancel()
+            return
+
+        # Registrada no SingleFlight já agora: a geração de verdade, logo em seguida, espera por ela
+        self.patched += 1
+        self.agent.inflight_generations.start(
+            key, lambda: self._patch(speculation, old_inputs, data, changes, key)
+        )
+
+    async def _patch(self, speculation: _Speculation, old_inputs: Dict[str, str],
+                     data: Dict[str, Any], changes: List[str], key: str) -> CrochetPattern:
+        """Revisa localmente o pattern especulado para a cor/fio da resposta final"""
+        pattern = await speculation.task
+        if pattern is None:
+            raise RuntimeError("especulação sem pattern")
+        revised = self.agent._revise_pattern(pattern, old_inputs, data, changes)
+        await self.agent._astore_pattern(key, data, revised)
+        return revised
+
+    def _spent_tokens(self, speculation: _Speculation) -> int:
+        """Tokens (estimados) gastos por uma especulação descartada"""
+        if not speculation.owner:
+            return 0
+        task = speculation.task
+        # Cancelada no meio: conta o prompt, que o provedor já pode ter processado
+        tokens = sum(estimate_tokens(message.content)
+                     for message in self.agent._build_pattern_messages(speculation.inputs))
+        if task.done() and not task.cancelled() and task.exception() is None and task.result() is not None:
+            tokens += estimate_tokens("\n".join(task.result().instructions))
+        return tokens
+
+
+def _consume_exception(task: "asyncio.Future[Any]"):
+    # Falhas e cancelamentos de especulações não interessam a ninguém
+    if not task.cancelled():
+        task.exception()
+
+
+def create_speculator(agent: "CrochetConversationalAgent") -> Optional[Speculator]:
+    """Cria o gerador especulativo, se habilitado nas variáveis de ambiente"""
+    if os.getenv("SPECULATIVE_GENERATION", "false").lower() not in ("1", "true", "yes"):
+        return None
+
+    return Speculator(
+        agent,
+        max_inflight=int(os.getenv("SPECULATION_MAX_INFLIGHT", "2")),
+        max_entries=int(os.getenv("SPECULATION_MAX_PENDING", "1000")),
+    )
@@ -0,0 +1,473 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from models import PieceType, Size
+
+# Medidas do corpo/peça em cm, por tamanho
+# circumference: busto, cabeça, mão ou pé; width x length: peças retangulares
+MEASUREMENTS = {
+    "colete": {
+        "circumference": {"XS": 80, "S": 88, "M": 96, "L": 104, "XL": 112, "XXL": 120},
+        "length": {"XS": 54, "S": 56, "M": 58, "L": 60, "XL": 62, "XXL": 64},
+    },
+    "blusa": {
+        "circumference": {"XS": 80, "S": 88, "M": 96, "L": 104, "XL": 112, "XXL": 120},
+        "length": {"XS": 56, "S": 58, "M": 60, "L": 62, "XL": 64, "XXL": 66},
+    },
+    "chapeu": {
+        "circumference": {"XS": 50, "S": 53, "M": 56, "L": 58, "XL": 60, "XXL": 62},
+        "length": {"XS": 19, "S": 20, "M": 21, "L": 22, "XL": 23, "XXL": 23},
+    },
+    "cachecol": {
+        "width": {"XS": 15, "S": 18, "M": 20, "L": 22, "XL": 25, "XXL": 28},
+        "length": {"XS": 130, "S": 150, "M": 160, "L": 170, "XL": 180, "XXL": 190},
+    },
+    "luvas": {
+        "circumference": {"XS": 16, "S": 17.5, "M": 19, "L": 20.5, "XL": 22, "XXL": 23.5},
+        "length": {"XS": 16, "S": 17, "M": 18, "L": 19, "XL": 20, "XXL": 21},
+    },
+    "meias": {
+        "circumference": {"XS": 19, "S": 21, "M": 23, "L": 24, "XL": 25, "XXL": 26},
+        "length": {"XS": 21, "S": 23, "M": 24.5, "L": 26, "XL": 27.5, "XXL": 29},
+    },
+    "cobertor": {
+        "width": {"XS": 60, "S": 80, "M": 120, "L": 150, "XL": 180, "XXL": 220},
+        "length": {"XS": 80, "S": 100, "M": 150, "L": 200, "XL": 220, "XXL": 240},
+    },
+    "bolsa": {
+        "width": {"XS": 18, "S": 22, "M": 28, "L": 32, "XL": 36, "XXL": 40},
+        "length": {"XS": 15, "S": 18, "M": 24, "L": 28, "XL": 32, "XXL": 35},
+    },
+}
+
+# Mangas da blusa: punho, parte de cima do braço e comprimento, em cm
+SLEEVES = {
+    "cuff": {"XS": 20, "S": 21, "M": 22, "L": 23, "XL": 25, "XXL": 26},
+    "upper_arm": {"XS": 26, "S": 28, "M": 30, "L": 33, "XL": 36, "XXL": 39},
+    "length": {"XS": 43, "S": 44, "M": 45, "L": 46, "XL": 47, "XXL": 48},
+}
+
+# Folga em relação à medida do corpo (negativa em peças justas)
+EASE = {"colete": 4, "blusa": 8, "chapeu": -0.1, "luvas": -0.05, "meias": -0.1}
+
+
+class YarnWeightSpec(NamedTuple):
+    """Agulha, amostra em ponto baixo e rendimento típicos de cada espessura"""
+    hook_mm: float
+    stitches_per_10cm: float
+    rows_per_10cm: float
+    cm_per_stitch: float  # fio consumido por ponto baixo
+    meters_per_100g: int
+
+
+YARN_WEIGHTS = {
+    "extra fino": YarnWeightSpec(2.5, 26, 30, 2.5, 400),
+    "fino": YarnWeightSpec(3.5, 20, 24, 3.5, 280),
+    "médio": YarnWeightSpec(5.0, 15, 17, 5.0, 180),
+    "grosso": YarnWeightSpec(6.5, 11, 13, 7.0, 110),
+    "extra grosso": YarnWeightSpec(9.0, 8, 9, 10.0, 60),
+}
+DEFAULT_YARN_WEIGHT = "médio"
+DEFAULT_SIZE = "M"
+
+# Tamanhos de um pattern graduado, na ordem da notação "XS (S, M, L, XL, XXL)"
+GRADED_SIZES = (Size.XS.value, Size.S.value, Size.M.value, Size.L.value, Size.XL.value, Size.XXL.value)
+
+# Pontos baixos por hora de um crocheteiro de nível intermediário
+STITCHES_PER_HOUR = 900
+
+# Margem de fio para emendas, acabamento e amostra
+YARN_MARGIN = 1.1
+
+DIFFICULTY = {"blusa": "Intermediário", "meias": "Intermediário", "luvas": "Intermediário"}
+
+
+class Section(NamedTuple):
+    """Uma parte da peça, com a contagem de pontos já calculada"""
+    name: str
+    foundation_chains: int  # 0 quando começa em anel mágico ou é trabalhada em volta
+    start_stitches: int
+    end_stitches: int
+    rows: int
+    shaping: str = ""
+    count: int = 1  # quantas vezes a parte é feita (ex.: 2 mangas)
+
+    @property
+    def stitches(self) -> int:
+        """Total de pontos da parte, contando as repetições"""
+        return round((self.start_stitches + self.end_stitches) / 2 * self.rows * self.count)
+
+    def describe(self) -> str:
+        return _describe_section(
+            self.name, self.count, self.foundation_chains > 0, str(self.foundation_chains),
+            self.start_stitches == self.end_stitches, str(self.start_stitches), str(self.end_stitches),
+            str(self.rows), self.shaping,
+        )
+
+
+class GradedSection(NamedTuple):
+    """Uma parte da peça com uma contagem por tamanho (arrays NumPy alinhados aos tamanhos)"""
+    name: str
+    foundation_chains: np.ndarray
+    start_stitches: np.ndarray
+    end_stitches: np.ndarray
+    rows: np.ndarray
+    shaping: str = ""  # modelo com campos preenchidos por `shaping_values`
+    shaping_values: Dict[str, np.ndarray] = {}
+    count: int = 1
+
+    @property
+    def stitches(self) -> np.ndarray:
+        return np.rint((self.start_stitches + self.end_stitches) / 2 * self.rows * self.count).astype(int)
+
+    def at(self, i: int) -> Section:
+        """A parte num único tamanho"""
+        return Section(
+            self.name, int(self.foundation_chains[i]), int(self.start_stitches[i]), int(self.end_stitches[i]),
+            int(self.rows[i]), self.shaping.format(**{k: int(v[i]) for k, v in self.shaping_values.items()}),
+            self.count,
+        )
+
+    def describe(self) -> str:
+        return _describe_section(
+            self.name, self.count, bool(self.foundation_chains.any()), grade(self.foundation_chains),
+            np.array_equal(self.start_stitches, self.end_stitches), grade(self.start_stitches),
+            grade(self.end_stitches), grade(self.rows),
+            self.shaping.format(**{k: grade(v) for k, v in self.shaping_values.items()}),
+        )
+
+
+def grade(values: Sequence[Any]) -> str:
+    """Notação de pattern graduado: "75 (80, 86)"; um valor só quando todos são iguais"""
+    texts = [f"{value:g}" if isinstance(value, (float, np.floating)) else str(value) for value in values]
+    if len(set(texts)) == 1:
+        return texts[0]
+    return f"{texts[0]} ({', '.join(texts[1:])})"
+
+
+def _describe_section(name: str, count: int, has_chains: bool, chains: str, same: bool,
+                      start: str, end: str, rows: str, shaping: str) -> str:
+    parts = [name + (f" (faça {count})" if count > 1 else "") + ":"]
+    if has_chains:
+        parts.append(f"corrente inicial de {chains} correntes;")
+    if same:
+        parts.append(f"{start} pontos em {rows} carreiras")
+    else:
+        parts.append(f"de {start} a {end} pontos em {rows} carreiras")
+    if shaping:
+        parts.append(f"({shaping})")
+    return " ".join(parts)
+
+
+def _hours(total_stitches):
+    return np.maximum(1, np.rint(np.asarray(total_stitches) / STITCHES_PER_HOUR)).astype(int)
+
+
+@dataclass
+class _PlanBase:
+    piece_type: str
+    yarn_weight: str
+    stitches_per_10cm: float
+    rows_per_10cm: float
+    hook_mm: float
+
+    @property
+    def hook_size(self) -> str:
+        return f"{self.hook_mm:.1f}mm"
+
+    @property
+    def gauge(self) -> str:
+        return f"{self.stitches_per_10cm:g} pontos x {self.rows_per_10cm:g} carreiras = 10cm (ponto baixo)"
+
+    @property
+    def difficulty_level(self) -> str:
+        return DIFFICULTY.get(self.piece_type, "Iniciante")
+
+    def summary(self) -> List[str]:
+        """Linhas com os números calculados, para o prompt e para o pattern"""
+        lines = [f"Agulha: {self.hook_size}", f"Amostra: {self.gauge}"]
+        lines.append("Medidas: " + ", ".join(
+            f"{MEASUREMENT_LABELS[name]} {grade(np.atleast_1d(value))} cm" for name, value in self.measurements.items()
+        ))
+        lines.extend(section.describe() for section in self.sections)
+        lines.append(f"Fio: cerca de {self.yarn_amount}")
+        return lines
+
+
+@dataclass
+class StitchPlan(_PlanBase):
+    """Números do pattern calculados localmente, sem LLM"""
+    size: str = DEFAULT_SIZE
+    measurements: Dict[str, float] = field(default_factory=dict)
+    sections: List[Section] = field(default_factory=list)
+    yarn_meters: int = 0
+    skeins: int = 0
+
+    @property
+    def total_stitches(self) -> int:
+        return sum(section.stitches for section in self.sections)
+
+    @property
+    def estimated_time(self) -> str:
+        hours = int(_hours(self.total_stitches))
+        return f"Cerca de {hours} hora{'s' if hours > 1 else ''}"
+
+    @property
+    def yarn_amount(self) -> str:
+        return f"{self.yarn_meters} m ({self.skeins} novelo{'s' if self.skeins > 1 else ''} de 100g)"
+
+
+@dataclass
+class GradedPlan(_PlanBase):
+    """Números de todos os tamanhos de uma vez, para um pattern graduado"""
+    sizes: tuple = GRADED_SIZES
+    measurements: Dict[str, np.ndarray] = field(default_factory=dict)
+    sections: List[GradedSection] = field(default_factory=list)
+    yarn_meters: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=int))
+    skeins: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=int))
+
+    @property
+    def size_label(self) -> str:
+        """ "XS (S, M, L, XL, XXL)" """
+        return grade(self.sizes) if len(self.sizes) > 1 else self.sizes[0]
+
+    @property
+    def total_stitches(self) -> np.ndarray:
+        return sum(section.stitches for section in self.sections)
+
+    @property
+    def estimated_time(self) -> str:
+        return f"Cerca de {grade(_hours(self.total_stitches))} horas"
+
+    @property
+    def yarn_amount(self) -> str:
+        plural = "s" if self.skeins.max() > 1 else ""
+        return f"{grade(self.yarn_meters)} m ({grade(self.skeins)} novelo{plural} de 100g)"
+
+    def plan(self, i: int) -> StitchPlan:
+        """O plano de um único tamanho"""
+        return StitchPlan(
+            piece_type=self.piece_type,
+            yarn_weight=self.yarn_weight,
+            stitches_per_10cm=self.stitches_per_10cm,
+            rows_per_10cm=self.rows_per_10cm,
+            hook_mm=self.hook_mm,
+            size=self.sizes[i],
+            measurements={name: float(values[i]) for name, values in self.measurements.items()},
+            sections=[section.at(i) for section in self.sections],
+            yarn_meters=int(self.yarn_meters[i]),
+            skeins=int(self.skeins[i]),
+        )
+
+    def by_size(self) -> Dict[str, Dict[str, Any]]:
+        """Metragem, novelos, pontos e tempo de cada tamanho"""
+        hours = _hours(self.total_stitches)
+        return {
+            size: {
+                "yarn_meters": int(self.yarn_meters[i]),
+                "skeins": int(self.skeins[i]),
+                "total_stitches": int(self.total_stitches[i]),
+                "estimated_hours": int(hours[i]),
+            }
+            for i, size in enumerate(self.sizes)
+        }
+
+
+MEASUREMENT_LABELS = {"circumference": "circunferência", "width": "largura", "length": "comprimento"}
+
+
+def grade_stitches(piece_type: Union[PieceType, str], yarn_weight: Optional[str] = None,
+                   gauge: Optional[Dict[str, float]] = None,
+                   style_details: str = "",
+                   sizes: Sequence[str] = GRADED_SIZES,
+                   measurements: Optional[Dict[str, float]] = None) -> GradedPlan:
+    """Calcula os números de vários tamanhos numa única passada vetorizada
+
+    Cada medida da tabela vira um array (um valor por tamanho) e todas as
+    contas (pontos, carreiras, aumentos, metragem) são feitas sobre os arrays.
+    `gauge` ({"stitches": 18, "rows": 20} por 10cm) substitui a amostra típica
+    da espessura do fio; `measurements` substitui medidas da tabela.
+    """
+    piece = piece_type.value if isinstance(piece_type, PieceType) else str(piece_type or "")
+    if piece not in MEASUREMENTS:
+        piece = PieceType.SCARF.value
+    sizes = tuple(sizes)
+
+    weight = yarn_weight if yarn_weight in YARN_WEIGHTS else DEFAULT_YARN_WEIGHT
+    spec = YARN_WEIGHTS[weight]
+    stitches_per_10cm = (gauge or {}).get("stitches") or spec.stitches_per_10cm
+    rows_per_10cm = (gauge or {}).get("rows") or spec.rows_per_10cm
+
+    body = {name: _table(values, sizes) for name, values in MEASUREMENTS[piece].items()}
+    for name, value in (measurements or {}).items():
+        if name in body:
+            body[name] = np.full(len(sizes), float(value))
+
+    sts = _Converter(stitches_per_10cm / 10, rows_per_10cm / 10, len(sizes))
+    sections = _SECTION_BUILDERS[piece](body, sts, sizes, (style_details or "").lower())
+
+    plan = GradedPlan(
+        piece_type=piece,
+        yarn_weight=weight,
+        stitches_per_10cm=stitches_per_10cm,
+        rows_per_10cm=rows_per_10cm,
+        hook_mm=spec.hook_mm,
+        sizes=sizes,
+        measurements=body,
+        sections=sections,
+    )
+    plan.yarn_meters = np.ceil(plan.total_stitches * spec.cm_per_stitch / 100 * YARN_MARGIN).astype(int)
+    plan.skeins = np.maximum(1, np.ceil(plan.yarn_meters / spec.meters_per_100g)).astype(int)
+    return plan
+
+
+def plan_stitches(piece_type: Union[PieceType, str], size: Union[Size, str, None],
+                  yarn_weight: Optional[str] = None,
+                  gauge: Optional[Dict[str, float]] = None,
+                  measurements: Optional[Dict[str, float]] = None,
+                  style_details: str = "") -> StitchPlan:
+    """Calcula correntes, carreiras, aumentos/diminuições e metragem da peça
+
+    `size` é um dos tamanhos de `Size`; com `Size.CUSTOM` (ou qualquer valor
+    desconhecido) valem as medidas informadas, completadas pelas do tamanho M.
+    """
+    size = size.value if isinstance(size, Size) else str(size or "")
+    table_size = size.upper() if size.upper() in GRADED_SIZES else DEFAULT_SIZE
+
+    plan = grade_stitches(piece_type, yarn_weight, gauge, style_details,
+                          sizes=(table_size,), measurements=measurements).plan(0)
+    plan.size = size or table_size
+    return plan
+
+
+def plan_for(data: Dict[str, Any]) -> StitchPlan:
+    """Atalho para os dados coletados na conversa"""
+    return plan_stitches(
+        data.get("piece_type"), data.get("size"), data.get("yarn_weight"),
+        gauge=data.get("gauge"), measurements=data.get("measurements"),
+        style_details=data.get("style_details") or "",
+    )
+
+
+def grade_for(data: Dict[str, Any]) -> GradedPlan:
+    """Atalho graduado (XS a XXL) para os dados de um pedido"""
+    return grade_stitches(
+        data.get("piece_type"), data.get("yarn_weight"),
+        gauge=data.get("gauge"), style_details=data.get("style_details") or "",
+    )
+
+
+class _Converter(NamedTuple):
+    """Converte cm em pontos e carreiras, elemento a elemento"""
+    stitches_per_cm: float
+    rows_per_cm: float
+    n: int  # número de tamanhos
+
+    def stitches(self, cm) -> np.ndarray:
+        return np.broadcast_to(np.maximum(1, np.rint(np.asarray(cm) * self.stitches_per_cm)), (self.n,)).astype(int)
+
+    def rows(self, cm) -> np.ndarray:
+        return np.broadcast_to(np.maximum(1, np.rint(np.asarray(cm) * self.rows_per_cm)), (self.n,)).astype(int)
+
+
+def _table(table: Dict[str, float], sizes: Sequence[str]) -> np.ndarray:
+    return np.array([table[size] for size in sizes], dtype=float)
+
+
+def _zeros(n: int) -> np.ndarray:
+    return np.zeros(n, dtype=int)
+
+
+def _garment(body, sts: _Converter, sizes, style: str, piece: str) -> List[GradedSection]:
+    """Frente e costas retas, com diminuição das cavas; mangas na blusa"""
+    panel = sts.stitches((body["circumference"] + EASE[piece]) / 2)
+    rows = sts.rows(body["length"])
+    armhole_row = np.rint(rows * 0.6).astype(int)
+    armhole = sts.stitches(3)
+    shaping = "na carreira {row}, arremate {stitches} pontos de cada lado para a cava"
+    values = {"row": armhole_row, "stitches": armhole}
+
+    sections = [
+        GradedSection("Costas", panel + 1, panel, panel - 2 * armhole, rows, shaping, values),
+        GradedSection("Frente", panel + 1, panel, panel - 2 * armhole, rows, shaping, values),
+    ]
+    if piece == "blusa" and "sem manga" not in style:
+        cuff = sts.stitches(_table(SLEEVES["cuff"], sizes))
+        upper_arm = sts.stitches(_table(SLEEVES["upper_arm"], sizes))
+        sleeve_rows = sts.rows(_table(SLEEVES["length"], sizes))
+        increases = np.maximum(0, (upper_arm - cuff) // 2)
+        every = np.where(increases > 0, np.maximum(1, sleeve_rows // (increases + 1)), 0)
+        sleeve_shaping = "aumente 1 ponto de cada lado a cada {every} carreiras, {times} vezes" if increases.any() else ""
+        sections.append(GradedSection(
+            "Mangas", cuff + 1, cuff, cuff + 2 * increases, sleeve_rows, sleeve_shaping,
+            {"every": every, "times": increases}, count=2,
+        ))
+    return sections
+
+
+def _hat(body, sts: _Converter, sizes, style: str) -> List[GradedSection]:
+    """Topo em espiral a partir de um anel mágico de 6 pontos, depois o corpo reto"""
+    target = sts.stitches(body["circumference"] * (1 + EASE["chapeu"]))
+    increase_rounds = np.maximum(1, np.ceil(target / 6)).astype(int)
+    crown = 6 * increase_rounds
+    body_rounds = np.maximum(1, sts.rows(body["length"]) - increase_rounds)
+    return [
+        GradedSection("Topo", _zeros(sts.n), np.full(sts.n, 6), crown, increase_rounds,
+                      "anel mágico com 6 pontos; aumente 6 pontos por volta"),
+        GradedSection("Corpo", _zeros(sts.n), crown, crown, body_rounds, "voltas sem aumentos"),
+    ]
+
+
+def _rectangle(body, sts: _Converter, sizes, style: str, name: str = "Corpo", count: int = 1) -> List[GradedSection]:
+    width = sts.stitches(body["width"])
+    return [GradedSection(name, width + 1, width, width, sts.rows(body["length"]), count=count)]
+
+
+def _bag(body, sts: _Converter, sizes, style: str) -> List[GradedSection]:
+    """Dois painéis retangulares e uma alça"""
+    strap_chains = sts.stitches(100)
+    return _rectangle(body, sts, sizes, style, name="Painéis (frente e costas)", count=2) + [
+        GradedSection("Alça", strap_chains + 1, strap_chains, strap_chains, sts.rows(3)),
+    ]
+
+
+def _gloves(body, sts: _Converter, sizes, style: str) -> List[GradedSection]:
+    """Tubo em volta com abertura para o polegar"""
+    around = sts.stitches(body["circumference"] * (1 + EASE["luvas"]))
+    rounds = sts.rows(body["length"])
+    thumb_round, thumb = np.rint(rounds * 0.4).astype(int), sts.stitches(5)
+    return [GradedSection("Mão", around, around, around, rounds,
+                          "feche em volta; na volta {round}, pule {stitches} pontos para o polegar",
+                          {"round": thumb_round, "stitches": thumb}, count=2)]
+
+
+def _socks(body, sts: _Converter, sizes, style: str) -> List[GradedSection]:
+    """Da ponta para o cano: ponta com aumentos, pé, calcanhar e cano"""
+    around = sts.stitches(body["circumference"] * (1 + EASE["meias"]))
+    increase_rounds = np.maximum(1, np.ceil((around - 8) / 4)).astype(int)
+    around = 8 + 4 * increase_rounds
+    heel_rows = np.maximum(1, np.rint(around / 4)).astype(int)
+    foot_rounds = np.maximum(1, sts.rows(body["length"]) - increase_rounds - heel_rows)
+    none = _zeros(sts.n)
+    return [
+        GradedSection("Ponta", none, np.full(sts.n, 8), around, increase_rounds,
+                      "comece com 8 pontos; aumente 4 pontos por volta", count=2),
+        GradedSection("Pé", none, around, around, foot_rounds, count=2),
+        GradedSection("Calcanhar", none, around // 2, around // 2, heel_rows,
+                      "carreiras de ida e volta sobre metade dos pontos", count=2),
+        GradedSection("Cano", none, around, around, sts.rows(15), count=2),
+    ]
+
+
+_SECTION_BUILDERS = {
+    "colete": lambda body, sts, sizes, style: _garment(body, sts, sizes, style, "colete"),
+    "blusa": lambda body, sts, sizes, style: _garment(body, sts, sizes, style, "blusa"),
+    "chapeu": _hat,
+    "cachecol": _rectangle,
+    "cobertor": _rectangle,
+    "bolsa": _bag,
+    "luvas": _gloves,
+    "meias": _socks,
+}
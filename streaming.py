@@ -0,0 +1,29 @@
+import json
+from typing import Any, List
+
+
+class InstructionLineBuffer:
+    """Acumula tokens do LLM e devolve cada linha de instrução assim que ela termina"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adiciona um pedaço de texto e retorna as linhas completas (não vazias)"""
+        self._pending += text
+        if "\n" not in self._pending:
+            return []
+
+        *complete, self._pending = self._pending.split("\n")
+        return [line for line in complete if line.strip()]
+
+    def flush(self) -> List[str]:
+        """Retorna o que sobrou no buffer ao final da geração"""
+        line, self._pending = self._pending, ""
+        return [line] if line.strip() else []
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Formata um evento no padrão Server-Sent Events com payload JSON"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,72 @@
+"""
+Testes da representação compacta do estado da conversa
+"""
+
+import sqlite3
+
+from compact_state import CompactState, restore, snapshot
+from conversation_store import SQLiteConversationStore
+from models import ConversationState, CrochetPattern
+
+
+def sample_state() -> ConversationState:
+    pattern = CrochetPattern(
+        piece_type="colete", size="M", color="azul", yarn_weight="médio", hook_size="4mm",
+        gauge="18 pontos", materials=["Fio de algodão"], instructions=["Carreira 1: 60 correntinhas"],
+        special_notes=[], difficulty_level="iniciante", estimated_time="10 horas"
+    )
+    return ConversationState(
+        current_step="pattern_generation",
+        collected_data={"piece_type": "colete", "size": "M", "color": "Azul marinho"},
+        missing_information=["style_details"],
+        conversation_history=[{"role": "user", "content": "Quero um colete"},
+                              {"role": "assistant", "content": "Qual o tamanho?"}],
+        slot_confidence={"piece_type": 1.0, "color": 0.5},
+        slot_attempts={"size": 1},
+        turn_count=2,
+        pattern=pattern,
+        pattern_version=1,
+        pattern_inputs={"piece_type": "colete"},
+    )
+
+
+def test_round_trip_keeps_every_field():
+    """Memória e snapshot binário devolvem o mesmo estado, campo a campo"""
+    state = sample_state()
+    # Campo novo no ConversationState precisa de lugar no CompactState
+    stored_fields = set(CompactState.__slots__) - {"history"} | {"conversation_history"}
+    assert stored_fields == set(ConversationState.model_fields)
+
+    assert CompactState.from_state(state).to_state() == state
+    assert restore(snapshot(state)) == state
+    assert restore(snapshot(ConversationState())) == ConversationState()
+
+    # Históricos longos vão comprimidos
+    state.conversation_history *= 50
+    assert restore(snapshot(state)) == state
+
+
+def test_restored_state_is_independent():
+    """Alterar o estado lido não altera o que está guardado"""
+    compact = CompactState.from_state(sample_state())
+    state = compact.to_state()
+    state.collected_data["size"] = "G"
+    state.conversation_history.append({"role": "user", "content": "G"})
+    state.pattern.instructions.append("Carreira 2")
+
+    assert compact.to_state() == sample_state()
+
+
+def test_sqlite_reads_legacy_json_rows(tmp_path):
+    """Conversas gravadas em JSON antes do snapshot binário continuam legíveis"""
+    path = str(tmp_path / "conversations.db")
+    store = SQLiteConversationStore(path=path)
+    record = store.create(ConversationState())
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE conversations SET state = ? WHERE conversation_id = ?",
+                   (sample_state().model_dump_json(), record.conversation_id))
+
+    loaded = store.get(record.conversation_id)
+    assert loaded.state == sample_state()
+    store.save(loaded)
+    assert store.get(record.conversation_id).state == sample_state()
@@ -0,0 +1,109 @@
+"""
+Testes dos armazenamentos de conversa (memória e SQLite)
+"""
+
+import time
+
+import pytest
+
+from conversation_store import (
+    ConversationConflictError, InMemoryConversationStore, SQLiteConversationStore
+)
+from models import ConversationState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryConversationStore()
+    return SQLiteConversationStore(path=str(tmp_path / "conversations.db"))
+
+
+def test_create_get_and_save(store):
+    """O estado salvo é o estado lido de volta"""
+    record = store.create(ConversationState())
+    record.state.collected_data["piece_type"] = "colete"
+    record.state.conversation_history.append({"role": "user", "content": "Quero um colete"})
+    store.save(record)
+
+    loaded = store.get(record.conversation_id)
+    assert loaded.state.collected_data == {"piece_type": "colete"}
+    assert loaded.state.conversation_history[0]["content"] == "Quero um colete"
+    assert loaded.created_at == record.created_at
+    assert len(store) == 1
+
+
+def test_unknown_and_deleted_conversations(store):
+    """Conversas inexistentes ou removidas retornam None"""
+    record = store.create(ConversationState())
+
+    assert store.get("nao-existe") is None
+    assert store.delete(record.conversation_id)
+    assert store.get(record.conversation_id) is None
+    assert not store.delete(record.conversation_id)
+
+
+def test_idle_ttl(tmp_path):
+    """Conversas ociosas além do TTL são descartadas nos dois backends"""
+    for store in (InMemoryConversationStore(ttl_seconds=0.01),
+                  SQLiteConversationStore(path=str(tmp_path / "ttl.db"), ttl_seconds=0.01)):
+        stale = store.create(ConversationState())
+        time.sleep(0.02)
+        fresh = store.create(ConversationState())
+
+        assert store.evict_expired() in (0, 1)
+        assert store.get(stale.conversation_id) is None
+        assert store.get(fresh.conversation_id) is not None
+
+
+def test_memory_store_evicts_least_recently_used():
+    """Acima do limite, a conversa usada há mais tempo sai primeiro"""
+    store = InMemoryConversationStore(max_entries=2)
+    first = store.create(ConversationState())
+    second = store.create(ConversationState())
+    store.get(first.conversation_id)
+
+    store.create(ConversationState())
+
+    assert len(store) == 2
+    assert store.get(first.conversation_id) is not None
+    assert store.get(second.conversation_id) is None
+
+
+def test_sqlite_store_uses_wal_and_is_shared(tmp_path):
+    """Duas instâncias sobre o mesmo arquivo enxergam as mesmas conversas"""
+    path = str(tmp_path / "shared.db")
+    writer = SQLiteConversationStore(path=path)
+    reader = SQLiteConversationStore(path=path)
+
+    record = writer.create(ConversationState(current_step="size"))
+
+    assert reader.get(record.conversation_id).state.current_step == "size"
+    assert reader._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_concurrent_turns_do_not_clobber_each_other(store):
+    """Quem salva com uma versão desatualizada recebe conflito"""
+    record = store.create(ConversationState())
+    first = store.get(record.conversation_id)
+    second = store.get(record.conversation_id)
+
+    first.state.collected_data["color"] = "azul"
+    store.save(first)
+
+    second.state.collected_data["color"] = "rosa"
+    with pytest.raises(ConversationConflictError):
+        store.save(second)
+
+    latest = store.get(record.conversation_id)
+    assert latest.state.collected_data == {"color": "azul"}
+    assert latest.version == first.version == 2
+
+
+def test_save_after_delete_is_a_conflict(store):
+    """Salvar uma conversa que já foi removida também é conflito"""
+    record = store.create(ConversationState())
+    store.delete(record.conversation_id)
+
+    with pytest.raises(ConversationConflictError):
+        store.save(record)
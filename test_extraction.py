@@ -0,0 +1,68 @@
+"""
+Testes do extrator de entidades
+"""
+
+from extraction import EntityExtractor, tokenize
+
+extractor = EntityExtractor()
+
+
+def test_tokenize_folds_accents_and_punctuation():
+    """Palavras saem minúsculas, sem acento e sem pontuação"""
+    assert tokenize("Algodão MÉDIO, decote em V!") == ["algodao", "medio", "decote", "em", "v"]
+
+
+def test_single_letters_need_word_boundaries_and_context():
+    """Letras soltas não viram tamanho dentro de outras palavras nem sem contexto"""
+    assert "size" not in extractor.extract("Quero um colete sem mangas")
+    assert "size" not in extractor.extract("m")
+    assert extractor.extract("m", expected_slots=["size"]) == {"size": "M"}
+    assert extractor.extract("tamanho s, por favor") == {"size": "S"}
+
+
+def test_full_request_in_one_message():
+    """Uma mensagem completa preenche todos os campos de uma vez"""
+    found = extractor.extract("Quero um gorro GG de lã grossa vermelha, com pompom")
+
+    assert found == {
+        "piece_type": "chapeu",
+        "size": "XL",
+        "yarn_type": "lã",
+        "yarn_weight": "grosso",
+        "color": "vermelho",
+        "style_details": "pompom",
+    }
+
+
+def test_longest_phrase_wins():
+    """Frases compostas têm prioridade sobre palavras isoladas"""
+    assert extractor.extract("azul marinho") == {"color": "azul marinho"}
+    assert extractor.extract("lã merino")["yarn_type"] == "lã merino"
+
+
+def test_medio_is_resolved_by_context():
+    """"médio" é peso do fio depois de um tipo de fio e tamanho depois de "tamanho\""""
+    assert extractor.extract("Algodão médio") == {"yarn_type": "algodão", "yarn_weight": "médio"}
+    assert extractor.extract("tamanho médio") == {"size": "M"}
+    assert extractor.extract("médio", expected_slots=["yarn_type", "yarn_weight"]) == {"yarn_weight": "médio"}
+
+
+def test_la_without_accent_is_not_wool():
+    """"lá" (advérbio) não é confundido com "lã\""""
+    assert extractor.extract("vou lá comprar o fio") == {}
+    assert extractor.extract("la", expected_slots=["yarn_type"]) == {"yarn_type": "lã"}
+
+
+def test_style_details_are_collected_in_order():
+    """Manga, decote e comprimento viram style_details"""
+    found = extractor.extract("Sem manga, decote em V, comprimento até a cintura")
+
+    assert found["sleeve_type"] == "sem manga"
+    assert found["style_details"] == "sem manga, decote V, comprimento até a cintura"
+
+
+def test_size_context_skips_prepositions():
+    """O contexto pula preposições: "muda o tamanho para G" acha o tamanho sem pergunta pendente"""
+    assert extractor.extract("muda o tamanho para G") == {"size": "L"}
+    assert extractor.extract("quero no manequim o M") == {"size": "M"}
+    assert "size" not in extractor.extract("vou para a praia de tamanco e m")
@@ -0,0 +1,57 @@
+"""
+Testes do LLM falso usado nos testes de carga
+"""
+
+import asyncio
+
+from langchain.schema import HumanMessage
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+
+
+def test_same_seed_gives_same_calls():
+    """Com a mesma semente, a sequência de chamadas repete texto e latência"""
+    messages = [HumanMessage(content="Crie um pattern de colete")]
+
+    def run(seed):
+        model = FakeChatModel(latency_median=0.001, tokens_per_second=100000, seed=seed)
+        return [model._next_call(messages) for _ in range(3)]
+
+    assert run(1) == run(1)
+    assert run(1) != run(2)
+
+
+def test_stream_matches_invoke_text():
+    """O streaming entrega o mesmo texto que a chamada completa"""
+    messages = [HumanMessage(content="Crie um pattern de gorro")]
+
+    async def scenario():
+        text = (await FakeChatModel(latency_median=0, tokens_per_second=2000).ainvoke(messages)).content
+        chunks = [chunk.content async for chunk in
+                  FakeChatModel(latency_median=0, tokens_per_second=2000).astream(messages)]
+        return text, chunks
+
+    text, chunks = asyncio.run(scenario())
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert text.count("Carreira") > 3
+
+
+def test_agent_runs_on_fake_backend(monkeypatch):
+    """Com LLM_BACKEND=fake a conversa do test_agent gera o pattern sem a OpenAI"""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("FAKE_LLM_LATENCY", "0")
+    monkeypatch.setenv("FAKE_LLM_TOKENS_PER_SECOND", "100000")
+    agent = CrochetConversationalAgent()
+    state = agent._create_initial_state()
+
+    for message in ["Olá! Quero fazer um colete", "Tamanho M", "Azul marinho", "Algodão médio",
+                    "Sem manga, decote em V, comprimento até a cintura"]:
+        agent.get_next_question(state, message)
+    assert state.current_step == "pattern_generation"
+
+    pattern = agent.generate_pattern(state)
+    assert pattern.instructions[0] == "Instruções (gpt-4) para: colete"
+    assert agent.llm.primary.calls == 1
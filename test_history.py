@@ -0,0 +1,57 @@
+"""
+Testes do histórico limitado com resumo das mensagens antigas
+"""
+
+from crochet_agent import CrochetConversationalAgent
+from history import HistoryPolicy, estimate_tokens
+from models import ConversationState
+
+
+def test_history_keeps_last_messages_and_summarizes_the_rest():
+    """Acima do limite, as mensagens antigas saem do histórico e entram no resumo"""
+    policy = HistoryPolicy(max_messages=4, token_budget=10000)
+    state = ConversationState(collected_data={"piece_type": "colete"})
+    for turn in range(5):
+        policy.append(state, "user", f"mensagem {turn}")
+        policy.append(state, "assistant", f"pergunta {turn}")
+
+    assert [message["content"] for message in state.conversation_history] == [
+        "mensagem 3", "pergunta 3", "mensagem 4", "pergunta 4"
+    ]
+    assert state.summarized_messages == 6
+    summary = policy.summary_text(state)
+    assert "piece_type: colete" in summary
+    assert "- mensagem 2" in summary and "pergunta" not in summary
+
+    messages = policy.messages(state, "Sistema")
+    assert [message["role"] for message in messages[:2]] == ["system", "system"]
+    assert messages[2:] == state.conversation_history
+
+
+def test_token_budget_bounds_prompt_size():
+    """Mensagens longas saem antes do limite de mensagens para respeitar o orçamento"""
+    policy = HistoryPolicy(max_messages=100, token_budget=300, summary_tokens=40)
+    state = ConversationState()
+    for turn in range(20):
+        policy.append(state, "user", f"resposta longa {turn} " * 20, system_prompt="Sistema")
+        policy.append(state, "assistant", "Qual a cor?", system_prompt="Sistema")
+
+    size = policy.prompt_size(state, "Sistema")
+    assert size["within_budget"]
+    assert size["tokens"]["total"] <= 300
+    assert size["messages"] + size["summarized_messages"] == 40
+    assert estimate_tokens(state.history_summary) <= 40
+
+
+def test_agent_reports_effective_prompt_size():
+    """O agente aplica a política a cada turno e informa o tamanho do prompt"""
+    agent = CrochetConversationalAgent()
+    agent.history_policy = HistoryPolicy(max_messages=4)
+    state = agent._create_initial_state()
+    for message in ["Olá! Quero fazer um colete", "Tamanho M", "Azul marinho"]:
+        agent.get_next_question(state, message)
+
+    assert len(state.conversation_history) == 4
+    size = agent.prompt_size(state)
+    assert size["messages"] == 4 and size["summarized_messages"] == 2
+    assert size["tokens"]["total"] == sum(size["tokens"][part] for part in ("system", "summary", "history"))
@@ -0,0 +1,60 @@
+"""
+Testes do pool de conexões HTTP compartilhado pelas chamadas ao LLM
+"""
+
+import asyncio
+
+from langchain.schema import HumanMessage
+
+from http_pool import HTTPPool
+from llm_client import create_llm_client
+from test_llm_client import server  # noqa: F401 (fixture)
+
+MESSAGES = [HumanMessage(content="Um gorro azul")]
+
+
+def test_calls_reuse_pooled_connections(server, monkeypatch):
+    """Chamadas seguidas, inclusive ao modelo reserva, usam a mesma conexão"""
+    monkeypatch.setenv("OPENAI_API_BASE", server.base_url)
+    monkeypatch.setenv("LLM_FALLBACK_MODEL", "gpt-3.5-turbo")
+    server.failing_models.add("gpt-4")
+
+    async def scenario():
+        pool = HTTPPool(max_connections=4)
+        llm = create_llm_client("gpt-4", temperature=0.7, api_key="test", pool=pool)
+        llm.max_retries = 0
+        responses = [await llm.ainvoke(MESSAGES) for _ in range(3)]
+        stats = pool.stats()
+        await pool.aclose()
+        return responses, stats
+
+    responses, stats = asyncio.run(scenario())
+
+    assert responses[-1].content == "resposta de gpt-3.5-turbo"
+    assert stats["requests"] == 6
+    assert stats["connections_opened"] == 1
+    assert stats["async"]["idle"] == 1
+
+
+def test_pool_limits_concurrent_connections(server):
+    """Acima do limite, as requisições esperam por uma conexão livre"""
+    server.script.extend([(0.3, 200)] * 4)
+
+    async def scenario():
+        pool = HTTPPool(max_connections=2)
+        requests = [asyncio.create_task(pool.async_client.post(
+            f"{server.base_url}/chat/completions", json={"model": "gpt-4", "messages": []}
+        )) for _ in range(4)]
+        await asyncio.sleep(0.15)
+        during = pool.stats()
+        await asyncio.gather(*requests)
+        after = pool.stats()
+        await pool.aclose()
+        return during, after
+
+    during, after = asyncio.run(scenario())
+
+    assert during["async"]["in_use"] == 2
+    assert during["async"]["waiting_requests"] == 2
+    assert after["connections_opened"] == 2
+    assert after["requests"] == 4
@@ -0,0 +1,123 @@
+"""
+Testes da fila de geração de patterns em segundo plano
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from jobs import PatternJobQueue, QueueFullError
+from models import CrochetPattern, JobStatus
+
+
+def make_pattern(color: str) -> CrochetPattern:
+    return CrochetPattern(
+        piece_type="colete", size="M", color=color, yarn_weight="médio", hook_size="5.0mm",
+        gauge="15 pontos x 17 carreiras = 10cm", materials=[], instructions=["Carreira 1: 20 pb"],
+        special_notes=[], difficulty_level="Iniciante", estimated_time="Cerca de 2 horas"
+    )
+
+
+async def fake_runner(conversation_id, data):
+    await asyncio.sleep(0.01)
+    if data["color"] == "erro":
+        raise RuntimeError("falhou")
+    return make_pattern(data["color"])
+
+
+async def wait_for(queue: PatternJobQueue, job_id: str, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job.status in (JobStatus.DONE, JobStatus.FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job não terminou")
+
+
+def test_jobs_run_in_background_and_report_result(tmp_path):
+    """O job fica pronto com o pattern; erros viram status failed"""
+    async def scenario():
+        queue = PatternJobQueue(fake_runner, path=str(tmp_path / "jobs.db"), workers=2)
+        await queue.start()
+        ok = queue.submit("c1", "k1", {"color": "azul"})
+        bad = queue.submit("c2", "k2", {"color": "erro"})
+        assert ok.status == JobStatus.QUEUED
+
+        done, failed = await wait_for(queue, ok.job_id), await wait_for(queue, bad.job_id)
+        await queue.stop()
+        return done, failed
+
+    done, failed = asyncio.run(scenario())
+    assert done.pattern.color == "azul"
+    assert failed.status == JobStatus.FAILED and failed.error == "falhou"
+
+
+def test_duplicate_submissions_share_a_job_and_queue_is_bounded(tmp_path):
+    """Pedidos repetidos reaproveitam o job pendente; a fila tem limite"""
+    queue = PatternJobQueue(fake_runner, path=str(tmp_path / "jobs.db"), max_queue=2)
+
+    first = queue.submit("c1", "k1", {"color": "azul"})
+    assert queue.submit("c1", "k1", {"color": "azul"}).job_id == first.job_id
+    queue.submit("c2", "k2", {"color": "rosa"})
+
+    with pytest.raises(QueueFullError):
+        queue.submit("c3", "k3", {"color": "verde"})
+    assert queue.stats()["queued"] == 2
+
+
+def test_pending_jobs_survive_a_restart(tmp_path):
+    """Jobs na fila ou com prazo vencido são retomados por um novo processo"""
+    path = str(tmp_path / "jobs.db")
+    before = PatternJobQueue(fake_runner, path=path, lease_seconds=0)
+    queued = before.submit("c1", "k1", {"color": "azul"})
+    stuck = before.submit("c2", "k2", {"color": "rosa"})
+    # Simula um worker que pegou o job e caiu no meio da geração
+    assert before._claim()[0] == queued.job_id
+
+    async def scenario():
+        after = PatternJobQueue(fake_runner, path=path)
+        await after.start()
+        jobs = [await wait_for(after, queued.job_id), await wait_for(after, stuck.job_id)]
+        await after.stop()
+        return jobs
+
+    assert [job.status for job in asyncio.run(scenario())] == [JobStatus.DONE, JobStatus.DONE]
+
+
+def test_finished_jobs_are_evicted_after_retention(tmp_path):
+    """Jobs concluídos saem depois do tempo de retenção"""
+    queue = PatternJobQueue(fake_runner, path=str(tmp_path / "jobs.db"), retention_seconds=0)
+    job = queue.submit("c1", "k1", {"color": "azul"})
+    queue._finish(job.job_id, pattern=make_pattern("azul"))
+    time.sleep(0.01)
+
+    assert queue.evict_expired() == 1
+    assert queue.get(job.job_id) is None
+
+
+def test_worker_database_calls_run_off_the_event_loop(tmp_path):
+    """Pegar e concluir jobs (SQLite) acontece fora da thread do event loop"""
+    queue = PatternJobQueue(fake_runner, path=str(tmp_path / "jobs.db"), workers=1)
+    threads = []
+    for name in ("_claim", "_finish", "evict_expired"):
+        method = getattr(queue, name)
+
+        def recorded(*args, _method=method, **kwargs):
+            threads.append(threading.get_ident())
+            return _method(*args, **kwargs)
+
+        setattr(queue, name, recorded)
+
+    async def scenario():
+        await queue.start()
+        job = queue.submit("c1", "k1", {"color": "azul"})
+        done = await wait_for(queue, job.job_id)
+        await queue.stop()
+        return done, threading.get_ident()
+
+    done, loop_thread = asyncio.run(scenario())
+    assert done.status == JobStatus.DONE
+    assert threads and loop_thread not in threads
@@ -0,0 +1,61 @@
+"""
+Testes da base local de técnicas: busca dos trechos, prompt compacto e inserção no pattern
+"""
+
+import asyncio
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+from knowledge_base import TECHNIQUES, KnowledgeBase
+
+DATA = {
+    "piece_type": "blusa", "size": "M", "color": "rosa", "yarn_type": "algodão",
+    "yarn_weight": "médio", "style_details": "manga bufante e decote em V",
+}
+
+
+def test_retrieves_only_techniques_in_the_details():
+    """Só as técnicas citadas entram, com a construção da peça e os pontos que elas usam"""
+    kb = KnowledgeBase()
+
+    retrieval = kb.retrieve(DATA)
+    assert [technique.title for technique in retrieval.techniques] == ["Manga bufante", "Decote V"]
+    assert retrieval.construction.parts[0].startswith("Costas e frente")
+    assert {"pb", "pa", "dim"} <= {stitch.abbreviation for stitch in retrieval.stitches}
+
+    assert [t.title for t in kb.retrieve({**DATA, "style_details": "sem mangas"}).techniques] == ["Cava sem manga"]
+    assert kb.retrieve({**DATA, "style_details": "com mangas"}).techniques == ()
+    assert kb.retrieve({"piece_type": "chapeu", "style_details": "sem detalhes"}).techniques == ()
+
+
+def test_splicer_expands_markers_and_appends_missing_techniques():
+    """Marcadores viram o passo a passo canônico; técnicas não marcadas vão para o fim"""
+    kb = KnowledgeBase()
+    splicer = kb.splicer(kb.retrieve(DATA))
+    bufante, decote = TECHNIQUES[0], TECHNIQUES[4]
+
+    lines = splicer.splice(["Costas: 40 corr", "Mangas: [[manga bufante]]", "Borda [[ponto secreto]]"])
+    assert lines == ["Costas: 40 corr", "Mangas:", *bufante.steps, "Borda ponto secreto",
+                     "Decote V:", *decote.steps]
+    assert splicer.legend()[0].startswith("corr (correntinha): ")
+
+
+def test_agent_prompt_is_compact_and_pattern_gets_canonical_text():
+    """O prompt só traz marcadores; o pattern recebe o passo a passo e a legenda localmente"""
+    agent = CrochetConversationalAgent()
+    agent.llm = FakeChatModel(latency_median=0, tokens_per_second=100000)
+    state = agent._create_initial_state()
+    state.collected_data.update(DATA)
+
+    prompt = agent._build_pattern_messages(DATA)[-1].content
+    assert "[[Manga bufante]]" in prompt and TECHNIQUES[0].steps[1] not in prompt
+
+    async def collect():
+        return [event async for event in agent.astream_pattern(state)]
+
+    events = asyncio.run(collect())
+    pattern = events[-1]["data"]
+    assert [event["data"] for event in events if event["event"] == "instruction"] == pattern.instructions
+    assert pattern.instructions.count(TECHNIQUES[0].steps[1]) == 1
+    assert "Manga bufante:" in pattern.instructions
+    assert any(note.startswith("pa (ponto alto): ") for note in pattern.special_notes)
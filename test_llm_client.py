@@ -0,0 +1,209 @@
+"""
+Testes da camada resiliente de chamadas ao LLM, contra um servidor local
+compatível com a API de chat da OpenAI
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain.chat_models import ChatOpenAI
+from langchain.schema import HumanMessage
+
+from crochet_agent import CrochetConversationalAgent
+from llm_client import ResilientLLM
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Responde /v1/chat/completions; `script` define atraso e status de cada requisição"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.script = deque()
+        self.failing_models = set()
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem (timeout, hedging) fecham a conexão no meio da resposta
+        pass
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # Mantém a conexão aberta entre requisições, como a API real
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        model = body["model"]
+        self.server.requests.append(model)
+        delay, status = self.server.script.popleft() if self.server.script else (0, 200)
+        if model in self.server.failing_models:
+            status = 503
+        time.sleep(delay)
+
+        if status != 200:
+            self._send(status, "application/json", json.dumps({"error": {"message": "indisponível"}}))
+            return
+
+        content = f"resposta de {model}"
+        if not body.get("stream"):
+            self._send(200, "application/json", json.dumps({
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }))
+            return
+
+        events = []
+        for word in content.split(" "):
+            events.append({"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0,
+                           "model": model, "choices": [{"index": 0, "delta": {"content": word + " "},
+                                                        "finish_reason": None}]})
+        payload = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        self._send(200, "text/event-stream", payload)
+
+    def _send(self, status, content_type, payload):
+        data = payload.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    server = FakeOpenAIServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def chat_model(server, model="gpt-4"):
+    return ChatOpenAI(model=model, openai_api_key="test", openai_api_base=server.base_url,
+                      max_retries=0, request_timeout=5)
+
+
+MESSAGES = [HumanMessage(content="Um gorro azul")]
+
+
+def test_transient_errors_are_retried(server):
+    """Um 503 passageiro é repetido e a chamada termina com sucesso"""
+    server.script.extend([(0, 503), (0, 200)])
+    llm = ResilientLLM(chat_model(server), retry_base_delay=0.01)
+
+    response = asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert response.content == "resposta de gpt-4"
+    assert len(server.requests) == 2
+    stats = llm.stats()
+    assert stats["retries"] == 1
+    # Tokens informados pelo servidor na resposta
+    assert stats["prompt_tokens"] == 1 and stats["completion_tokens"] == 1
+
+
+def test_deadline_bounds_slow_responses(server):
+    """Uma resposta lenta demais estoura o prazo em vez de segurar a requisição"""
+    server.script.extend([(2, 200), (2, 200)])
+    llm = ResilientLLM(chat_model(server), deadline=0.5, attempt_timeout=0.3, retry_base_delay=0.01)
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert time.monotonic() - started < 1.5
+    assert llm.stats()["timeouts"] >= 1
+
+
+def test_slow_request_is_hedged(server):
+    """Acima do percentil configurado, uma segunda requisição é disparada e vence"""
+    llm = ResilientLLM(chat_model(server), hedge_percentile=90, hedge_min_samples=3)
+
+    async def scenario():
+        for _ in range(3):
+            await llm.ainvoke(MESSAGES)
+        server.script.extend([(2, 200), (0, 200)])
+        started = time.monotonic()
+        response = await llm.ainvoke(MESSAGES)
+        return response, time.monotonic() - started
+
+    response, elapsed = asyncio.run(scenario())
+
+    assert response.content == "resposta de gpt-4"
+    assert elapsed < 1.5
+    stats = llm.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_fallback_model_after_retries(server):
+    """Com o modelo principal fora do ar, a resposta vem do modelo reserva"""
+    server.failing_models.add("gpt-4")
+    llm = ResilientLLM(chat_model(server), fallback=chat_model(server, "gpt-3.5-turbo"),
+                       max_retries=1, retry_base_delay=0.01)
+
+    response = asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert response.content == "resposta de gpt-3.5-turbo"
+    assert server.requests == ["gpt-4", "gpt-4", "gpt-3.5-turbo"]
+    assert llm.stats()["fallbacks"] == 1
+
+
+def test_stream_is_retried_before_first_token(server):
+    """Uma falha antes do primeiro token é repetida; o stream chega completo"""
+    server.script.extend([(0, 502), (0, 200)])
+    llm = ResilientLLM(chat_model(server), retry_base_delay=0.01)
+
+    async def scenario():
+        return "".join([chunk.content async for chunk in llm.astream(MESSAGES)])
+
+    assert asyncio.run(scenario()).strip() == "resposta de gpt-4"
+    assert len(server.requests) == 2
+
+
+def test_sync_generation_uses_the_async_retry_path(server):
+    """generate_pattern (síncrono) passa pelas mesmas tentativas e modelo reserva da API"""
+    server.failing_models.add("gpt-4")
+    agent = CrochetConversationalAgent()
+    agent.llm = ResilientLLM(chat_model(server), fallback=chat_model(server, "gpt-3.5-turbo"),
+                             max_retries=1, retry_base_delay=0.01)
+    state = agent._create_initial_state()
+    state.collected_data.update({"piece_type": "gorro", "size": "M", "color": "azul", "yarn_type": "lã",
+                                 "yarn_weight": "médio", "style_details": "sem detalhes"})
+
+    pattern = agent.generate_pattern(state)
+
+    assert pattern.instructions[0] == "resposta de gpt-3.5-turbo"
+    assert server.requests == ["gpt-4", "gpt-4", "gpt-3.5-turbo"]
+    assert agent.llm.stats()["fallbacks"] == 1
+
+
+def test_repeated_sync_generations_reuse_the_connections(server):
+    """Chamadas síncronas seguidas não herdam conexões de um event loop já fechado"""
+    agent = CrochetConversationalAgent()
+    agent.llm = ResilientLLM(chat_model(server), max_retries=0)
+    data = {"piece_type": "gorro", "color": "azul", "yarn_type": "lã", "yarn_weight": "médio",
+            "style_details": "sem detalhes"}
+
+    for size in ("M", "L"):
+        state = agent._create_initial_state()
+        state.collected_data.update(data, size=size)
+        assert agent.generate_pattern(state).instructions[0] == "resposta de gpt-4"
+
+    assert server.requests == ["gpt-4", "gpt-4"]
+    assert agent.llm.stats()["failures"] == 0
@@ -0,0 +1,56 @@
+"""
+Testes das métricas no formato do Prometheus
+"""
+
+import asyncio
+
+from metrics import Histogram, MetricsRegistry, STAGE_SECONDS, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Buckets acumulados, soma e contagem por valor do label"""
+    histogram = Histogram("crochet_test_seconds", "Teste", label="stage", buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe("extract", seconds)
+
+    lines = histogram.render()
+
+    assert 'crochet_test_seconds_bucket{stage="extract",le="0.1"} 1' in lines
+    assert 'crochet_test_seconds_bucket{stage="extract",le="1.0"} 3' in lines
+    assert 'crochet_test_seconds_bucket{stage="extract",le="+Inf"} 4' in lines
+    assert 'crochet_test_seconds_count{stage="extract"} 4' in lines
+    assert lines[1] == "# TYPE crochet_test_seconds histogram"
+
+
+def test_timed_records_sync_and_async_functions():
+    """O decorator mede funções síncronas e assíncronas, inclusive quando falham"""
+    @timed("test_sync")
+    def sync_stage():
+        raise ValueError("falhou")
+
+    @timed("test_async")
+    async def async_stage():
+        await asyncio.sleep(0)
+        return 42
+
+    try:
+        sync_stage()
+    except ValueError:
+        pass
+    assert asyncio.run(async_stage()) == 42
+
+    rendered = "\n".join(STAGE_SECONDS.render())
+    assert 'crochet_stage_duration_seconds_count{stage="test_sync"} 1' in rendered
+    assert 'crochet_stage_duration_seconds_count{stage="test_async"} 1' in rendered
+
+
+def test_failing_collector_is_skipped():
+    """Um componente indisponível não impede a coleta das outras métricas"""
+    registry = MetricsRegistry()
+    registry.gauge("crochet_broken", "Quebrada", lambda: 1 / 0)
+    registry.counter("crochet_events_total", "Eventos", lambda: {"b": 2, "a": 1}, label="event")
+
+    text = registry.render()
+
+    assert "crochet_broken" not in text
+    assert 'crochet_events_total{event="a"} 1\ncrochet_events_total{event="b"} 2' in text
@@ -0,0 +1,82 @@
+"""
+Testes do cache de patterns endereçado por conteúdo
+"""
+
+import time
+
+from models import CrochetPattern
+from pattern_cache import PatternCache, pattern_cache_key
+
+
+def make_pattern(color: str = "azul") -> CrochetPattern:
+    return CrochetPattern(
+        piece_type="colete",
+        size="M",
+        color=color,
+        yarn_weight="médio",
+        hook_size="5.0mm",
+        gauge="18 pontos x 20 carreiras = 10cm",
+        materials=["Fio de algodão"],
+        instructions=["Carreira 1: 20 pb"],
+        special_notes=[],
+        difficulty_level="Intermediário",
+        estimated_time="6 horas"
+    )
+
+
+def test_key_ignores_case_whitespace_and_extra_fields():
+    """Pedidos equivalentes geram a mesma chave"""
+    a = {"piece_type": "colete", "size": "M", "color": "azul", "style_details": "sem manga"}
+    b = {"piece_type": " Colete", "size": "m", "color": "AZUL", "style_details": "sem   manga",
+         "sleeve_type": "sem manga"}
+
+    assert pattern_cache_key(a, "gpt-4", "1") == pattern_cache_key(b, "gpt-4", "1")
+    assert pattern_cache_key(a, "gpt-4", "1") != pattern_cache_key(a, "gpt-4", "2")
+    assert pattern_cache_key(a, "gpt-4", "1") != pattern_cache_key(a, "gpt-3.5-turbo", "1")
+
+
+def test_lru_eviction_and_counters():
+    """Entradas menos usadas saem primeiro e os contadores acompanham"""
+    cache = PatternCache(max_entries=2)
+    cache.set("a", make_pattern("azul"))
+    cache.set("b", make_pattern("rosa"))
+    assert cache.get("a").color == "azul"
+
+    cache.set("c", make_pattern("verde"))
+
+    assert cache.get("b") is None
+    assert cache.get("c").color == "verde"
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["entries"] == 2
+
+
+def test_ttl_expiration():
+    """Entradas vencidas não são retornadas"""
+    cache = PatternCache(ttl_seconds=0.01)
+    cache.set("a", make_pattern())
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_returned_pattern_is_a_copy():
+    """Alterar o pattern retornado não altera o cache"""
+    cache = PatternCache()
+    cache.set("a", make_pattern())
+    cache.get("a").instructions.append("alterado")
+
+    assert cache.get("a").instructions == ["Carreira 1: 20 pb"]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """A camada em disco mantém os patterns entre instâncias"""
+    path = str(tmp_path / "cache.db")
+    PatternCache(path=path).set("a", make_pattern("rosa"))
+
+    cache = PatternCache(path=path)
+    assert cache.get("a").color == "rosa"
+    assert cache.get("a").color == "rosa"
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["hits"] == 1
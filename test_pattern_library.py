@@ -0,0 +1,103 @@
+"""
+Testes da biblioteca de patterns (SQLite + FTS5) e do reaproveitamento pelo agente
+"""
+
+import asyncio
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+from models import CrochetPattern
+from pattern_library import PatternLibrary
+
+DATA = {
+    "piece_type": "colete", "size": "M", "color": "Azul marinho", "yarn_type": "Algodão",
+    "yarn_weight": "médio", "style_details": "sem detalhes", "measurements": "", "gauge": "",
+}
+
+
+def make_pattern(first_row: str) -> CrochetPattern:
+    return CrochetPattern(
+        piece_type="colete", size="M", color="azul", yarn_weight="médio", hook_size="4mm", gauge="",
+        materials=[], instructions=[first_row], special_notes=[], difficulty_level="Iniciante",
+        estimated_time="10 horas",
+    )
+
+
+def test_search_ignores_accents_and_applies_filters():
+    """A busca acha "algodao" em "Algodão", filtra por campo e devolve os mais recentes primeiro"""
+    library = PatternLibrary()
+    library.add("a", DATA, make_pattern("Colete M"))
+    library.add("b", {**DATA, "size": "G"}, make_pattern("Colete G"))
+    library.add("c", {**DATA, "yarn_type": "Lã"}, make_pattern("Colete de lã"))
+
+    results = library.search("algodao colete")
+    assert [entry["pattern"].instructions[0] for entry in results] == ["Colete G", "Colete M"]
+    assert [entry["inputs"]["size"] for entry in library.search("algodao", size="G")] == ["g"]
+    assert len(library.search(piece_type="colete")) == 3
+    assert library.search("tricô") == []
+
+
+def test_filters_are_exact_also_with_text_search():
+    """Com ou sem texto, size=M não traz a grade "XS (S, M, ...)" e fino não traz extra fino"""
+    library = PatternLibrary()
+    library.add("a", {**DATA, "yarn_weight": "fino"}, make_pattern("Colete M"))
+    library.add("b", {**DATA, "size": "XS (S, M, L, XL, XXL)", "yarn_weight": "extra fino"},
+                make_pattern("Colete graduado"))
+
+    for query in ("", "colete"):
+        assert [entry["pattern"].instructions[0] for entry in library.search(query, size="M")] == ["Colete M"]
+        assert [entry["pattern"].instructions[0]
+                for entry in library.search(query, yarn_weight="fino")] == ["Colete M"]
+
+
+def test_same_request_replaces_previous_entry():
+    """Guardar de novo o mesmo pedido substitui o pattern, inclusive no índice de texto"""
+    library = PatternLibrary()
+    first = library.add("a", DATA, make_pattern("Antigo"))
+    second = library.add("a", DATA, make_pattern("Novo"))
+
+    assert len(library) == 1
+    assert library.get(first) is None
+    assert [entry["pattern_id"] for entry in library.search("azul")] == [second]
+
+
+def test_agent_reuses_library_pattern_with_other_color():
+    """Com PATTERN_LIBRARY_REUSE, um pedido que só muda a cor é revisado a partir da biblioteca"""
+    async def scenario():
+        agent = CrochetConversationalAgent()
+        agent.llm = FakeChatModel(latency_median=0.01, tokens_per_second=100000)
+        agent.library_reuse = True
+        await agent.agenerate_pattern_for(DATA)
+        agent.pattern_cache.clear()
+        return agent, await agent.agenerate_pattern_for({**DATA, "color": "Rosa"})
+
+    agent, pattern = asyncio.run(scenario())
+
+    assert agent.llm.calls == 1
+    assert pattern.color == "Rosa"
+    assert agent.pattern_library.stats()["reuses"] == 1
+
+
+def test_library_evicts_oldest_entries_above_the_limit():
+    """Acima de max_entries os patterns mais antigos saem, também da busca por texto"""
+    library = PatternLibrary(max_entries=2)
+    for size in ("P", "M", "G"):
+        library.add(size, {**DATA, "size": size}, make_pattern(f"Colete {size}"))
+
+    assert len(library) == 2 and library.stats()["evictions"] == 1
+    assert [entry["inputs"]["size"] for entry in library.search("colete")] == ["g", "m"]
+
+
+def test_factory_defaults_to_a_persistent_unbounded_library(monkeypatch, tmp_path):
+    """Sem configuração, a biblioteca fica em patterns.db e sobrevive a um reinício, sem limite de tamanho"""
+    from pattern_library import create_pattern_library
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("PATTERN_LIBRARY_PATH", raising=False)
+    monkeypatch.delenv("PATTERN_LIBRARY_MAX_ENTRIES", raising=False)
+    library = create_pattern_library()
+    library.add("a", DATA, make_pattern("Colete M"))
+
+    reopened = create_pattern_library()
+    assert (tmp_path / "patterns.db").exists()
+    assert reopened.max_entries is None and len(reopened) == 1
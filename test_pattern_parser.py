@@ -0,0 +1,69 @@
+"""
+Testes da leitura estruturada da resposta do LLM
+"""
+
+import asyncio
+import json
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+from pattern_parser import PatternStreamParser, parse_pattern_output
+
+RESPONSE = {
+    "instructions": ["Costas", "Carreira 1: 60 correntes \"base\"", "Carreiras 2-40: pb\nArremate"],
+    "special_notes": ["Bloqueie a peça à mão \U0001f9f6"],
+}
+
+
+def test_stream_parser_emits_each_line_as_it_closes():
+    """Cada linha sai assim que a string fecha, mesmo com a resposta picada em pedaços"""
+    text = "```json\n" + json.dumps(RESPONSE) + "\n```"
+    parser = PatternStreamParser()
+    items = []
+    for start in range(0, len(text), 7):
+        items.extend(parser.feed(text[start:start + 7]))
+
+    assert items[:2] == [("instructions", "Costas"), ("instructions", 'Carreira 1: 60 correntes "base"')]
+    fields = parser.finish()
+    assert fields["instructions"] == ["Costas", 'Carreira 1: 60 correntes "base"', "Carreiras 2-40: pb", "Arremate"]
+    assert fields["special_notes"] == RESPONSE["special_notes"]
+    assert not parser.malformed
+
+
+def test_tolerant_fallbacks():
+    """Resposta cortada, sem JSON ou com JSON inválido ainda rende instruções"""
+    truncated = parse_pattern_output('{"instructions": ["Carreira 1", "Carreira 2", "Carrei')
+    assert truncated["instructions"] == ["Carreira 1", "Carreira 2"]
+
+    plain = parse_pattern_output("Aqui está o pattern:\nCarreira 1: 20 correntes\n\nCarreira 2: pb")
+    assert plain["instructions"] == ["Aqui está o pattern:", "Carreira 1: 20 correntes", "Carreira 2: pb"]
+
+    single_string = parse_pattern_output('{"instructions": "Carreira 1\\nCarreira 2"}')
+    assert single_string["instructions"] == ["Carreira 1", "Carreira 2"]
+
+    invalid = PatternStreamParser()
+    invalid.feed("{instructions: [\nCarreira 1: 20 correntes\n]}")
+    assert invalid.finish()["instructions"] == ["Carreira 1: 20 correntes"]
+    assert invalid.malformed
+
+
+def test_streamed_pattern_matches_structured_response():
+    """No streaming, as instruções emitidas são as do pattern final, com as dicas do LLM nas notas"""
+    agent = CrochetConversationalAgent()
+    agent.llm = FakeChatModel(latency_median=0, tokens_per_second=5000)
+    state = agent._create_initial_state()
+    state.collected_data.update({"piece_type": "colete", "size": "M", "color": "azul",
+                                 "yarn_type": "algodão", "yarn_weight": "médio", "style_details": "sem detalhes"})
+
+    async def collect():
+        return [event async for event in agent.astream_pattern(state)]
+
+    events = asyncio.run(collect())
+    pattern = events[-1]["data"]
+    streamed = [event["data"] for event in events if event["event"] == "instruction"]
+    assert streamed == pattern.instructions
+    assert pattern.instructions[0].startswith("Instruções (fake)")
+    # 3 notas calculadas, 1 dica do LLM e a legenda dos pontos da base de técnicas
+    legend = agent._technique_splicer(state.collected_data).legend()
+    assert len(pattern.special_notes) == 4 + len(legend) and pattern.special_notes[4:] == legend
+    assert pattern.hook_size and pattern.estimated_time
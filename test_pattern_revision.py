@@ -0,0 +1,129 @@
+"""
+Testes da reutilização e da revisão incremental do pattern de uma conversa
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from crochet_agent import CrochetConversationalAgent
+
+
+class CountingLLM:
+    """LLM falso que conta as chamadas e cita a cor do prompt nas instruções"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        prompt = messages[-1].content
+        color = prompt.split("Cor: ")[1].split("\n")[0].strip()
+
+        class Response:
+            content = f"Carreira 1: 20 correntes com o fio {color}\nCarreira 2: 20 pb"
+
+        return Response()
+
+    async def astream(self, messages):
+        yield await self.ainvoke(messages)
+
+
+@pytest.fixture
+def agent():
+    agent = CrochetConversationalAgent()
+    agent.llm = CountingLLM()
+    return agent
+
+
+def chat(agent, state, message):
+    agent.get_next_question(state, message)
+    return asyncio.run(agent.agenerate_pattern(state))
+
+
+def ready_state(agent):
+    state = agent._create_initial_state()
+    for message in ["colete", "tamanho M", "azul", "algodão médio"]:
+        agent.get_next_question(state, message)
+    return state
+
+
+def test_unchanged_inputs_return_the_same_pattern(agent):
+    """"obrigado" depois do pattern não gera nada de novo"""
+    state = ready_state(agent)
+    first = chat(agent, state, "sem manga")
+    again = chat(agent, state, "obrigado!")
+
+    assert again == first
+    assert state.pattern_version == 1
+    assert agent.llm.calls == 1
+
+
+def test_color_change_is_revised_without_the_llm(agent):
+    """Mudar a cor revisa materiais, notas e instruções localmente"""
+    state = ready_state(agent)
+    chat(agent, state, "sem manga")
+    revised = chat(agent, state, "muda a cor para rosa")
+
+    assert agent.llm.calls == 1
+    assert state.pattern_version == 2
+    assert revised.color == "rosa"
+    assert revised.instructions[0] == "Carreira 1: 20 correntes com o fio rosa"
+    assert any("rosa" in material for material in revised.materials)
+    assert not any("azul" in note for note in revised.special_notes)
+
+
+def test_other_changes_regenerate(agent):
+    """Mudar o tamanho exige gerar o pattern de novo"""
+    state = ready_state(agent)
+    chat(agent, state, "sem manga")
+    pattern = chat(agent, state, "na verdade quero tamanho G")
+
+    assert agent.llm.calls == 2
+    assert state.pattern_version == 2
+    assert pattern.size == "L"
+
+
+def test_size_change_after_delivery_regenerates(agent):
+    """ "muda o tamanho para G" depois da entrega gera um pattern novo no tamanho G"""
+    state = ready_state(agent)
+    first = chat(agent, state, "sem manga")
+    pattern = chat(agent, state, "muda o tamanho para G")
+
+    assert agent.pattern_changes(state) == []
+    assert agent.llm.calls == 2
+    assert state.pattern_version == 2
+    assert first.size == "M" and pattern.size == "L"
+
+
+def test_chat_stream_looks_up_the_ready_pattern_once(monkeypatch):
+    """/chat/stream consulta o pattern pronto uma vez por mensagem, gerando ou reaproveitando"""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    import main
+    from fastapi.testclient import TestClient
+
+    llm = CountingLLM()
+    monkeypatch.setattr(main.agent, "_llm", llm)
+    lookups = []
+    aready_pattern = main.agent.aready_pattern
+
+    async def counted(state):
+        lookups.append(state.current_step)
+        return await aready_pattern(state)
+
+    monkeypatch.setattr(main.agent, "aready_pattern", counted)
+    with TestClient(main.app) as client:
+        conversation_id = None
+        for message in ["colete", "tamanho M", "azul", "algodão médio", "sem manga", "obrigado!"]:
+            lookups.clear()
+            body = client.post("/chat/stream", json={"message": message, "conversation_id": conversation_id}).text
+            conversation_id = json.loads(body.split("data: ", 1)[1].split("\n", 1)[0])["conversation_id"]
+
+    # "obrigado" devolve o pattern já entregue, sem segunda consulta nem nova chamada ao LLM
+    assert lookups == ["pattern_generation"]
+    assert "event: pattern" in body
+    assert llm.calls == 1
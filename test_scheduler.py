@@ -0,0 +1,116 @@
+"""
+Testes do controle de admissão e da fila justa entre clientes
+"""
+
+import asyncio
+
+import pytest
+
+from scheduler import Lane, Scheduler, SchedulerSaturatedError
+
+
+def test_waiting_clients_are_served_round_robin():
+    """Um cliente com muitos pedidos não passa na frente dos outros"""
+    async def scenario():
+        lane = Lane("generation", capacity=1, max_queue=10, max_queued_per_client=10)
+        order = []
+        gate = asyncio.Event()
+
+        async def work(client, label):
+            started = await lane.acquire(client)
+            order.append(label)
+            await gate.wait()
+            lane.release(started)
+
+        first = asyncio.create_task(work("a", "a0"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(work(client, label))
+                 for client, label in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")]]
+        await asyncio.sleep(0)
+        assert lane.stats()["queued"] == 4
+
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return order, lane.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["a0", "a1", "b1", "a2", "a3"]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_saturated_lane_rejects_with_retry_after():
+    """Fila cheia (total ou do cliente) recusa na hora, com estimativa de espera"""
+    async def scenario():
+        lane = Lane("generation", capacity=1, max_queue=2, max_queued_per_client=1,
+                    initial_service_seconds=10)
+        await lane.acquire("a")
+        waiters = [asyncio.create_task(lane.acquire("a"))]
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerSaturatedError) as per_client:
+            await lane.acquire("a")
+
+        waiters.append(asyncio.create_task(lane.acquire("b")))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerSaturatedError) as full:
+            await lane.acquire("c")
+
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return per_client.value, full.value, lane.stats()
+
+    per_client, full, stats = asyncio.run(scenario())
+    assert per_client.retry_after >= 10
+    assert full.retry_after == 30
+    assert stats["rejected"] == 2
+    assert stats["queued"] == 0 and stats["active"] == 1
+
+
+def test_lanes_are_independent():
+    """Gerações ocupando todas as vagas não bloqueiam os turnos"""
+    async def scenario():
+        scheduler = Scheduler({
+            "turn": Lane("turn", capacity=2, max_queue=2, max_queued_per_client=2),
+            "generation": Lane("generation", capacity=1, max_queue=0, max_queued_per_client=1),
+        })
+        async with scheduler.slot("generation", "a"):
+            with pytest.raises(SchedulerSaturatedError):
+                await scheduler.acquire("generation", "b")
+            async with scheduler.slot("turn", "b"):
+                return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["generation"]["active"] == 1
+    assert stats["turn"]["active"] == 1
+
+
+def test_saturated_lane_maps_to_429(monkeypatch):
+    """Na API, a lane saturada vira 429 com Retry-After, sem mudar a conversa"""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    import main
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setitem(main.scheduler.lanes, "turn",
+                        Lane("turn", capacity=0, max_queue=0, max_queued_per_client=0))
+    with TestClient(main.app) as client:
+        response = client.post("/chat", json={"message": "Quero fazer um colete"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert main.scheduler.lanes["turn"].stats()["rejected"] == 1
+
+
+def test_client_header_only_counts_behind_a_trusted_proxy(monkeypatch):
+    """Trocar o X-Client-Id não escapa da cota por cliente; só um proxy confiável repassa o cliente"""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    import main
+    from starlette.requests import Request
+
+    def client_id(host, header):
+        return main._client_id(Request({"type": "http", "client": (host, 5000),
+                                        "headers": [(b"x-client-id", header.encode())]}))
+
+    monkeypatch.setattr(main, "trusted_proxies", {"10.0.0.2"})
+    assert client_id("203.0.113.7", "a") == client_id("203.0.113.7", "b") == "203.0.113.7"
+    assert client_id("10.0.0.2", "a") == "a"
@@ -0,0 +1,75 @@
+"""
+Testes do índice de similaridade (pedidos quase iguais) e do reaproveitamento pelo agente
+"""
+
+import asyncio
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+from similarity import SimilarityIndex, embed, style_features
+
+DATA = {
+    "piece_type": "blusa", "size": "M", "color": "Azul marinho", "yarn_type": "Algodão",
+    "yarn_weight": "médio", "style_details": "sem manga, decote V", "measurements": "", "gauge": "",
+}
+
+
+def similarity(a: str, b: str) -> float:
+    return float(embed(style_features(a), 256) @ embed(style_features(b), 256))
+
+
+def test_rewritten_details_are_similar_and_negation_is_not():
+    """Ordem, plural e palavras vazias não mudam o vetor; a negação ("sem manga") muda"""
+    assert style_features("decote em V sem mangas") == ["decote", "v", "!manga"]
+    assert similarity("sem manga, decote V", "decote em V sem mangas") > 0.99
+    assert similarity("Manga bufante", "mangas bufantes") > 0.99
+    assert similarity("com manga", "sem manga") < 0.2
+    assert similarity("manga curta bufante", "manga bufante") < 0.85
+
+
+def test_index_only_matches_same_shape_and_evicts_oldest():
+    """Tamanho diferente nunca casa; acima de max_rows o texto mais antigo sai do índice"""
+    index = SimilarityIndex(threshold=0.85, max_rows=2)
+    index.add(1, DATA)
+
+    assert index.lookup({**DATA, "style_details": "decote em V sem mangas"}) == (1, 1.0)
+    assert index.lookup({**DATA, "size": "G"}) is None
+    assert index.lookup({**DATA, "style_details": "manga bufante"}) is None
+
+    # Mesmos termos (sem manga, decote V), textos livres diferentes: mesmo grupo
+    index.add(2, {**DATA, "style_details": "sem manga, decote V, listras finas"})
+    index.add(3, {**DATA, "style_details": "sem manga, decote V, barra arredondada"})
+    assert len(index) == 2
+    assert index.lookup(DATA) is None
+    assert index.stats()["hits"] == 1
+
+
+def test_recognized_techniques_must_match_exactly():
+    """Mangas e técnicas diferentes nunca são reaproveitadas, por mais parecido que seja o resto do texto"""
+    index = SimilarityIndex(threshold=0.5)
+    index.add(1, {**DATA, "style_details": "manga longa, decote V, comprimento até o quadril"})
+    index.add(2, {**DATA, "style_details": "manga raglan com listras finas e barra arredondada"})
+
+    assert index.lookup({**DATA, "style_details": "manga curta, decote V, comprimento até o quadril"}) is None
+    assert index.lookup({**DATA, "style_details": "manga sino com listras finas e barra arredondada"}) is None
+    # Com os mesmos termos, o texto livre parecido ainda é reaproveitado
+    assert index.lookup({**DATA, "style_details": "mangas raglan, listras finas, barra arredondada"})[0] == 2
+
+
+def test_agent_reuses_pattern_for_near_duplicate_request():
+    """Detalhes escritos de outro jeito (e outra cor) reaproveitam o pattern sem chamar o LLM"""
+    async def scenario():
+        agent = CrochetConversationalAgent()
+        agent.llm = FakeChatModel(latency_median=0.01, tokens_per_second=100000)
+        await agent.agenerate_pattern_for(DATA)
+        near = await agent.agenerate_pattern_for({**DATA, "color": "Azul", "style_details": "decote em V sem mangas"})
+        calls = agent.llm.calls
+        await agent.agenerate_pattern_for({**DATA, "style_details": "manga bufante"})
+        return agent, near, calls
+
+    agent, near, calls = asyncio.run(scenario())
+
+    assert calls == 1
+    assert near.color == "Azul"
+    assert agent.llm.calls == 2
+    assert agent.similarity_index.stats()["hits"] == 1
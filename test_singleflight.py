@@ -0,0 +1,150 @@
+"""
+Testes do agrupamento de gerações idênticas em andamento
+"""
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    """Chamadas simultâneas com a mesma chave executam a função uma única vez"""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "pattern"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+    assert results == ["pattern"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"inflight": 0, "executions": 1, "coalesced": 4}
+
+
+def test_failure_reaches_all_callers_and_is_not_memoized():
+    """A exceção chega a todos os chamadores e a próxima chamada tenta de novo"""
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("LLM indisponível")
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            flight.do("k", failing), flight.do("k", failing), return_exceptions=True
+        )
+        with pytest.raises(RuntimeError):
+            await flight.do("k", failing)
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(attempts) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    """Cancelar um chamador não interrompe a execução compartilhada"""
+    async def work():
+        await asyncio.sleep(0.05)
+        return "pattern"
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("pattern", True)
+
+
+def test_execution_is_cancelled_when_all_callers_leave():
+    """Sem ninguém esperando, a execução é cancelada e a chave liberada"""
+    async def scenario():
+        flight = SingleFlight()
+        caller = asyncio.create_task(flight.do("k", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task = flight.inflight("k")
+        caller.cancel()
+        await asyncio.sleep(0.01)
+        return task.cancelled(), flight.inflight("k")
+
+    assert asyncio.run(scenario()) == (True, None)
+
+
+def test_started_execution_survives_its_last_caller_leaving():
+    """Execução iniciada por start() não é cancelada quando o último chamador de do() desiste"""
+    async def work():
+        await asyncio.sleep(0.05)
+        return "pattern"
+
+    async def scenario():
+        flight = SingleFlight()
+        task = flight.start("k", work)
+        caller = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        return await task, flight.executions
+
+    assert asyncio.run(scenario()) == ("pattern", 1)
+
+
+def test_claimed_execution_is_shared_and_retried_if_abandoned():
+    """Quem espera uma execução reivindicada recebe o resultado dela, ou executa de novo se ela for abandonada"""
+    async def work():
+        return "pattern"
+
+    async def scenario():
+        flight = SingleFlight()
+        claimed = flight.claim("k")
+        assert flight.claim("k") is None
+        waiter = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        claimed.set_result("streamed")
+        shared = await waiter
+
+        abandoned = flight.claim("k")
+        waiter = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        flight.abandon(abandoned)
+        return shared, await waiter, flight.stats()
+
+    shared, retried, stats = asyncio.run(scenario())
+    assert (shared, retried) == ("streamed", "pattern")
+    assert stats == {"inflight": 0, "executions": 3, "coalesced": 2}
+
+
+def test_concurrent_identical_streams_share_one_llm_call():
+    """Streams simultâneos do mesmo pedido (como no /chat/stream) fazem uma única chamada ao LLM"""
+    from crochet_agent import CrochetConversationalAgent
+    from fake_llm import FakeChatModel
+
+    data = {"piece_type": "gorro", "size": "M", "color": "azul", "yarn_type": "lã",
+            "yarn_weight": "médio", "style_details": "sem detalhes"}
+    agent = CrochetConversationalAgent()
+    agent.llm = FakeChatModel(latency_median=0.05, tokens_per_second=5000)
+
+    async def stream():
+        state = agent._create_initial_state()
+        state.collected_data.update(data)
+        events = [event async for event in agent.astream_pattern(state)]
+        return events[-1]["data"]
+
+    async def scenario():
+        return await asyncio.gather(*(stream() for _ in range(3)))
+
+    patterns = asyncio.run(scenario())
+    assert agent.llm.calls == 1
+    assert patterns[0] == patterns[1] == patterns[2]
+    assert agent.inflight_generations.stats()["inflight"] == 0
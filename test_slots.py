@@ -0,0 +1,82 @@
+"""
+Testes do preenchimento de campos da conversa
+"""
+
+from extraction import EntityExtractor
+from models import ConversationState
+from slots import SLOTS, SlotFiller
+
+filler = SlotFiller(EntityExtractor(), max_attempts=2)
+
+
+def converse(messages):
+    """Simula a conversa como o agente faz: preenche e avança o passo a cada mensagem"""
+    state = ConversationState()
+    for message in messages:
+        filler.fill(state, message)
+        state.current_step = filler.next_step(state)
+    return state
+
+
+def test_scripted_conversation_reaches_pattern_generation():
+    """A conversa de exemplo do README chega à geração em 5 turnos"""
+    state = converse([
+        "Olá! Quero fazer um colete",
+        "Tamanho M",
+        "Azul marinho",
+        "Algodão médio",
+        "Sem manga, decote em V, comprimento até a cintura",
+    ])
+
+    assert state.current_step == "pattern_generation"
+    assert state.turns_to_pattern == 5
+    assert set(state.slot_confidence.values()) == {1.0}
+
+
+def test_skip_fills_defaults_with_zero_confidence():
+    """"tanto faz" preenche o campo com o valor padrão"""
+    state = converse(["quero um cachecol", "tanto faz"])
+
+    assert state.collected_data["size"] == "M"
+    assert state.slot_confidence["size"] == 0.0
+    assert state.current_step == "color"
+
+
+def test_unanswered_question_is_asked_at_most_max_attempts_times():
+    """Respostas sem nada aproveitável não prendem a conversa no mesmo passo"""
+    state = converse(["quero uma bolsa", "P", "azul", "algodão", "hmm"])
+
+    assert state.slot_attempts["yarn_weight"] == 2
+    assert state.collected_data["yarn_weight"] == "médio"
+    assert state.current_step == "style_details"
+
+
+def test_free_text_answers_are_kept_with_lower_confidence():
+    """Detalhes fora do léxico ficam com o texto do usuário"""
+    state = converse(["colete tamanho G azul de algodão fino", "com listras horizontais"])
+
+    assert state.collected_data["style_details"] == "com listras horizontais"
+    assert state.slot_confidence["style_details"] == 0.5
+    assert state.current_step == "pattern_generation"
+    assert state.turns_to_pattern == 2
+
+
+def test_unsure_answer_is_not_captured_as_free_text():
+    """"sei lá" é tratado como pular, não como detalhe de estilo"""
+    state = converse(["colete tamanho G azul de algodão fino", "sei lá"])
+
+    assert state.collected_data["style_details"] == "sem detalhes"
+    assert state.slot_confidence["style_details"] == 0.0
+
+
+def test_unrecognized_piece_falls_back_and_turns_are_bounded():
+    """Quem nunca cita uma peça conhecida não fica preso: a conversa termina em turnos limitados"""
+    state = converse(["oi", "quero um amigurumi", "tanto faz"])
+
+    assert state.collected_data["piece_type"] == "cachecol"
+    assert state.slot_confidence["piece_type"] == 0.0
+    assert state.current_step == "size"
+
+    state = converse(["hmm"] * 20)
+    assert state.current_step == "pattern_generation"
+    assert state.turns_to_pattern <= len(SLOTS) * filler.max_attempts
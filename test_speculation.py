@@ -0,0 +1,64 @@
+"""
+Testes da geração especulativa antes da última resposta da conversa
+"""
+
+import asyncio
+
+from crochet_agent import CrochetConversationalAgent
+from fake_llm import FakeChatModel
+from speculation import Speculator
+
+SCRIPT = ["Olá! Quero fazer um colete", "Tamanho M", "Azul marinho", "Algodão médio"]
+
+
+def run_conversation(final_message: str, wait: float = 0.0):
+    """Conversa até os detalhes de estilo, responde `final_message` e gera o pattern"""
+    async def scenario():
+        agent = CrochetConversationalAgent()
+        agent.llm = FakeChatModel(latency_median=0.05, tokens_per_second=100000)
+        speculator = Speculator(agent)
+        state = agent._create_initial_state()
+        for message in SCRIPT:
+            agent.get_next_question(state, message)
+            speculator.observe("conversa", state)
+        started = speculator.stats()["started"]
+
+        await asyncio.sleep(wait)
+        agent.get_next_question(state, final_message)
+        speculator.observe("conversa", state)
+        pattern = agent.ready_pattern(state) or await agent.agenerate_pattern_for(state.collected_data)
+        return agent, speculator, started, pattern
+
+    return asyncio.run(scenario())
+
+
+def test_default_answer_reuses_speculation_in_flight():
+    """"Tanto faz" confirma a especulação: a geração em andamento é aproveitada"""
+    agent, speculator, started, pattern = run_conversation("tanto faz")
+
+    assert started == 1
+    assert agent.llm.calls == 1
+    stats = speculator.stats()
+    assert stats["hits"] == 1 and stats["hit_rate"] == 1.0 and stats["wasted_tokens"] == 0
+    assert pattern.color == "azul marinho"
+
+
+def test_color_change_patches_speculated_pattern():
+    """Mudar só a cor na última resposta revisa o pattern especulado, sem outra chamada"""
+    agent, speculator, _, pattern = run_conversation("tanto faz, mas quero na cor rosa", wait=0.1)
+
+    assert agent.llm.calls == 1
+    assert speculator.stats()["patched"] == 1
+    assert pattern.color == "rosa"
+    assert "rosa" in pattern.materials[0]
+
+
+def test_different_details_cancel_and_count_wasted_tokens():
+    """Detalhes diferentes invalidam a especulação, que conta como tokens desperdiçados"""
+    agent, speculator, _, pattern = run_conversation("manga bufante", wait=0.1)
+
+    assert agent.llm.calls == 2
+    stats = speculator.stats()
+    assert stats["misses"] == 1 and stats["hit_rate"] == 0.0
+    assert stats["wasted_tokens"] > 0
+    assert pattern.color == "azul marinho"
@@ -0,0 +1,80 @@
+"""
+Testes da inicialização rápida: app sem LangChain/OpenAI até a primeira geração
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from crochet_agent import CrochetConversationalAgent
+
+PROBE = r"""
+import json, sys
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    result = {
+        "health": client.get("/health").status_code,
+        "ready": client.get("/ready").status_code,
+        "turn": client.post("/chat", json={"message": "Quero fazer um colete"}).status_code,
+        "llm_stats": client.get("/llm/stats").json(),
+        "heavy_modules": [name for name in ("langchain", "openai", "numpy") if name in sys.modules],
+    }
+print(json.dumps(result))
+"""
+
+
+def test_app_starts_without_api_key_or_heavy_imports():
+    """Sem chave da OpenAI o app sobe, responde /health e atende os primeiros turnos"""
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    env.update({"LLM_BACKEND": "openai", "PYTHONWARNINGS": "ignore"})
+    output = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["health"] == 200
+    # Não está pronto para gerar patterns sem a chave
+    assert result["ready"] == 503
+    assert result["turn"] == 200
+    assert result["llm_stats"] == {"initialized": False}
+    assert result["heavy_modules"] == []
+
+
+def test_llm_is_created_on_first_use(monkeypatch):
+    """O cliente do LLM só é criado quando alguém o usa"""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    agent = CrochetConversationalAgent()
+    assert not agent.llm_ready and agent.http_pool is None
+
+    llm = agent.llm
+
+    assert agent.llm_ready and agent.llm is llm
+    assert agent.http_pool is not None
+
+
+def test_multiple_workers_require_a_shared_store(monkeypatch):
+    """Com vários workers (inclusive pelo uvicorn --workers) o armazenamento em memória é recusado"""
+    import main
+    from conversation_store import InMemoryConversationStore, SQLiteConversationStore
+
+    monkeypatch.setattr(main, "conversation_store", InMemoryConversationStore())
+    monkeypatch.delenv("WORKERS", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(sys, "argv", ["uvicorn", "main:app"])
+    assert main.create_app() is not None
+
+    for argv, env in ((["uvicorn", "main:app", "--workers", "4"], {}),
+                      (["uvicorn", "main:app", "--workers=2"], {}),
+                      (["gunicorn", "-w", "3", "main:app"], {}),
+                      (["uvicorn", "main:app"], {"WEB_CONCURRENCY": "2"})):
+        monkeypatch.setattr(sys, "argv", argv)
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        with pytest.raises(RuntimeError):
+            main.create_app()
+
+    monkeypatch.setattr(main, "conversation_store", SQLiteConversationStore(":memory:"))
+    assert main.create_app() is not None
@@ -0,0 +1,83 @@
+"""
+Testes do cálculo local de pontos, carreiras e metragem
+"""
+
+from extraction import extract_entities
+from models import PieceType, Size
+from stitch_math import GRADED_SIZES, MEASUREMENTS, YARN_WEIGHTS, grade, grade_stitches, plan_for, plan_stitches
+
+
+def test_garment_panels_follow_gauge_and_ease():
+    """Colete M em fio médio: (96 + 4) / 2 cm a 15 pontos por 10cm"""
+    plan = plan_stitches(PieceType.COAT, Size.M, "médio")
+
+    back = plan.sections[0]
+    assert back.start_stitches == 75
+    assert back.foundation_chains == 76
+    assert back.rows == round(58 * 1.7)
+    assert plan.hook_size == "5.0mm"
+
+
+def test_hat_crown_increases_six_per_round():
+    """O topo do chapéu cresce 6 pontos por volta até a circunferência"""
+    crown = plan_stitches("chapeu", "M", "grosso").sections[0]
+
+    assert crown.start_stitches == 6
+    assert crown.end_stitches == 6 * crown.rows
+
+
+def test_custom_measurements_and_gauge_override_the_tables():
+    """Medidas e amostra do usuário substituem as da tabela"""
+    plan = plan_stitches("cachecol", Size.CUSTOM, "médio",
+                         gauge={"stitches": 20, "rows": 22}, measurements={"width": 30})
+
+    body = plan.sections[0]
+    assert body.start_stitches == 60
+    assert body.rows == round(160 * 2.2)
+    assert plan.gauge.startswith("20 pontos x 22 carreiras")
+
+
+def test_yarn_and_time_grow_with_size():
+    """Tamanhos maiores pedem mais fio e mais tempo"""
+    small = plan_stitches("blusa", "S", "médio")
+    large = plan_stitches("blusa", "XXL", "médio")
+
+    assert large.yarn_meters > small.yarn_meters
+    assert large.total_stitches > small.total_stitches
+    assert large.skeins == -(-large.yarn_meters // YARN_WEIGHTS["médio"].meters_per_100g)
+
+
+def test_sleeveless_sweater_has_no_sleeves():
+    """"sem manga" remove as mangas do cálculo"""
+    plan = plan_stitches("blusa", "M", "fino", style_details="sem manga, decote V")
+
+    assert [section.name for section in plan.sections] == ["Costas", "Frente"]
+
+
+def test_measurements_from_the_conversation_are_used():
+    """Medidas ditas na conversa viram tamanho personalizado"""
+    data = {"piece_type": "colete", "yarn_weight": "médio"}
+    data.update(extract_entities("busto de 110 cm, comprimento 50cm", ["size"]))
+
+    plan = plan_for(data)
+    assert data["size"] == "personalizado"
+    assert plan.measurements == {"circumference": 110.0, "length": 50.0}
+
+
+def test_graded_pass_matches_each_size():
+    """A passada vetorizada dá os mesmos números que calcular tamanho por tamanho"""
+    for piece in MEASUREMENTS:
+        graded = grade_stitches(piece, "fino", style_details="decote V")
+        for i, size in enumerate(GRADED_SIZES):
+            single = plan_stitches(piece, size, "fino", style_details="decote V")
+            assert graded.plan(i) == single
+            assert graded.by_size()[size]["yarn_meters"] == single.yarn_meters
+
+
+def test_graded_notation():
+    """Contagens no formato "XS (S, M, L, XL, XXL)" """
+    graded = grade_stitches("colete", "médio")
+
+    assert graded.size_label == "XS (S, M, L, XL, XXL)"
+    assert graded.summary()[3].startswith("Costas: corrente inicial de 64 (70, 76, 82, 88, 94) correntes")
+    assert grade([4, 4, 4]) == "4"